@@ -0,0 +1,38 @@
+import argparse
+from rt_mvp.batch import discover_logs, run_batch
+from rt_mvp.tasks import task_names
+
+def main():
+    # Создаём парсер аргументов командной строки
+    p = argparse.ArgumentParser()
+
+    # Каталог с логами, glob-шаблон или один файл; без --task каждый запуск анализируется отдельно
+    p.add_argument("target")
+    p.add_argument("--task", default=None, choices=task_names())
+    p.add_argument("--config", type=str, default=None)
+
+    # Каталог отчётов, шаблон имён логов в каталоге, число процессов (по умолчанию — число ядер)
+    p.add_argument("--out", type=str, default="reports")
+    p.add_argument("--pattern", type=str, default="*.jsonl")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--index", type=str, default=None)
+
+    # Кэш результатов: неизменённые логи не анализируются повторно; размер кэша в МБ (LRU)
+    p.add_argument("--cache", type=str, default=None)
+    p.add_argument("--cache-max-mb", type=int, default=512)
+
+    # Колоночный датасет триалов и метрик сессий (партиции task=/date=; формат — dataset.format в конфиге)
+    p.add_argument("--dataset", type=str, default=None)
+    args = p.parse_args()
+
+    paths = discover_logs(args.target, args.pattern)
+    res = run_batch(paths, args.task, config_path=args.config, out_root=args.out, workers=args.workers, index_path=args.index,
+                    cache_dir=args.cache, cache_max_bytes=args.cache_max_mb << 20, dataset_dir=args.dataset)
+
+    # Итог запуска
+    print(f"OK: {res['ok']}, errors: {res['errors']}, {res['elapsed_s']:.1f}s, index: {res['index_path']}")
+    if args.cache:
+        print(f"cache hits: {res['cache_hits']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,85 @@
-import argparse
-from rt_mvp.analyzer import analyze_and_report
+import argparse, os
+from contextlib import ExitStack
+from rt_mvp.analyzer import analyze_and_report, analyze_runs_and_report
+from rt_mvp.analyzer import report_dir
+from rt_mvp.cache import ResultCache
+from rt_mvp.config import ProjectConfig
+from rt_mvp.follow import LogFollower
+from rt_mvp.profiling import cprofile_to, tracemalloc_to
+from rt_mvp.tasks import task_names
 
 def main():
     # Создаём парсер аргументов командной строки
     p = argparse.ArgumentParser()
     
-    # Обязательный аргумент: путь к файлу логов
-    p.add_argument("log_path")
+    # Обязательный аргумент: путь к файлу логов; несколько путей — шарды одной сессии (сливаются по t_mono)
+    p.add_argument("log_path", nargs="+")
     
-    # Обязательный аргумент: тип задачи (выбор из предложенных типов)
-    p.add_argument("--task", required=True, choices=["simple", "choice", "go_nogo", "stroop", "pvt", "cpt"])
+    # Тип задачи; если не указан — лог делится на запуски (session_id, run_id), задача берётся из task_variant
+    p.add_argument("--task", default=None, choices=task_names())
     
     # Опциональный аргумент: путь к файлу конфигурации
     p.add_argument("--config", type=str, default=None)
+
+    # Опционально: каталог кэша результатов и его размер в МБ
+    p.add_argument("--cache", type=str, default=None)
+    p.add_argument("--cache-max-mb", type=int, default=512)
+
+    # Опционально: каталог колоночного датасета, куда дописываются триалы и метрики
+    p.add_argument("--dataset", type=str, default=None)
+
+    # Режим слежения за растущим логом: summary.json обновляется каждые --interval секунд по новым строкам
+    p.add_argument("--follow", action="store_true")
+    p.add_argument("--interval", type=float, default=1.0)
+    p.add_argument("--checkpoint", type=str, default=None)
+
+    # Диагностика: cProfile (profile.prof и profile.prof.txt) и tracemalloc (tracemalloc.txt) рядом с отчётом
+    p.add_argument("--profile", action="store_true")
+    p.add_argument("--tracemalloc", action="store_true")
     
     # Парсим аргументы
     args = p.parse_args()
-    
-    # Анализируем логи и генерируем отчёт
-    summary = analyze_and_report(args.log_path, args.task, config_path=args.config)
+    if args.follow and len(args.log_path) > 1:
+        p.error("--follow expects a single log file")
+    if args.follow and args.dataset:
+        p.error("--dataset is not supported with --follow")
+    args.log_path = args.log_path[0] if len(args.log_path) == 1 else args.log_path
+
+    out_dir = report_dir(args.log_path)
+    with ExitStack() as diag:
+        if args.tracemalloc:
+            diag.enter_context(tracemalloc_to(os.path.join(out_dir, "tracemalloc.txt")))
+        if args.profile:
+            diag.enter_context(cprofile_to(os.path.join(out_dir, "profile.prof")))
+        if args.follow:
+            follower = LogFollower(args.log_path, ProjectConfig.load(args.config), out_dir, task=args.task,
+                                   checkpoint_path=args.checkpoint, on_alert=lambda name, info: print(f"[alert] {name}: {info.get('value')}"))
+            summary = follower.run(interval_s=args.interval)
+            print(f"OK. followed {summary['meta']['follow']['offset']} bytes, {summary['meta']['n_trials']} trials.")
+            return
+
+        # Анализируем логи и генерируем отчёт (один или по отчёту на каждый запуск)
+        cache = ResultCache(args.cache, max_bytes=args.cache_max_mb << 20) if args.cache else None
+        if args.task:
+            summaries = [analyze_and_report(args.log_path, args.task, config_path=args.config, cache=cache, dataset_dir=args.dataset)]
+        else:
+            summaries = analyze_runs_and_report(args.log_path, config_path=args.config, cache=cache, dataset_dir=args.dataset)
     
     # Выводим статус успешного завершения
-    print("OK. reports written.")
+    print("OK. reports written." + (" (from cache)" if cache is not None and cache.last_hit else ""))
+    if args.profile or args.tracemalloc:
+        print(f"diagnostics: {out_dir}")
     
     # Выводим ключевые флаги из результатов анализа
-    for k, v in summary.get("flags", {}).items():
-        print(f"{k}: {v.get('value')}")
+    for summary in summaries:
+        meta = summary.get("meta", {})
+        if "run_id" in meta:
+            print(f"== {meta['run_id']} ({meta['task']}): {meta['out_dir']}")
+        for k, v in summary.get("flags", {}).items():
+            print(f"{k}: {v.get('value')}")
+        prof = meta.get("profile")
+        if prof and not prof.get("from_cache"):
+            print("stages: " + ", ".join(f"{k} {v['wall_s']*1000:.1f}ms" for k, v in prof["stages"].items()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,61 @@
+import argparse
+from rt_mvp.bench import STAGES, compare, load_results, run_suite, save_results
+from rt_mvp.config import ProjectConfig
+from rt_mvp.synthetic import TASKS, SyntheticSpec
+
+def main():
+    # Бенчмарк этапов конвейера на детерминированных синтетических логах
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=str, default="1e3,1e4,1e5")  # Число событий в логе (до 1e7)
+    p.add_argument("--tasks", type=str, default=",".join(TASKS))
+    p.add_argument("--go-ratios", type=str, default="0.7")  # Для go_nogo и cpt; остальные задачи — один прогон
+    p.add_argument("--noise", type=float, default=0.3)  # Доля событий других инструментов
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--stages", type=str, default=",".join(STAGES))
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-memory", action="store_true")  # Без замера пика памяти (tracemalloc)
+    p.add_argument("--config", type=str, default=None)
+    p.add_argument("--workdir", type=str, default="bench/logs")
+    p.add_argument("--out", type=str, default="bench/results.json")
+
+    # Сравнение с базовой линией: регрессия — этап медленнее на threshold (доля), код выхода 1
+    p.add_argument("--baseline", type=str, default=None)
+    p.add_argument("--threshold", type=float, default=0.2)
+    p.add_argument("--min-delta-ms", type=float, default=5.0)
+    p.add_argument("--save-baseline", type=str, default=None)
+    args = p.parse_args()
+
+    cfg = ProjectConfig.load(args.config)
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        p.error(f"unknown stages: {', '.join(unknown)}")
+    specs = []
+    for task in args.tasks.split(","):
+        ratios = [float(g) for g in args.go_ratios.split(",")] if task in ("go_nogo", "cpt") else [0.7]
+        for g in ratios:
+            for n in args.sizes.split(","):
+                specs.append(SyntheticSpec(task=task, n_events=int(float(n)), go_ratio=g, noise_ratio=args.noise, seed=args.seed))
+
+    def progress(name, case):
+        parts = [f"{s} {r['wall_s']*1000:.1f}ms" for s, r in case["stages"].items()]
+        print(f"{name}: {case['n_events']} events, {case['n_trials']} trials | " + ", ".join(parts))
+
+    res = run_suite(specs, cfg, args.workdir, repeat=args.repeat, memory=not args.no_memory, stages=stages, progress=progress)
+    save_results(args.out, res)
+    if args.save_baseline:
+        save_results(args.save_baseline, res)
+    print(f"results: {args.out}")
+
+    if args.baseline:
+        rows = compare(res, load_results(args.baseline), threshold=args.threshold, min_delta_s=args.min_delta_ms / 1000.0)
+        bad = [r for r in rows if r["regression"]]
+        for r in bad:
+            mem = f", memory x{r['mem_ratio']:.2f}" if r["mem_ratio"] is not None else ""
+            print(f"REGRESSION {r['case']} {r['stage']}: {r['base_wall_s']*1000:.1f}ms -> {r['wall_s']*1000:.1f}ms (x{r['ratio'] or 0:.2f}{mem})")
+        print(f"compared {len(rows)} stage timings with {args.baseline}: {len(bad)} regressions (threshold {args.threshold:.0%})")
+        if bad:
+            raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse, math, random, time
+from dataclasses import replace
+from rt_mvp.config import ProjectConfig
+from rt_mvp.trial_table import GO_KNOWN, GO_TRUE, TrialTable
+from rt_mvp import vectorized
+
+def synthetic_table(n, task, seed=0):
+    # Неклассифицированная таблица из n триалов: RT (NaN — нет нажатия), кнопка, ожидаемый ответ, is_go
+    rnd = random.Random(seed)
+    t = TrialTable()
+    cols = t.cols
+    buttons = [t._intern(b) for b in ("left", "right", "space")]
+    unknown = t._intern("unknown")
+    for i in range(n):
+        pressed = rnd.random() < 0.9
+        rt = rnd.lognormvariate(6.0, 0.45) if pressed else math.nan
+        cols["rt_ms"].append(rt); cols["first_press_t"].append(math.nan if not pressed else i + rt / 1000.0); cols["t0"].append(float(i))
+        cols["trial_id"].append(i); cols["block_id"].append(1); cols["timeout_ms"].append(2000)
+        cols["press_count"].append(1 if pressed else 0); cols["premature_press_count"].append(0); cols["late_press_count"].append(0)
+        cols["stimulus_type"].append(0)
+        cols["expected_response"].append(buttons[rnd.getrandbits(1)])
+        cols["first_press_button"].append(buttons[rnd.randrange(3)] if pressed else 0)
+        cols["classification"].append(unknown)
+        cols["flags"].append(GO_KNOWN | (GO_TRUE if rnd.random() < 0.75 else 0) if task == "go_nogo" else 0)
+    return t
+
+def copy_table(t):
+    c = TrialTable()
+    c.cols = {k: v[:] for k, v in t.cols.items()}
+    c.strings = list(t.strings); c._codes = dict(t._codes)
+    return c
+
+def diff(a, b, path=""):
+    # Расхождения двух словарей метрик (float — с относительной точностью 1e-9)
+    out = []
+    if isinstance(a, dict):
+        for k in a: out += diff(a[k], b.get(k), f"{path}{k}.")
+    elif isinstance(a, float) and isinstance(b, float):
+        if not math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9): out.append(f"{path} {a} != {b}")
+    elif a != b:
+        out.append(f"{path} {a!r} != {b!r}")
+    return out
+
+def run(backend, table, task, cfg):
+    t = copy_table(table)
+    c = replace(cfg, analysis=replace(cfg.analysis, backend=backend))
+    bounds = c.task_bounds[task]
+    t0 = time.perf_counter(); vectorized.classify_table(t, task, bounds, backend=backend)
+    t1 = time.perf_counter(); m = vectorized.table_metrics(t, task, c, backend=backend)
+    t2 = time.perf_counter()
+    return t, m, t1 - t0, t2 - t1
+
+def main():
+    # Сравнение stdlib- и numpy-бэкендов: результаты должны совпадать, печатается ускорение
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=str, default="1e5,1e6")
+    p.add_argument("--tasks", type=str, default="choice,go_nogo")
+    p.add_argument("--max-python", type=float, default=1e6)  # Выше этого размера stdlib-вариант не запускается
+    p.add_argument("--config", type=str, default=None)
+    args = p.parse_args()
+
+    cfg = ProjectConfig.load(args.config)
+    backends = vectorized.available_backends()
+    print(f"backends: {', '.join(backends)}")
+    failed = 0
+    for task in args.tasks.split(","):
+        for n in (int(float(s)) for s in args.sizes.split(",")):
+            table = synthetic_table(n, task)
+            res = {}
+            for b in backends:
+                if b == "python" and n > args.max_python and len(backends) > 1:
+                    continue
+                res[b] = run(b, table, task, cfg)
+            line = f"{task:8s} n={n:>9d}"
+            for b, (_, _, tc, tm) in res.items():
+                line += f"  {b}: classify {tc:7.3f}s metrics {tm:7.3f}s"
+            if len(res) == 2:
+                (tp, mp, cp, mtp), (tn, mn, cn, mtn) = res["python"], res["numpy"]
+                problems = diff(mp, mn)
+                if tp.column("classification") != tn.column("classification") or tp.cols["flags"] != tn.cols["flags"]:
+                    problems.append("classification differs")
+                line += f"  speedup x{(cp + mtp) / max(cn + mtn, 1e-9):.1f}  " + ("OK" if not problems else "MISMATCH")
+                for pr in problems: print("  ", pr)
+                failed += bool(problems)
+            print(line)
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
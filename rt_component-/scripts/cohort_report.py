@@ -0,0 +1,17 @@
+import argparse
+from rt_mvp.cohort import cohort_report
+
+def main():
+    # Когортный отчёт по готовым summary.json: каталог отчётов или index.jsonl пакетного запуска
+    p = argparse.ArgumentParser()
+    p.add_argument("target")
+    p.add_argument("--out", type=str, default="reports/_cohort")
+    p.add_argument("--format", default="both", choices=["html", "json", "both"])
+    args = p.parse_args()
+
+    res = cohort_report(args.target, args.out, fmt=args.format)
+    g = res["groups"].get("all", {})
+    print(f"OK. {g.get('n_sessions', 0)} sessions, {g.get('n_trials', 0)} trials -> {args.out}")
+
+if __name__ == "__main__":
+    main()
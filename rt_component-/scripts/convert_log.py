@@ -0,0 +1,20 @@
+import argparse
+from rt_mvp.binlog import EXT, binlog_to_jsonl, is_binlog, jsonl_to_binlog
+
+def main():
+    # Конвертация лога JSONL <-> бинарный формат; направление определяется по сигнатуре входного файла
+    p = argparse.ArgumentParser()
+    p.add_argument("src")
+    p.add_argument("dst", nargs="?", default=None)
+    args = p.parse_args()
+
+    if is_binlog(args.src):
+        dst = args.dst or args.src.rsplit(".", 1)[0] + ".jsonl"
+        n = binlog_to_jsonl(args.src, dst)
+    else:
+        dst = args.dst or args.src.rsplit(".", 1)[0] + EXT
+        n = jsonl_to_binlog(args.src, dst)
+    print(f"{n} events -> {dst}")
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ import os, time, random
 import tkinter as tk
 
 from rt_mvp.config import ProjectConfig
-from rt_mvp.sinks import JsonlSink
+from rt_mvp.sinks import BufferedJsonlSink, CallbackSink, FanoutSink
+from rt_mvp.online import OnlineAnalyzer
 from rt_mvp.event_schema import base_event
 
 # Соответствие клавиш системным обозначениям
@@ -17,6 +18,7 @@ def main():
     p.add_argument("--go_ratio", type=float, default=0.7)
     p.add_argument("--session_id", type=str, default="demo_session")
     p.add_argument("--config", type=str, default=None)
+    p.add_argument("--live", action="store_true")  # Онлайн-анализ: печатать срабатывание флагов по ходу сессии
     args=p.parse_args()
 
     # Загрузка конфигурации и параметров задачи
@@ -27,7 +29,17 @@ def main():
     ts=time.strftime("%Y-%m-%dT%H-%M-%S", time.localtime())
     run_id=f"rt_tk_{ts}_{args.task}"
     log_path=os.path.join("logs", f"{run_id}.jsonl")
-    sink=JsonlSink(log_path)
+    # Запись лога в фоновом потоке, чтобы файловые операции не попадали между стимулом и нажатием
+    log_sink=BufferedJsonlSink(log_path)
+    live=None
+
+    # Онлайн-анализатор получает те же события, что и лог
+    if args.live:
+        def on_alert(name, info):
+            print(f"[live] {name}: {info.get('value')} {'; '.join(info.get('reasons', []))}")
+        # Онлайн-анализ — в своём потоке FanoutSink: не задерживает ни UI, ни запись лога.
+        # Лог пишется напрямую в log_sink, мимо очередей FanoutSink
+        live=FanoutSink([CallbackSink(OnlineAnalyzer(args.task, cfg, on_alert=on_alert))])
 
     # Функция для получения монотонного времени в секундах
     t0=time.perf_counter()
@@ -63,7 +75,8 @@ def main():
     def emit(event_type, **payload):
         ev=base_event(event_type=event_type, session_id=args.session_id, run_id=run_id, t_mono_s=mono(),
                       trial_id=payload.pop("trial_id", None), block_id=1, task_variant=args.task, **payload)
-        sink.emit(ev)
+        log_sink.emit(ev)
+        if live is not None: live.emit(ev)
 
     # Обработка нажатия любой клавиши
     def on_key(e):
@@ -126,7 +139,11 @@ def main():
 
     root.bind("<KeyPress>", start)
     root.mainloop()
-    print("LOG:", log_path)
+    if live is not None:
+        live.close()
+        print("LIVE:", live.stats())
+    log_sink.close()
+    print("LOG:", log_path, log_sink.stats())
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,32 @@
+import argparse, asyncio
+from rt_mvp.service import ServiceCfg, serve
+
+def main():
+    # HTTP-сервис анализа: загрузка событий/логов по запускам, анализ в пуле процессов, summary.json и report.html
+    p = argparse.ArgumentParser()
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--data", type=str, default="service_data")  # Логи, отчёты и кэш сервиса
+    p.add_argument("--config", type=str, default=None)
+
+    # Пул процессов и ограничение очереди: сверх --max-pending анализов ответ 503 с Retry-After
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--max-pending", type=int, default=64)
+    p.add_argument("--max-body-mb", type=int, default=256)
+
+    # Кэш результатов (ResultCache) в <data>/cache
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--cache-max-mb", type=int, default=512)
+    args = p.parse_args()
+
+    cfg = ServiceCfg(host=args.host, port=args.port, data_dir=args.data, workers=args.workers, max_pending=args.max_pending,
+                     max_body_bytes=args.max_body_mb << 20, config_path=args.config, cache=not args.no_cache,
+                     cache_max_bytes=args.cache_max_mb << 20)
+    print(f"serving on http://{cfg.host}:{cfg.port} (data: {cfg.data_dir})")
+    try:
+        asyncio.run(serve(cfg))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, TYPE_CHECKING
+import heapq, math
+
+from .config import ProjectConfig
+from . import stats
+from .quantiles import TDigest, percentile_key, quantiles
+from .tasks import task_rules
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+class Moments:
+    """Сумма, среднее и M2 (Уэлфорд) — объединяемые формулой Чана."""
+    __slots__ = ("n", "total", "mean", "m2")
+
+    def __init__(self) -> None:
+        self.n = 0; self.total = 0.0; self.mean = 0.0; self.m2 = 0.0
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        self.total += x
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    def merge(self, o: "Moments") -> None:
+        if o.n == 0: return
+        if self.n == 0:
+            self.n, self.total, self.mean, self.m2 = o.n, o.total, o.mean, o.m2
+            return
+        n = self.n + o.n
+        d = o.mean - self.mean
+        self.mean += d * o.n / n
+        self.m2 += o.m2 + d * d * self.n * o.n / n
+        self.total += o.total
+        self.n = n
+
+    def mean_value(self) -> Optional[float]:
+        # Как stats.mean: сумма/количество
+        return (self.total / self.n) if self.n else None
+
+    def variance(self) -> Optional[float]:
+        return (self.m2 / (self.n - 1)) if self.n >= 2 else None
+
+class CoMoments:
+    """Совместные моменты пары (x, y) для наклона регрессии и корреляции Пирсона."""
+    __slots__ = ("n", "mx", "my", "m2x", "m2y", "cxy")
+
+    def __init__(self) -> None:
+        self.n = 0; self.mx = 0.0; self.my = 0.0; self.m2x = 0.0; self.m2y = 0.0; self.cxy = 0.0
+
+    def add(self, x: float, y: float) -> None:
+        self.n += 1
+        dx = x - self.mx
+        self.mx += dx / self.n
+        dy = y - self.my
+        self.my += dy / self.n
+        self.m2x += dx * (x - self.mx)
+        self.m2y += dy * (y - self.my)
+        self.cxy += dx * (y - self.my)
+
+    def merge(self, o: "CoMoments", x_shift: float=0.0) -> None:
+        # x_shift сдвигает x второго набора (например, номер триала при склейке частей)
+        if o.n == 0: return
+        omx = o.mx + x_shift
+        if self.n == 0:
+            self.n, self.mx, self.my, self.m2x, self.m2y, self.cxy = o.n, omx, o.my, o.m2x, o.m2y, o.cxy
+            return
+        n = self.n + o.n
+        dx = omx - self.mx; dy = o.my - self.my
+        f = self.n * o.n / n
+        self.m2x += o.m2x + dx * dx * f
+        self.m2y += o.m2y + dy * dy * f
+        self.cxy += o.cxy + dx * dy * f
+        self.mx += dx * o.n / n
+        self.my += dy * o.n / n
+        self.n = n
+
+    def slope(self) -> Optional[float]:
+        if self.n < 2 or self.m2x == 0: return None
+        return self.cxy / self.m2x
+
+    def pearson(self) -> Optional[float]:
+        if self.n < 2: return None
+        den = math.sqrt(self.m2x * self.m2y)
+        return None if den == 0 else self.cxy / den
+
+class RtValues:
+    """Хранилище валидных RT для медианы: список, медиана сортировкой при запросе."""
+    method = "exact"
+
+    def __init__(self) -> None:
+        self.values: List[float] = []
+
+    def add(self, x: float) -> None:
+        self.values.append(x)
+
+    def merge(self, o: "RtValues") -> None:
+        self.values.extend(o.values)
+
+    def median(self) -> Optional[float]:
+        return stats.median(self.values)
+
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        return quantiles(self.values, qs)
+
+class RunningMedian:
+    """Медиана за O(log n) на добавление (две кучи) — для онлайн-пересчёта после каждого триала.
+
+    Остальные перцентили берутся из t-digest, который ведётся параллельно.
+    """
+    method = "running_median+tdigest"
+
+    def __init__(self, compression: float=100.0) -> None:
+        self._lo: List[float] = []  # Нижняя половина (max-куча через отрицание)
+        self._hi: List[float] = []  # Верхняя половина (min-куча)
+        self.digest = TDigest(compression)
+
+    def add(self, x: float) -> None:
+        self.digest.add(x)
+        self._push(x)
+
+    def _push(self, x: float) -> None:
+        if self._lo and x > -self._lo[0]:
+            heapq.heappush(self._hi, x)
+        else:
+            heapq.heappush(self._lo, -x)
+        if len(self._lo) > len(self._hi) + 1:
+            heapq.heappush(self._hi, -heapq.heappop(self._lo))
+        elif len(self._hi) > len(self._lo):
+            heapq.heappush(self._lo, -heapq.heappop(self._hi))
+
+    def merge(self, o: "RunningMedian") -> None:
+        for x in o._hi: self._push(x)
+        for x in o._lo: self._push(-x)
+        self.digest.merge(o.digest)
+
+    def median(self) -> Optional[float]:
+        if not self._lo: return None
+        if len(self._lo) > len(self._hi): return -self._lo[0]
+        return 0.5 * (-self._lo[0] + self._hi[0])
+
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        return [self.median() if q == 0.5 else self.digest.quantile(q) for q in qs]
+
+def make_rt_store(cfg: ProjectConfig) -> Any:
+    # Хранилище RT по настройке analysis.quantile_mode
+    if cfg.analysis.quantile_mode == "tdigest":
+        return TDigest(cfg.analysis.tdigest_compression)
+    return RtValues()
+
+class MetricsAccumulator:
+    """Однопроходный и объединяемый расчёт метрик compute_metrics.
+
+    ``add`` учитывает очередной триал за O(1); ``merge`` дописывает триалы
+    другого аккумулятора *после* своих (номера триалов для наклона сдвигаются),
+    так что части блока/сессии/когорты склеиваются без повторного прохода.
+    """
+
+    def __init__(self, task: str, cfg: ProjectConfig, rt_store: Any=None):
+        self.task = task
+        self.bounds = cfg.task_bounds.get(task, cfg.task_bounds["simple"])
+        self.rules = task_rules(task, cfg)
+        # Условие (stimulus_type) -> [триалы, верные, валидные RT, сумма валидных RT]
+        self.by_condition: Dict[str, List[float]] = {c: [0, 0, 0, 0.0] for c in self.rules.conditions}
+        self.lapse_ms = cfg.flags_thresholds.lapse_ms
+        self.use_loglinear = cfg.use_loglinear_correction
+        self.total = 0; self.correct = 0; self.wrong = 0; self.commission = 0
+        self.omission = 0; self.anticipation = 0; self.timeout = 0
+        self.go = 0; self.nogo = 0; self.hits = 0
+        self.lapses = 0
+        self.rt = Moments()  # Валидные RT
+        self.percentiles = tuple(cfg.analysis.percentiles)
+        self.rt_values = rt_store if rt_store is not None else make_rt_store(cfg)  # add/merge/median/quantiles
+        self.trend = CoMoments()  # (номер триала, валидный RT)
+        self.speed_acc = CoMoments()  # (RT, правильность) без таймаутов
+
+    def add(self, t: TrialOutcome) -> None:
+        self.total += 1
+        if t.is_correct: self.correct += 1
+        if t.is_wrong: self.wrong += 1
+        if t.is_commission: self.commission += 1
+        if t.is_omission: self.omission += 1
+        if t.is_anticipation: self.anticipation += 1
+        if t.is_timeout: self.timeout += 1
+        go = self.rules.is_go(t)
+        if go is True:
+            self.go += 1
+            if t.classification == "correct": self.hits += 1
+        elif go is False:
+            self.nogo += 1
+        rt_ms = t.rt_ms
+        cond = self.by_condition.get(t.stimulus_type) if self.by_condition else None
+        if cond is not None:
+            cond[0] += 1
+            if t.is_correct: cond[1] += 1
+            if t.is_valid_rt and rt_ms is not None: cond[2] += 1; cond[3] += float(rt_ms)
+        if rt_ms is None:
+            return
+        r = float(rt_ms)
+        if t.is_valid_rt:
+            self.rt.add(r)
+            self.rt_values.add(r)
+            self.trend.add(float(self.total), r)
+            if r > float(self.lapse_ms): self.lapses += 1
+        if not t.is_timeout:
+            self.speed_acc.add(r, 1.0 if t.is_correct else 0.0)
+
+    def extend(self, trials: Iterable[TrialOutcome]) -> "MetricsAccumulator":
+        add = self.add
+        for t in trials:
+            add(t)
+        return self
+
+    def merge(self, o: "MetricsAccumulator") -> "MetricsAccumulator":
+        self.trend.merge(o.trend, x_shift=float(self.total))
+        self.speed_acc.merge(o.speed_acc)
+        self.rt.merge(o.rt)
+        self.rt_values.merge(o.rt_values)
+        for k in ("total", "correct", "wrong", "commission", "omission", "anticipation", "timeout", "go", "nogo", "hits", "lapses"):
+            setattr(self, k, getattr(self, k) + getattr(o, k))
+        for c, v in o.by_condition.items():
+            mine = self.by_condition.setdefault(c, [0, 0, 0, 0.0])
+            for i in range(4): mine[i] += v[i]
+        return self
+
+    def conditions_result(self) -> Dict[str, Any]:
+        # Метрики по условиям (Stroop: congruent / incongruent) и эффект условия: последнее минус первое по среднему RT
+        by = {c: {"n_trials": int(v[0]), "accuracy": (v[1] / v[0]) if v[0] else None, "n_valid": int(v[2]),
+                  "mean_rt_ms": (v[3] / v[2]) if v[2] else None} for c, v in self.by_condition.items()}
+        conds = self.rules.conditions
+        first = by[conds[0]]["mean_rt_ms"]; last = by[conds[-1]]["mean_rt_ms"]
+        effect = (last - first) if (first is not None and last is not None and len(conds) > 1) else None
+        return {"by_condition": by, "effect": f"{conds[-1]} - {conds[0]}", "effect_ms": effect}
+
+    def result(self) -> Dict[str, Any]:
+        # Тот же словарь, что возвращает compute_metrics
+        total = self.total
+        if self.rules.has_nogo:
+            go_trials: Optional[int] = self.go; nogo_trials: Optional[int] = self.nogo
+            required = self.go
+        else:
+            go_trials = None; nogo_trials = None; required = total
+
+        n_valid = self.rt.n
+        mean_rt = self.rt.mean_value()
+        median_rt = self.rt_values.median()
+        pct = self.rt_values.quantiles([p / 100.0 for p in self.percentiles])
+        var = self.rt.variance()
+        rt_std = None if var is None else math.sqrt(var)
+        rt_cv = None if (mean_rt is None or rt_std is None or mean_rt == 0) else rt_std / mean_rt
+        lapse_rate = (self.lapses / n_valid) if n_valid else None
+
+        accuracy = (self.correct / total) if total else None
+        omission_rate = (self.omission / required) if required else None
+        timeout_rate = (self.timeout / required) if required else None
+        anticipation_rate = (self.anticipation / total) if total else None
+
+        if self.rules.has_nogo:
+            commission_rate = (self.commission / self.nogo) if self.nogo else None
+            hit_rate = (self.hits / self.go) if self.go else None
+            fa_rate = commission_rate
+            d_prime = None
+            if hit_rate is not None and fa_rate is not None:
+                # d-prime с логарифмической коррекцией (если включена)
+                if self.use_loglinear:
+                    hit = (self.hits + 0.5) / (self.go + 1.0)
+                    fa = (self.commission + 0.5) / (self.nogo + 1.0)
+                else:
+                    hit = hit_rate; fa = fa_rate
+                d_prime = stats.inv_norm_cdf(hit) - stats.inv_norm_cdf(fa)
+        else:
+            commission_rate = None; hit_rate = None; fa_rate = None; d_prime = None
+
+        b = self.bounds
+        res = {
+            "counts": {"total_trials": total, "correct": self.correct, "wrong": self.wrong, "commission": self.commission,
+                       "omission": self.omission, "anticipation": self.anticipation, "timeout": self.timeout,
+                       "go_trials": go_trials, "nogo_trials": nogo_trials},
+            "rt": {"n_valid": n_valid, "mean_rt_ms": mean_rt, "median_rt_ms": median_rt, "rt_std_ms": rt_std, "rt_cv": rt_cv,
+                   "rt_slope_ms_per_trial": self.trend.slope(), "lapses_gt_ms": self.lapse_ms, "lapses_count": self.lapses,
+                   "lapse_rate": lapse_rate,
+                   "percentiles_ms": {percentile_key(p): v for p, v in zip(self.percentiles, pct)},
+                   "quantile_method": self.rt_values.method},
+            "rates": {"accuracy": accuracy, "omission_rate": omission_rate, "commission_error_rate": commission_rate,
+                      "timeout_rate": timeout_rate, "anticipation_rate": anticipation_rate, "hit_rate": hit_rate,
+                      "false_alarm_rate": fa_rate, "d_prime": d_prime},
+            "speed_accuracy": {"pearson_r_rt_correctness": self.speed_acc.pearson()},
+            "bounds": {"min_rt_ms": b.min_rt_ms, "max_rt_ms": b.max_rt_ms, "timeout_ms": b.timeout_ms},
+        }
+        if self.rules.conditions:
+            res["conditions"] = self.conditions_result()
+        return res
@@ -1,13 +1,25 @@
 from __future__ import annotations
+from contextlib import nullcontext
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
-import os, json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import os, json, math, re
 
-from .event_log import read_jsonl
-from .config import ProjectConfig, TaskBounds
-from . import stats
+from .event_log import read_events
+from .config import ChannelCfg, ProjectConfig, ReportCfg, TaskBounds
 from .state_flags import compute_state_flags
-from .report_html import build_report_html
+from .report_html import write_report_html
+from .trial_table import TrialTable
+from .accumulators import MetricsAccumulator
+from .cache import ResultCache
+from .cohort import session_partials
+from .profiling import PipelineProfile, stage
+from .shards import LogPath, log_name
+from .tasks import CompiledTask, compile_task
+from .bootstrap import bootstrap_metrics
+from .rolling import rolling_metrics
+from .dataset import DatasetWriter
+from .intervals import ChannelCollector, ChannelIndex, attach_channels, channel_summary, is_rt_event, reader_filter
+from . import vectorized
 
 # Результат одного испытания (trial) с классификацией и временными показателями
 @dataclass
@@ -32,226 +44,454 @@ class TrialOutcome:
     is_wrong: bool=False  # Неправильный ответ
     is_commission: bool=False  # Нежелательный ответ (в go/nogo задаче)
     is_omission: bool=False  # Отсутствие ответа
+    t0: Optional[float]=None  # Время появления стимула (t_mono, с)
 
-def _group_by_trial(events: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+def _trial_id_of(ev: Dict[str, Any]) -> Optional[int]:
+    # ID испытания события или None, если его нет / он некорректен
+    tid = ev.get("trial_id")
+    if tid is None:
+        return None
+    try:
+        return int(tid)
+    except Exception:
+        return None
+
+# Счётчики сборки триалов (meta["profile"]["counters"])
+TRIAL_COUNTERS = ("dropped_no_trial_id", "dropped_bad_trial_id", "dropped_late", "trials_built", "trials_no_stimulus_on",
+                  "presses_in_window", "presses_premature", "presses_late", "presses_outside", "presses_no_time")
+
+def _count_bad_tid(ev: Dict[str, Any], counters: Optional[Dict[str, int]]) -> None:
+    if counters is not None:
+        k = "dropped_no_trial_id" if ev.get("trial_id") is None else "dropped_bad_trial_id"
+        counters[k] = counters.get(k, 0) + 1
+
+def _group_by_trial(events: Iterable[Dict[str, Any]], counters: Optional[Dict[str, int]]=None) -> Dict[int, List[Dict[str, Any]]]:
     # Группирует события по ID испытания и сортирует по времени
     g: Dict[int, List[Dict[str, Any]]] = {}
     for ev in events:
-        tid = ev.get("trial_id")
-        if tid is None:
-            continue
-        try:
-            tid_i = int(tid)
-        except Exception:
+        tid_i = _trial_id_of(ev)
+        if tid_i is None:
+            _count_bad_tid(ev, counters)
             continue
         g.setdefault(tid_i, []).append(ev)
     for tid in g:
         g[tid].sort(key=lambda e: float(e.get("t_mono", 0.0)))
     return g
 
-def build_trials(log_path: str, task: str, cfg: ProjectConfig) -> Tuple[List[TrialOutcome], Dict[str, Any]]:
+def _classify_trial(tid: int, evs: List[Dict[str, Any]], task: CompiledTask, prem_ms: float,
+                    counters: Optional[Dict[str, int]]=None) -> Optional[TrialOutcome]:
+    # Классифицирует одно испытание по его событиям (отсортированным по t_mono) правилами задачи из реестра tasks
+    out = _extract_trial(tid, evs, task.bounds, prem_ms, counters)
+    if out is not None:
+        task.classify(out)
+    return out
+
+def _extract_trial(tid: int, evs: List[Dict[str, Any]], bounds: TaskBounds, prem_ms: float,
+                   counters: Optional[Dict[str, int]]=None) -> Optional[TrialOutcome]:
+    # Поля испытания из событий (стимул, первое нажатие, RT) — без классификации
+    stim_on = next((e for e in evs if e.get("event_type")=="stimulus_on"), None)
+    if not stim_on:
+        if counters is not None: counters["trials_no_stimulus_on"] = counters.get("trials_no_stimulus_on", 0) + 1
+        return None
+
+    block_id = int(stim_on.get("block_id", 1))
+    stimulus_type = str(stim_on.get("stimulus_type",""))
+    expected = stim_on.get("expected_response", None)
+    is_go = stim_on.get("is_go", None)
+    timeout_ms = int(stim_on.get("timeout_ms", bounds.timeout_ms))
+
+    # Временной интервал: от появления стимула до истечения таймаута
+    t0 = float(stim_on.get("t_mono", 0.0))
+    t1 = t0 + timeout_ms/1000.0
+
+    # Группирует нажатия кнопок по времени относительно стимула
+    presses = [e for e in evs if e.get("event_type")=="keypress" and "t_mono" in e]
+    press_times = [(float(p["t_mono"]), str(p.get("button_id",""))) for p in presses]
+
+    in_window = [(t,b) for (t,b) in press_times if t0 <= t <= t1]  # Валидные ответы
+    premature = [(t,b) for (t,b) in press_times if (t0 - prem_ms/1000.0) <= t < t0]  # До стимула
+    late = [(t,b) for (t,b) in press_times if t > t1]  # После таймаута
+    first = in_window[0] if in_window else None  # Первый валидный ответ
+    if counters is not None:
+        n_kp = sum(1 for e in evs if e.get("event_type")=="keypress")
+        for k, v in (("trials_built", 1), ("presses_in_window", len(in_window)), ("presses_premature", len(premature)), ("presses_late", len(late)),
+                     ("presses_outside", len(press_times) - len(in_window) - len(premature) - len(late)), ("presses_no_time", n_kp - len(press_times))):
+            counters[k] = counters.get(k, 0) + v
+
+    out = TrialOutcome(
+        trial_id=tid, block_id=block_id, stimulus_type=stimulus_type,
+        expected_response=expected, is_go=is_go, timeout_ms=timeout_ms,
+        press_count=len(press_times), premature_press_count=len(premature), late_press_count=len(late), t0=t0,
+    )
+    if first:
+        tp, b = first
+        out.first_press_t = tp
+        out.first_press_button = b
+        out.rt_ms = (tp - t0)*1000.0
+    return out
+
+def _bounds_meta(bounds: TaskBounds) -> Dict[str, Any]:
+    return {"min_rt_ms": bounds.min_rt_ms, "max_rt_ms": bounds.max_rt_ms, "timeout_ms": bounds.timeout_ms}
+
+def build_trials(log_path: LogPath, task: str, cfg: ProjectConfig, profile: Optional[PipelineProfile]=None) -> Tuple[List[TrialOutcome], Dict[str, Any]]:
     # Парсит лог событий и преобразует в список структурированных испытаний
-    events = list(read_jsonl(log_path))
-    bounds: TaskBounds = cfg.task_bounds.get(task, cfg.task_bounds["simple"])
-    g = _group_by_trial(events)
+    counters = profile.counters if profile is not None else None
+    with stage(profile, "read_events"):
+        events = list(read_events(log_path, counters=counters, reorder_window_s=cfg.analysis.shard_reorder_window_s))
+    compiled = compile_task(task, cfg)
+    bounds = compiled.bounds
     prem_ms = cfg.analysis.premature_window_ms
 
     trials: List[TrialOutcome] = []
-    for tid in sorted(g.keys()):
-        evs = g[tid]
-        stim_on = next((e for e in evs if e.get("event_type")=="stimulus_on"), None)
-        if not stim_on:
-            continue
+    with stage(profile, "build_trials"):
+        g = _group_by_trial(events, counters)
+        for tid in sorted(g.keys()):
+            out = _classify_trial(tid, g[tid], compiled, prem_ms, counters)
+            if out is not None:
+                trials.append(out)
 
-        block_id = int(stim_on.get("block_id", 1))
-        stimulus_type = str(stim_on.get("stimulus_type",""))
-        expected = stim_on.get("expected_response", None)
-        is_go = stim_on.get("is_go", None)
-        timeout_ms = int(stim_on.get("timeout_ms", bounds.timeout_ms))
-
-        # Временной интервал: от появления стимула до истечения таймаута
-        t0 = float(stim_on.get("t_mono", 0.0))
-        t1 = t0 + timeout_ms/1000.0
-
-        # Группирует нажатия кнопок по времени относительно стимула
-        presses = [e for e in evs if e.get("event_type")=="keypress" and "t_mono" in e]
-        press_times = [(float(p["t_mono"]), str(p.get("button_id",""))) for p in presses]
-
-        in_window = [(t,b) for (t,b) in press_times if t0 <= t <= t1]  # Валидные ответы
-        premature = [(t,b) for (t,b) in press_times if (t0 - prem_ms/1000.0) <= t < t0]  # До стимула
-        late = [(t,b) for (t,b) in press_times if t > t1]  # После таймаута
-        first = in_window[0] if in_window else None  # Первый валидный ответ
-
-        out = TrialOutcome(
-            trial_id=tid, block_id=block_id, stimulus_type=stimulus_type,
-            expected_response=expected, is_go=is_go, timeout_ms=timeout_ms,
-            press_count=len(press_times), premature_press_count=len(premature), late_press_count=len(late),
-        )
-        if first:
-            tp, b = first
-            out.first_press_t = tp
-            out.first_press_button = b
-            out.rt_ms = (tp - t0)*1000.0
-
-        # Границы для валидного времени реакции
-        min_rt = bounds.min_rt_ms
-        max_rt = min(bounds.max_rt_ms, timeout_ms)
-
-        def valid_rt(rt_ms: float) -> bool:
-            return (rt_ms >= float(min_rt)) and (rt_ms <= float(max_rt))
-
-        # Классифицирует результат в зависимости от типа задачи
-        if task in ("simple","choice"):
-            if out.rt_ms is None:
-                out.classification="omission"; out.is_omission=True; out.is_timeout=True
-            else:
-                if out.rt_ms < min_rt:
-                    out.classification="anticipation"; out.is_anticipation=True
-                else:
-                    if expected is not None and str(out.first_press_button)==str(expected):
-                        out.classification="correct"; out.is_correct=True
-                    else:
-                        out.classification="wrong"; out.is_wrong=True
-                if out.rt_ms > max_rt:
-                    out.classification="timeout"; out.is_timeout=True; out.is_correct=False
-
-        elif task=="go_nogo":
-            if is_go is True:  # Go сигнал
-                if out.rt_ms is None:
-                    out.classification="omission"; out.is_omission=True; out.is_timeout=True
-                else:
-                    if out.rt_ms < min_rt:
-                        out.classification="anticipation"; out.is_anticipation=True
-                    else:
-                        if str(out.first_press_button)=="space":
-                            out.classification="correct"; out.is_correct=True
-                        else:
-                            out.classification="wrong"; out.is_wrong=True
-                    if out.rt_ms > max_rt:
-                        out.classification="timeout"; out.is_timeout=True; out.is_correct=False
-            else:  # NoGo сигнал (нужно не нажимать)
-                if out.rt_ms is None:
-                    out.classification="correct_inhibition"; out.is_correct=True
-                else:
-                    out.classification="commission"; out.is_commission=True  # Ошибка: нажал, когда не надо
-                    if out.rt_ms < min_rt:
-                        out.is_anticipation=True
-
-        else:  # Прочие типы задач
-            if out.rt_ms is None:
-                out.classification="omission"; out.is_omission=True; out.is_timeout=True
-            else:
-                if out.rt_ms < min_rt:
-                    out.classification="anticipation"; out.is_anticipation=True
+    meta = {"log_path": log_path, "task": task, "bounds": _bounds_meta(bounds), "n_trials": len(trials),
+            "t_unix_start": next((float(e["t_unix"]) for e in events if isinstance(e.get("t_unix"), (int, float))), None)}
+    return trials, meta
+
+class TrialAssembler:
+    """Потоковая сборка испытаний: держит в памяти только открытые триалы.
+
+    Триал закрывается, когда после его ``trial_end`` приходит событие другого
+    триала (поздние нажатия с тем же trial_id ещё успевают попасть в него),
+    либо когда t_mono ушло дальше ``horizon_s`` секунд от первого события триала.
+    События уже закрытого триала отбрасываются и считаются в ``dropped_late``.
+    С ``classify=False`` триалы выдаются без классификации (classification="unknown"):
+    её потом делает ``vectorized.classify_table`` сразу для всей таблицы.
+    """
+
+    def __init__(self, task: str, cfg: ProjectConfig, horizon_s: Optional[float]=None, classify: bool=True):
+        self.task = task
+        self.classify = classify
+        self.counters: Dict[str, int] = dict.fromkeys(TRIAL_COUNTERS, 0)  # См. TRIAL_COUNTERS; dropped_late дублирует атрибут
+        self.compiled = compile_task(task, cfg)  # Правила задачи из реестра, скомпилированные один раз
+        self.bounds: TaskBounds = self.compiled.bounds
+        self.prem_ms = cfg.analysis.premature_window_ms
+        self.horizon_s = horizon_s
+        self.dropped_late = 0
+        self._open: Dict[int, List[Dict[str, Any]]] = {}  # trial_id -> события
+        self._first_t: Dict[int, float] = {}  # trial_id -> t_mono первого события
+        self._ended: Set[int] = set()  # Триалы, для которых уже пришёл trial_end
+        self._closed: Set[int] = set()
+        self._deadline = math.inf  # Ближайший момент закрытия по горизонту
+        self.t_unix_start: Optional[float] = None  # t_unix первого события (дата сессии в датасете)
+
+    @property
+    def open_trials(self) -> int:
+        return len(self._open)
+
+    def push(self, ev: Dict[str, Any]) -> List[TrialOutcome]:
+        # Принимает одно событие и возвращает триалы, которые закрылись
+        tid = _trial_id_of(ev)
+        out: List[TrialOutcome] = []
+        if self._ended:
+            done = [t for t in self._ended if t != tid]
+            if done:
+                out.extend(self._close(done))
+        if self.t_unix_start is None:
+            tu = ev.get("t_unix")
+            if isinstance(tu, (int, float)): self.t_unix_start = float(tu)
+        t = ev.get("t_mono")
+        if self.horizon_s is not None and t is not None and float(t) > self._deadline:
+            out.extend(self._close_expired(float(t)))
+        if tid is None:
+            _count_bad_tid(ev, self.counters)
+            return out
+        if tid in self._closed:
+            self.dropped_late += 1; self.counters["dropped_late"] += 1
+            return out
+        evs = self._open.get(tid)
+        if evs is None:
+            evs = self._open[tid] = []
+            t_first = float(t) if t is not None else 0.0
+            self._first_t[tid] = t_first
+            if self.horizon_s is not None:
+                self._deadline = min(self._deadline, t_first + self.horizon_s)
+        evs.append(ev)
+        if ev.get("event_type") == "trial_end":
+            self._ended.add(tid)
+        return out
+
+    def flush(self) -> List[TrialOutcome]:
+        # Закрывает все оставшиеся триалы (конец потока)
+        return self._close(list(self._open))
+
+    def _close_expired(self, t: float) -> List[TrialOutcome]:
+        assert self.horizon_s is not None
+        expired = [tid for tid, t_first in self._first_t.items() if t_first + self.horizon_s < t]
+        out = self._close(expired)
+        self._deadline = min((tf + self.horizon_s for tf in self._first_t.values()), default=math.inf)
+        return out
+
+    def _close(self, tids: List[int]) -> List[TrialOutcome]:
+        out: List[TrialOutcome] = []
+        for tid in sorted(tids):
+            evs = self._open.pop(tid, None)
+            self._first_t.pop(tid, None)
+            self._ended.discard(tid)
+            if evs is None:
+                continue
+            self._closed.add(tid)
+            evs.sort(key=lambda e: float(e.get("t_mono", 0.0)))
+            res = _extract_trial(tid, evs, self.bounds, self.prem_ms, self.counters)
+            if res is not None:
+                if self.classify:
+                    self.compiled.classify(res)
+                out.append(res)
+        return out
+
+def iter_trials(events: Iterable[Dict[str, Any]], task: str, cfg: ProjectConfig, horizon_s: Optional[float]=None,
+                classify: bool=True) -> Iterator[TrialOutcome]:
+    # Потоковый вариант build_trials: выдаёт триалы по мере их закрытия
+    asm = TrialAssembler(task, cfg, horizon_s=horizon_s, classify=classify)
+    for ev in events:
+        yield from asm.push(ev)
+    yield from asm.flush()
+
+def iter_trials_from_log(log_path: LogPath, task: str, cfg: ProjectConfig, horizon_s: Optional[float]=None,
+                         classify: bool=True) -> Iterator[TrialOutcome]:
+    # Читает лог построчно, не загружая его целиком в память
+    return iter_trials(read_events(log_path, reorder_window_s=cfg.analysis.shard_reorder_window_s), task, cfg, horizon_s=horizon_s, classify=classify)
+
+def _attach_channels(table: TrialTable, indexes: Dict[str, ChannelIndex], meta: Dict[str, Any], channels: Sequence[ChannelCfg],
+                     profile: Optional[PipelineProfile]) -> None:
+    # Агрегаты каналов других инструментов в окнах триалов: колонки таблицы и meta["channels"]
+    if indexes:
+        with stage(profile, "channels"):
+            attach_channels(table, indexes, channels)
+            meta["channels"] = channel_summary(table, indexes, channels)
+
+def build_trial_table(log_path: LogPath, task: str, cfg: ProjectConfig, horizon_s: Optional[float]=None,
+                      profile: Optional[PipelineProfile]=None) -> Tuple[TrialTable, Dict[str, Any]]:
+    # Как build_trials, но триалы собираются потоково прямо в колоночную TrialTable;
+    # события каналов (cfg.analysis.channels) читаются тем же проходом и присоединяются к окнам триалов
+    deferred = vectorized.use_numpy(cfg)  # С numpy классификация — одним векторным проходом по таблице
+    asm = TrialAssembler(task, cfg, horizon_s=horizon_s, classify=not deferred)
+    bounds = asm.bounds
+    table = TrialTable()
+    counters = profile.counters if profile is not None else None
+    channels = cfg.analysis.channels
+    coll = ChannelCollector(channels, counters) if channels else None
+    event_types, instrument = reader_filter(channels)
+    with stage(profile, "build_trials"):  # Чтение и сборка потоковые — замеряются вместе
+        for ev in read_events(log_path, event_types=event_types, instrument=instrument, counters=counters,
+                              reorder_window_s=cfg.analysis.shard_reorder_window_s):
+            if coll is not None and not is_rt_event(ev):
+                coll.add(ev)
+                continue
+            table.extend(asm.push(ev))
+        table.extend(asm.flush())
+    if deferred:
+        with stage(profile, "classify"):
+            vectorized.classify_table(table, task, bounds, backend="numpy", rules=asm.compiled.rules)
+    table.sort_by_trial_id()
+    if profile is not None:
+        profile.update(asm.counters)
+    meta = {"log_path": log_path, "task": task, "bounds": _bounds_meta(bounds), "n_trials": len(table), "t_unix_start": asm.t_unix_start}
+    with stage(profile if coll is not None else None, "channel_index"):
+        indexes = coll.build() if coll is not None else {}
+    _attach_channels(table, indexes, meta, channels, profile)
+    return table, meta
+
+RunKey = Tuple[str, str]  # (session_id, run_id)
+
+def build_runs(log_path: LogPath, cfg: ProjectConfig, task: Optional[str]=None, horizon_s: Optional[float]=None,
+               profile: Optional[PipelineProfile]=None) -> Dict[RunKey, Tuple[TrialTable, Dict[str, Any]]]:
+    """Один проход по логу с несколькими запусками: триалы раскладываются по (session_id, run_id).
+
+    Задача каждого запуска берётся из ``task_variant`` первого события запуска;
+    ``task`` задаёт её явно для всех запусков. Если не известно ни то, ни другое,
+    используется "simple". События каналов других инструментов собираются по
+    session_id (их run_id может не совпадать с run_id задачи RT) и
+    присоединяются к триалам всех запусков сессии.
+    """
+    runs: Dict[RunKey, TrialAssembler] = {}
+    tables: Dict[RunKey, TrialTable] = {}
+    sources: Dict[RunKey, str] = {}
+    deferred = vectorized.use_numpy(cfg)
+    counters = profile.counters if profile is not None else None
+    channels = cfg.analysis.channels
+    colls: Dict[str, ChannelCollector] = {}
+    event_types, instrument = reader_filter(channels)
+    with stage(profile, "build_trials"):
+        for ev in read_events(log_path, event_types=event_types, instrument=instrument, counters=counters,
+                              reorder_window_s=cfg.analysis.shard_reorder_window_s):
+            if channels and not is_rt_event(ev):
+                sid = str(ev.get("session_id", ""))
+                coll = colls.get(sid)
+                if coll is None:
+                    coll = colls[sid] = ChannelCollector(channels, counters)
+                coll.add(ev)
+                continue
+            key = (str(ev.get("session_id", "")), str(ev.get("run_id", "")))
+            asm = runs.get(key)
+            if asm is None:
+                variant = ev.get("task_variant")
+                if task is not None:
+                    run_task, sources[key] = task, "argument"
+                elif variant:
+                    run_task, sources[key] = str(variant), "task_variant"
                 else:
-                    out.classification="correct"; out.is_correct=True
-                if out.rt_ms > max_rt:
-                    out.classification="timeout"; out.is_timeout=True; out.is_correct=False
+                    run_task, sources[key] = "simple", "default"
+                asm = runs[key] = TrialAssembler(run_task, cfg, horizon_s=horizon_s, classify=not deferred)
+                tables[key] = TrialTable()
+            tables[key].extend(asm.push(ev))
+        for key, asm in runs.items():
+            tables[key].extend(asm.flush())
+    if deferred:
+        with stage(profile, "classify"):
+            for key, asm in runs.items():
+                vectorized.classify_table(tables[key], asm.task, asm.bounds, backend="numpy", rules=asm.compiled.rules)
 
-        # Отмечает результаты с валидным временем реакции
-        if out.is_correct and out.rt_ms is not None and valid_rt(out.rt_ms) and not out.is_anticipation:
-            out.is_valid_rt=True
+    with stage(profile if colls else None, "channel_index"):
+        indexes = {sid: coll.build() for sid, coll in colls.items()}
 
-        trials.append(out)
+    out: Dict[RunKey, Tuple[TrialTable, Dict[str, Any]]] = {}
+    for key, asm in runs.items():
+        table = tables[key]
+        table.sort_by_trial_id()
+        meta = {"log_path": log_path, "session_id": key[0], "run_id": key[1], "task": asm.task, "task_source": sources[key],
+                "bounds": _bounds_meta(asm.bounds), "n_trials": len(table), "t_unix_start": asm.t_unix_start}
+        _attach_channels(table, indexes.get(key[0], {}), meta, channels, profile)
+        if profile is not None:
+            # Профиль запуска: общие для лога этапы и счётчики чтения + счётчики сборки этого запуска
+            meta["profile"] = run_prof = profile.copy()
+            run_prof.update(asm.counters)
+        out[key] = (table, meta)
+    if profile is not None:
+        for asm in runs.values(): profile.update(asm.counters)
+    return out
 
-    meta = {"log_path": log_path, "task": task, "bounds": {"min_rt_ms": bounds.min_rt_ms, "max_rt_ms": bounds.max_rt_ms, "timeout_ms": bounds.timeout_ms}, "n_trials": len(trials)}
-    return trials, meta
+def compute_metrics(trials: Sequence[TrialOutcome], task: str, cfg: ProjectConfig) -> Dict[str, Any]:
+    # Вычисляет статистические показатели производительности за один проход по триалам
+    if isinstance(trials, TrialTable) and vectorized.use_numpy(cfg):
+        return vectorized.table_metrics(trials, task, cfg, backend="numpy")
+    return MetricsAccumulator(task, cfg).extend(trials).result()
 
-def compute_metrics(trials: List[TrialOutcome], task: str, cfg: ProjectConfig) -> Dict[str, Any]:
-    # Вычисляет статистические показатели производительности
-    bounds = cfg.task_bounds.get(task, cfg.task_bounds["simple"])
-    total=len(trials)
-    correct=sum(1 for t in trials if t.is_correct)
-    wrong=sum(1 for t in trials if t.is_wrong)
-    commission=sum(1 for t in trials if t.is_commission)
-    omission=sum(1 for t in trials if t.is_omission)
-    anticipation=sum(1 for t in trials if t.is_anticipation)
-    timeout=sum(1 for t in trials if t.is_timeout)
-
-    # Для go/nogo отдельно считаем go и nogo испытания
-    if task=="go_nogo":
-        go_trials=sum(1 for t in trials if t.is_go is True)
-        nogo_trials=sum(1 for t in trials if t.is_go is False)
-        required=go_trials
-    else:
-        go_trials=None; nogo_trials=None; required=total
-
-    # Статистика времени реакции
-    rt_valid=[float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None]
-    mean_rt=stats.mean(rt_valid); median_rt=stats.median(rt_valid)
-    rt_std=stats.std_sample(rt_valid); rt_cv=stats.coefficient_of_variation(rt_valid)
-
-    # Тренд времени реакции на протяжении сессии
-    xs=[]; ys=[]
-    for idx,t in enumerate(trials, start=1):
-        if t.is_valid_rt and t.rt_ms is not None:
-            xs.append(float(idx)); ys.append(float(t.rt_ms))
-    rt_slope=stats.linear_regression_slope(xs, ys)
-
-    # Количество задержанных реакций (lapses)
-    lapse_ms=cfg.flags_thresholds.lapse_ms
-    lapses=sum(1 for r in rt_valid if r>float(lapse_ms))
-    lapse_rate=(lapses/len(rt_valid)) if rt_valid else None
-
-    # Процентные показатели
-    accuracy=(correct/total) if total else None
-    omission_rate=(omission/required) if required else None
-    timeout_rate=(timeout/required) if required else None
-    anticipation_rate=(anticipation/total) if total else None
-
-    # Специфичные метрики для go/nogo задачи
-    if task=="go_nogo" and go_trials is not None and nogo_trials is not None:
-        commission_rate=(commission/nogo_trials) if nogo_trials else None
-        hit_rate=(sum(1 for t in trials if t.is_go is True and t.classification=="correct")/go_trials) if go_trials else None
-        fa_rate=(commission/nogo_trials) if nogo_trials else None
-        d_prime=None
-        if hit_rate is not None and fa_rate is not None:
-            # Вычисляет d-prime с логарифмической коррекцией (если включена)
-            if cfg.use_loglinear_correction:
-                H=sum(1 for t in trials if t.is_go is True and t.classification=="correct")
-                FA=commission
-                hit=(H+0.5)/(go_trials+1.0) if go_trials else 0.5
-                fa=(FA+0.5)/(nogo_trials+1.0) if nogo_trials else 0.5
-            else:
-                hit=hit_rate; fa=fa_rate
-            d_prime=stats.inv_norm_cdf(hit)-stats.inv_norm_cdf(fa)
-    else:
-        commission_rate=None; hit_rate=None; fa_rate=None; d_prime=None
-
-    # Корреляция между скоростью и точностью
-    rt_all=[]; corr_all=[]
-    for t in trials:
-        if t.rt_ms is not None and not t.is_timeout:
-            rt_all.append(float(t.rt_ms))
-            corr_all.append(1.0 if t.is_correct else 0.0)
-    speed_accuracy_r=stats.pearson_r(rt_all, corr_all)
-
-    # Возвращает полный набор метрик
-    return {
-        "counts": {"total_trials": total,"correct":correct,"wrong":wrong,"commission":commission,"omission":omission,"anticipation":anticipation,"timeout":timeout,"go_trials":go_trials,"nogo_trials":n[...]
-        "rt": {"n_valid":len(rt_valid),"mean_rt_ms":mean_rt,"median_rt_ms":median_rt,"rt_std_ms":rt_std,"rt_cv":rt_cv,"rt_slope_ms_per_trial":rt_slope,"lapses_gt_ms":lapse_ms,"lapses_count":lapses,"la[...]
-        "rates": {"accuracy":accuracy,"omission_rate":omission_rate,"commission_error_rate":commission_rate,"timeout_rate":timeout_rate,"anticipation_rate":anticipation_rate,"hit_rate":hit_rate,"false[...]
-        "speed_accuracy": {"pearson_r_rt_correctness": speed_accuracy_r},
-        "bounds": {"min_rt_ms": bounds.min_rt_ms, "max_rt_ms": bounds.max_rt_ms, "timeout_ms": bounds.timeout_ms},
-    }
-
-def analyze_and_report(log_path: str, task: str, config_path: Optional[str]=None) -> Dict[str, Any]:
-    # Полный анализ сессии: обработка логов, вычисление метрик, генерация отчёта
-    cfg=ProjectConfig.load(config_path)
-    trials, meta = build_trials(log_path, task, cfg)  # Парсит и классифицирует испытания
-    metrics = compute_metrics(trials, task, cfg)  # Вычисляет метрики
-    flags = compute_state_flags(trials, metrics, task, cfg)  # Генерирует флаги состояния
+def _rolling(trials: Sequence[TrialOutcome], cfg: ProjectConfig, metrics: Dict[str, Any], profile: Optional[PipelineProfile]) -> None:
+    # Скользящие метрики по окнам триалов (analysis.rolling_mode) — в metrics["rolling"]; до флагов, которые могут их использовать
+    with stage(profile, "rolling"):
+        rolling = rolling_metrics(trials, cfg)
+    if rolling is not None:
+        metrics["rolling"] = rolling
 
-    # Сохраняет результаты в файлы
-    session_name=os.path.splitext(os.path.basename(log_path))[0]
-    out_dir=os.path.join("reports", session_name)
+def _bootstrap(trials: Sequence[TrialOutcome], task: str, cfg: ProjectConfig, metrics: Dict[str, Any], profile: Optional[PipelineProfile]) -> None:
+    # Бутстреп-интервалы метрик и решающих статистик флагов (analysis.bootstrap_resamples > 0) — в metrics["bootstrap"]
+    if cfg.analysis.bootstrap_resamples > 0:
+        with stage(profile, "bootstrap"):
+            metrics["bootstrap"] = bootstrap_metrics(trials, task, cfg)
+
+def report_dir(log_path: LogPath, out_root: str="reports") -> str:
+    # Каталог отчёта сессии: <out_root>/<имя лога без расширения> (у шардов — общий префикс имён)
+    return os.path.join(out_root, log_name(log_path))
+
+def _write_report(out_dir: str, meta: Dict[str, Any], trials: Sequence[TrialOutcome], metrics: Dict[str, Any], flags: Dict[str, Any],
+                  report_cfg: Optional[ReportCfg]=None, profile: Optional[PipelineProfile]=None) -> Dict[str, Any]:
+    # Сохраняет report.html и summary.json в каталог отчёта; профиль (если есть) — в meta["profile"]
     os.makedirs(out_dir, exist_ok=True)
+    with stage(profile, "report_html"):
+        with open(os.path.join(out_dir,"report.html"),"w",encoding="utf-8") as f:
+            write_report_html(f, meta, trials, metrics, flags, report_cfg)  # HTML-отчёт пишется в файл по частям
 
-    summary={"meta":meta,"metrics":metrics,"flags":flags}
+    with stage(profile, "partials"):
+        summary={"meta":meta,"metrics":metrics,"flags":flags,"partials":session_partials(trials)}  # partials — для когортного отчёта
+    if profile is not None:
+        meta["profile"]=profile.to_dict()
     with open(os.path.join(out_dir,"summary.json"),"w",encoding="utf-8") as f:
         json.dump(summary,f,ensure_ascii=False,indent=2)
+    return summary
+
+def _dataset(dataset_dir: Optional[str], cfg: ProjectConfig, writer: Optional[DatasetWriter]=None) -> Any:
+    # Писатель колоночного датасета (части публикуются при выходе из with) или пустой контекст;
+    # общий writer (например, один на рабочий процесс пакета) здесь не закрывается
+    if writer is not None:
+        return nullcontext(writer)
+    return DatasetWriter(dataset_dir, cfg.dataset) if dataset_dir else nullcontext(None)
+
+def _export_cached(dataset_dir: Optional[str], cfg: ProjectConfig, cache: ResultCache, key: str, summaries: List[Dict[str, Any]],
+                   writer: Optional[DatasetWriter]=None) -> None:
+    # Результат из кэша попадает в датасет, только если его там ещё нет (source — ключ кэша): триалы — из записи кэша
+    with _dataset(dataset_dir, cfg, writer) as ds:
+        if ds is not None and not ds.has_source(key):
+            for i, s in enumerate(summaries):
+                ds.append(cache.load_trials(key, i), s["meta"], s["metrics"], s["flags"], source=key)
 
-    html = build_report_html(meta, trials, metrics, flags)  # Генерирует HTML-отчёт
-    with open(os.path.join(out_dir,"report.html"),"w",encoding="utf-8") as f:
-        f.write(html)
+def analyze_and_report(log_path: LogPath, task: str, config_path: Optional[str]=None, out_root: str="reports",
+                       cache: Optional[ResultCache]=None, dataset_dir: Optional[str]=None,
+                       dataset: Optional[DatasetWriter]=None) -> Dict[str, Any]:
+    # Полный анализ сессии: обработка логов, вычисление метрик, генерация отчёта;
+    # с dataset_dir триалы и метрики дописываются в колоночный датасет (см. dataset),
+    # с dataset — в уже открытый писатель, который закрывает вызывающий
+    cfg=ProjectConfig.load(config_path)
+    out_dir=report_dir(log_path, out_root)
+    profile=PipelineProfile()  # Время этапов и счётчики — в meta["profile"]
+    if cache is not None:
+        # Лог, конфигурация и версия не менялись — отчёт восстанавливается из кэша
+        with profile.stage("cache_lookup"):
+            key=cache.key(log_path, cfg, task)
+            hit=cache.restore(key, log_path, out_dir, cfg.report)
+        if hit is not None:
+            _export_cached(dataset_dir, cfg, cache, key, hit, dataset)
+            return hit[0]
+    trials, meta = build_trial_table(log_path, task, cfg, profile=profile)  # Парсит и классифицирует испытания
+    with profile.stage("metrics"):
+        metrics = compute_metrics(trials, task, cfg)  # Вычисляет метрики
+    _rolling(trials, cfg, metrics, profile)
+    with profile.stage("flags"):
+        flags = compute_state_flags(trials, metrics, task, cfg)  # Генерирует флаги состояния
+    _bootstrap(trials, task, cfg, metrics, profile)
+    if dataset_dir or dataset is not None:
+        with profile.stage("dataset"), _dataset(dataset_dir, cfg, dataset) as ds:
+            ds.append(trials, meta, metrics, flags, source=key if cache is not None else None)
+
+    # Сохраняет результаты в файлы
+    summary = _write_report(out_dir, meta, trials, metrics, flags, cfg.report, profile)
+    if cache is not None:
+        cache.put(key, log_path, out_dir, [(out_dir, summary, trials)])
     return summary
+
+def _safe_name(s: str) -> str:
+    return re.sub(r"[^\w.-]+", "_", s) or "_"
+
+def analyze_runs_and_report(log_path: LogPath, config_path: Optional[str]=None, task: Optional[str]=None, out_root: str="reports",
+                            cache: Optional[ResultCache]=None, dataset_dir: Optional[str]=None,
+                            dataset: Optional[DatasetWriter]=None) -> List[Dict[str, Any]]:
+    # Анализ всех запусков лога за одно чтение: отчёт каждого запуска в <report_dir>/<run_id>/
+    cfg=ProjectConfig.load(config_path)
+    base_dir=report_dir(log_path, out_root)
+    profile=PipelineProfile()
+    if cache is not None:
+        with profile.stage("cache_lookup"):
+            key=cache.key(log_path, cfg, task, mode="runs")
+            hit=cache.restore(key, log_path, base_dir, cfg.report)
+        if hit is not None:
+            _export_cached(dataset_dir, cfg, cache, key, hit, dataset)
+            return hit
+    summaries=[]
+    reports=[]
+    runs=build_runs(log_path, cfg, task=task, profile=profile)
+    with _dataset(dataset_dir, cfg, dataset) as ds:  # Один писатель на лог: триалы запусков одной партиции — в одной части
+        for (session_id, run_id), (trials, meta) in runs.items():
+            run_task=meta["task"]
+            run_prof=meta.pop("profile")  # Общие этапы лога + этапы этого запуска
+            with run_prof.stage("metrics"):
+                metrics = compute_metrics(trials, run_task, cfg)
+            _rolling(trials, cfg, metrics, run_prof)
+            with run_prof.stage("flags"):
+                flags = compute_state_flags(trials, metrics, run_task, cfg)
+            _bootstrap(trials, run_task, cfg, metrics, run_prof)
+            if ds is not None:
+                with run_prof.stage("dataset"):
+                    ds.append(trials, meta, metrics, flags, source=key if cache is not None else None)
+            out_dir=os.path.join(base_dir, _safe_name(run_id))
+            meta["out_dir"]=out_dir
+            summaries.append(_write_report(out_dir, meta, trials, metrics, flags, cfg.report, run_prof))
+            reports.append((out_dir, summaries[-1], trials))
+    if cache is not None:
+        cache.put(key, log_path, base_dir, reports)
+    return summaries
@@ -0,0 +1,145 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+import glob, json, multiprocessing.util, os, sys, time, traceback
+
+from .analyzer import analyze_and_report, analyze_runs_and_report, report_dir
+from .cache import ResultCache
+from .config import ProjectConfig
+from .dataset import DatasetWriter
+
+_worker_dataset: Optional[DatasetWriter] = None  # Писатель датасета рабочего процесса run_batch
+
+def discover_logs(target: str, pattern: str="*.jsonl") -> List[str]:
+    # Каталог (рекурсивно по pattern), glob-шаблон или один файл
+    if os.path.isdir(target):
+        paths = glob.glob(os.path.join(target, "**", pattern), recursive=True)
+    elif glob.has_magic(target):
+        paths = glob.glob(target, recursive=True)
+    else:
+        paths = [target]
+    return sorted(p for p in paths if os.path.isfile(p))
+
+def report_roots(paths: List[str], out_root: str="reports") -> List[str]:
+    # Каталог отчётов каждого лога: подкаталоги повторяют расположение логов относительно их общего каталога,
+    # поэтому одноимённые логи из разных каталогов (a/s.jsonl, b/s.jsonl) не пишут в один <out>/s
+    dirs = [os.path.dirname(os.path.abspath(p)) for p in paths]
+    base = os.path.commonpath(dirs) if dirs else ""
+    roots = [os.path.normpath(os.path.join(out_root, os.path.relpath(d, base))) for d in dirs]
+    seen: Dict[str, str] = {}
+    for p, r in zip(paths, roots):
+        out = report_dir(p, r)
+        if out in seen:  # Например, s.jsonl и s.rtb в одном каталоге
+            raise ValueError(f"logs {seen[out]} and {p} would write the same report directory {out}")
+        seen[out] = p
+    return roots
+
+def _index_row(log_path: str, out_dir: str, summary: Dict[str, Any]) -> Dict[str, Any]:
+    # Краткая строка сводного индекса по одной сессии
+    metrics = summary.get("metrics", {})
+    rt = metrics.get("rt", {}); rates = metrics.get("rates", {})
+    return {
+        "log_path": log_path, "status": "ok", "out_dir": out_dir,
+        "task": summary.get("meta", {}).get("task"),
+        "n_trials": summary.get("meta", {}).get("n_trials"),
+        "mean_rt_ms": rt.get("mean_rt_ms"), "rt_cv": rt.get("rt_cv"),
+        "accuracy": rates.get("accuracy"), "d_prime": rates.get("d_prime"),
+        "flags": {k: v.get("value") for k, v in summary.get("flags", {}).items()},
+    }
+
+def _init_worker(dataset_dir: Optional[str], config_path: Optional[str]) -> None:
+    # Один писатель датасета на рабочий процесс: части публикуются при завершении процесса (после shutdown пула)
+    global _worker_dataset
+    if dataset_dir:
+        _worker_dataset = DatasetWriter(dataset_dir, ProjectConfig.load(config_path).dataset)
+        multiprocessing.util.Finalize(_worker_dataset, _worker_dataset.close, exitpriority=10)
+
+def analyze_one(log_path: str, task: Optional[str], config_path: Optional[str]=None, out_root: str="reports",
+                cache_dir: Optional[str]=None, dataset_dir: Optional[str]=None,
+                dataset: Optional[DatasetWriter]=None) -> Dict[str, Any]:
+    # Анализ одной сессии в рабочем процессе; ошибка возвращается строкой индекса, а не исключением.
+    # Без task каждый запуск (run_id) анализируется отдельно и попадает в "runs".
+    # Кэш здесь не вытесняет записи — это делает run_batch один раз в конце; датасет пишется в общий
+    # писатель (dataset или писатель рабочего процесса), если он есть, иначе — в свой по dataset_dir
+    t_start = time.perf_counter()
+    cache = ResultCache(cache_dir, auto_evict=False) if cache_dir else None
+    dataset = dataset if dataset is not None else _worker_dataset
+    try:
+        if task:
+            summary = analyze_and_report(log_path, task, config_path=config_path, out_root=out_root, cache=cache,
+                                         dataset_dir=dataset_dir, dataset=dataset)
+            row = _index_row(log_path, report_dir(log_path, out_root), summary)
+        else:
+            runs = [_index_row(log_path, s["meta"]["out_dir"], s) for s in analyze_runs_and_report(log_path, config_path=config_path, out_root=out_root, cache=cache,
+                                                                                                      dataset_dir=dataset_dir, dataset=dataset)]
+            for r in runs:
+                del r["status"], r["log_path"]
+            row = {"log_path": log_path, "status": "ok", "out_dir": report_dir(log_path, out_root), "runs": runs}
+    except Exception as e:
+        row = {"log_path": log_path, "status": "error", "error": f"{type(e).__name__}: {e}",
+               "traceback": traceback.format_exc(limit=5)}
+    if cache is not None and row["status"] == "ok":
+        row["cache"] = "hit" if cache.last_hit else "miss"
+    row["elapsed_s"] = time.perf_counter() - t_start
+    return row
+
+def run_batch(paths: Iterable[str], task: Optional[str], config_path: Optional[str]=None, out_root: str="reports",
+              workers: Optional[int]=None, index_path: Optional[str]=None,
+              progress: Optional[TextIO]=sys.stderr, cache_dir: Optional[str]=None,
+              cache_max_bytes: Optional[int]=512 << 20, dataset_dir: Optional[str]=None) -> Dict[str, Any]:
+    """Анализирует много сессий в пуле процессов.
+
+    Строки индекса (по одной на сессию) дописываются в ``index_path`` в формате
+    JSONL по мере готовности. Отчёты раскладываются по подкаталогам
+    ``out_root`` так же, как логи лежат относительно их общего каталога
+    (см. ``report_roots``). Ошибка одной сессии не прерывает запуск.
+    С ``cache_dir`` неизменённые логи берутся из ResultCache; кэш
+    вытесняется до ``cache_max_bytes`` после завершения. С ``dataset_dir``
+    триалы и метрики всех сессий дописываются в колоночный датасет через
+    один писатель на процесс (см. dataset): файлов частей на партицию столько,
+    сколько рабочих процессов, а не сессий.
+    """
+    paths = list(paths)
+    roots = report_roots(paths, out_root)  # До запуска: совпадение каталогов отчётов — ошибка, а не перезапись
+    workers = workers or os.cpu_count() or 1
+    index_path = index_path or os.path.join(out_root, "index.jsonl")
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    n_ok = n_err = 0
+    n_hits = 0
+    t_start = time.perf_counter()
+
+    def report(row: Dict[str, Any], idx: Any) -> None:
+        nonlocal n_ok, n_err, n_hits
+        if row["status"] == "ok": n_ok += 1
+        else: n_err += 1
+        if row.get("cache") == "hit": n_hits += 1
+        idx.write(json.dumps(row, ensure_ascii=False) + "\n"); idx.flush()
+        if progress is not None:
+            done = n_ok + n_err
+            rate = done / max(time.perf_counter() - t_start, 1e-9)
+            progress.write(f"\r[{done}/{len(paths)}] {rate:.1f} sessions/s, errors: {n_err}")
+            progress.flush()
+
+    with open(index_path, "w", encoding="utf-8") as idx:
+        if workers <= 1:
+            with DatasetWriter(dataset_dir, ProjectConfig.load(config_path).dataset) if dataset_dir else nullcontext(None) as ds:
+                for p, root in zip(paths, roots):
+                    report(analyze_one(p, task, config_path, root, cache_dir, dataset_dir, ds), idx)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(dataset_dir, config_path)) as ex:
+                futs = {ex.submit(analyze_one, p, task, config_path, root, cache_dir, dataset_dir): p for p, root in zip(paths, roots)}
+                for fut in as_completed(futs):
+                    try:
+                        row = fut.result()
+                    except Exception as e:  # Рабочий процесс упал целиком
+                        row = {"log_path": futs[fut], "status": "error", "error": f"{type(e).__name__}: {e}"}
+                    report(row, idx)
+    if cache_dir:
+        ResultCache(cache_dir, max_bytes=cache_max_bytes).evict()
+    elapsed = time.perf_counter() - t_start
+    if progress is not None:
+        progress.write("\n"); progress.flush()
+    return {"n_sessions": len(paths), "ok": n_ok, "errors": n_err, "elapsed_s": elapsed,
+            "sessions_per_s": (len(paths) / elapsed) if elapsed > 0 else None, "index_path": index_path,
+            "cache_hits": n_hits if cache_dir else None}
@@ -0,0 +1,131 @@
+from __future__ import annotations
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import gc, json, os, platform, sys, time, tracemalloc
+
+from . import __version__
+from .config import ProjectConfig
+from .event_log import available_json_backends, read_events, read_jsonl
+from .analyzer import build_trials, compute_metrics
+from .state_flags import compute_state_flags
+from .report_html import build_report_html
+from .synthetic import SyntheticSpec, write_synthetic_log
+
+# Этапы конвейера в порядке выполнения; каждый получает состояние предыдущих
+STAGES = ("read_jsonl", "read_events", "build_trials", "compute_metrics", "compute_state_flags", "build_report_html")
+EVENT_STAGES = ("read_jsonl", "read_events", "build_trials")  # Пропускная способность — в событиях/с, у остальных — в триалах/с
+DEPS = {"compute_metrics": ("build_trials",), "compute_state_flags": ("build_trials", "compute_metrics"),
+        "build_report_html": ("build_trials", "compute_metrics", "compute_state_flags")}
+
+def _stage_fns(log_path: str, task: str, cfg: ProjectConfig) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    def _count(it: Any) -> int:
+        n = 0
+        for _ in it: n += 1
+        return n
+    return {
+        "read_jsonl": lambda st: _count(read_jsonl(log_path)),
+        "read_events": lambda st: _count(read_events(log_path)),
+        "build_trials": lambda st: build_trials(log_path, task, cfg),
+        "compute_metrics": lambda st: compute_metrics(st["build_trials"][0], task, cfg),
+        "compute_state_flags": lambda st: compute_state_flags(st["build_trials"][0], st["compute_metrics"], task, cfg),
+        "build_report_html": lambda st: build_report_html(st["build_trials"][1], st["build_trials"][0], st["compute_metrics"],
+                                                          st["compute_state_flags"], cfg.report),
+    }
+
+def ensure_log(spec: SyntheticSpec, workdir: str) -> str:
+    # Лог спецификации в workdir; генерируется один раз и переиспользуется (генератор детерминирован)
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, spec.name() + ".jsonl")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        write_synthetic_log(tmp, spec)
+        os.replace(tmp, path)
+    return path
+
+def run_case(spec: SyntheticSpec, cfg: ProjectConfig, workdir: str, repeat: int=3, memory: bool=True,
+             stages: Sequence[str]=STAGES) -> Dict[str, Any]:
+    """Замер одного лога: для каждого этапа — минимальное по ``repeat`` прогонам wall/CPU-время,
+    пик памяти (отдельный прогон под tracemalloc) и пропускная способность."""
+    log_path = ensure_log(spec, workdir)
+    with open(log_path, "rb") as f:
+        n_events = sum(1 for _ in f)
+    fns = _stage_fns(log_path, spec.task, cfg)
+    needed = set(stages).union(*(DEPS.get(s, ()) for s in stages))
+    state: Dict[str, Any] = {}
+    res: Dict[str, Dict[str, Any]] = {}
+    for name in STAGES:
+        if name not in needed:
+            continue
+        fn = fns[name]
+        best = None
+        for _ in range(max(1, repeat) if name in stages else 1):
+            gc.collect()
+            w0 = time.perf_counter(); c0 = time.process_time()
+            out = fn(state)
+            w = time.perf_counter() - w0; c = time.process_time() - c0
+            if best is None or w < best[0]:
+                best = (w, c)
+        state[name] = out
+        if name not in stages:
+            continue  # Этап нужен только как вход следующим
+        assert best is not None
+        r: Dict[str, Any] = {"wall_s": best[0], "cpu_s": best[1]}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            try:
+                fn(state)
+                r["peak_mem_kb"] = tracemalloc.get_traced_memory()[1] / 1024.0
+            finally:
+                tracemalloc.stop()
+        units = n_events if name in EVENT_STAGES else len(state["build_trials"][0])
+        r["throughput_per_s"] = units / best[0] if best[0] > 0 else None
+        r["unit"] = "events" if name in EVENT_STAGES else "trials"
+        res[name] = r
+    n_trials = len(state["build_trials"][0]) if "build_trials" in state else None
+    return {"spec": asdict(spec), "n_events": n_events, "n_trials": n_trials, "log_bytes": os.path.getsize(log_path), "stages": res}
+
+def run_suite(specs: Sequence[SyntheticSpec], cfg: ProjectConfig, workdir: str, repeat: int=3, memory: bool=True,
+              stages: Sequence[str]=STAGES, progress: Optional[Callable[[str, Dict[str, Any]], None]]=None) -> Dict[str, Any]:
+    cases: Dict[str, Any] = {}
+    for spec in specs:
+        cases[spec.name()] = case = run_case(spec, cfg, workdir, repeat=repeat, memory=memory, stages=stages)
+        if progress is not None:
+            progress(spec.name(), case)
+    meta = {"version": __version__, "python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine(),
+            "json_backend": available_json_backends()[0], "created_unix": time.time(), "repeat": repeat, "memory": memory}
+    return {"meta": meta, "cases": cases}
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float=0.2, min_delta_s: float=0.005) -> List[Dict[str, Any]]:
+    """Сравнение с базовой линией по общим (случай, этап).
+
+    Регрессия — время больше базового в ``1 + threshold`` раз и не меньше чем
+    на ``min_delta_s`` секунд (шум коротких этапов), либо пик памяти больше
+    базового в ``1 + threshold`` раз.
+    """
+    rows = []
+    for name, case in results.get("cases", {}).items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            continue
+        for stage, r in case["stages"].items():
+            b = base["stages"].get(stage)
+            if b is None:
+                continue
+            ratio = r["wall_s"] / b["wall_s"] if b["wall_s"] > 0 else None
+            slow = ratio is not None and ratio > 1.0 + threshold and r["wall_s"] - b["wall_s"] >= min_delta_s
+            mem_ratio = (r["peak_mem_kb"] / b["peak_mem_kb"]) if r.get("peak_mem_kb") and b.get("peak_mem_kb") else None
+            fat = mem_ratio is not None and mem_ratio > 1.0 + threshold
+            rows.append({"case": name, "stage": stage, "wall_s": r["wall_s"], "base_wall_s": b["wall_s"], "ratio": ratio,
+                         "mem_ratio": mem_ratio, "regression": slow or fat})
+    return rows
+
+def save_results(path: str, results: Dict[str, Any]) -> None:
+    d = os.path.dirname(path)
+    if d: os.makedirs(d, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
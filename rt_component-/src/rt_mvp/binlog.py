@@ -0,0 +1,308 @@
+"""Бинарный append-only формат событий base_event.
+
+Файл: ``MAGIC``, затем записи трёх видов (первый байт — тег):
+
+* ``STR``   — ``<BI`` (тег, длина) + UTF-8. Строка получает следующий id
+  (с 1, 0 — «нет значения»); каждая строка пишется в файл один раз.
+* ``SHAPE`` — ``<BI`` (тег, число полей) + ``<IB`` на поле (id ключа, тип).
+  Описывает набор и порядок дополнительных полей события и получает
+  следующий id формы (с 1, 0 — дополнительных полей нет).
+* ``EVT``   — заголовок фиксированной ширины ``_EVT``: маска присутствия,
+  schema_version, t_mono, t_unix, trial_id, block_id, id строк instrument,
+  session_id, run_id, event_type и id формы; за ним значения
+  дополнительных полей, упакованные структурой формы (все значения
+  фиксированной ширины: строки и вложенные JSON-значения — id строк).
+
+Поле попадает в фиксированную часть только при точном совпадении типа
+(например, t_mono — float), иначе уходит в дополнительные: преобразование
+JSONL -> бинарный -> JSONL сохраняет значения и порядок ключей. Недописанная
+последняя запись (обрыв записи) при чтении игнорируется.
+"""
+from __future__ import annotations
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+import json, mmap, os, struct
+
+MAGIC = b"RTBL\x00\x01\r\n"
+EXT = ".rtb"
+
+_TAG_STR = 1
+_TAG_EVT = 2
+_TAG_SHAPE = 3
+_HDR = struct.Struct("<BI")  # Заголовок записей STR и SHAPE
+_FIELD = struct.Struct("<IB")
+# тег, маска присутствия, schema_version, t_mono, t_unix, trial_id, block_id, instrument, session_id, run_id, event_type, форма
+_EVT = struct.Struct("<BHHddqqIIIII")
+
+# Поля фиксированной части в порядке base_event
+_CORE = ("schema_version", "instrument", "session_id", "run_id", "event_type", "t_mono", "t_unix", "trial_id", "block_id")
+_BIT = {k: 1 << i for i, k in enumerate(_CORE)}
+_ALL_CORE = (1 << len(_CORE)) - 1
+_STR_CORE = ("instrument", "session_id", "run_id", "event_type")
+_INT64 = (-(1 << 63), (1 << 63) - 1)
+
+# Типы дополнительных полей и их коды в struct (константы места не занимают)
+_T_NULL, _T_TRUE, _T_FALSE, _T_INT, _T_FLOAT, _T_STR, _T_JSON = range(7)
+_T_CODE = {_T_NULL: "", _T_TRUE: "", _T_FALSE: "", _T_INT: "q", _T_FLOAT: "d", _T_STR: "I", _T_JSON: "I"}
+_CONST = {_T_NULL: None, _T_TRUE: True, _T_FALSE: False}
+
+def is_binlog(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _core_ok(k: str, v: Any) -> bool:
+    # Можно ли положить значение в фиксированную часть без потери типа
+    if k == "schema_version":
+        return type(v) is int and 0 <= v <= 0xFFFF
+    if k in ("t_mono", "t_unix"):
+        return type(v) is float
+    if k in ("trial_id", "block_id"):
+        return type(v) is int and _INT64[0] <= v <= _INT64[1]
+    return type(v) is str
+
+def _ext_type(v: Any) -> int:
+    if v is None: return _T_NULL
+    if v is True: return _T_TRUE
+    if v is False: return _T_FALSE
+    if type(v) is int and _INT64[0] <= v <= _INT64[1]: return _T_INT
+    if type(v) is float: return _T_FLOAT
+    if type(v) is str: return _T_STR
+    return _T_JSON
+
+class BinlogWriter:
+    """Кодирует события в записи формата; таблицы строк и форм общие на файл."""
+
+    def __init__(self, f: BinaryIO, strings: Optional[Dict[str, int]]=None, shapes: Optional[Dict[Tuple[Any, ...], int]]=None):
+        self.f = f
+        self.ids: Dict[str, int] = dict(strings or {})
+        self.shapes: Dict[Tuple[Any, ...], int] = dict(shapes or {})
+
+    @classmethod
+    def open(cls, path: str) -> "BinlogWriter":
+        # Открывает файл на дозапись, восстанавливая таблицы уже записанной части
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            if not is_binlog(path):
+                raise ValueError(f"not a binary event log: {path}")
+            strings, shapes, end = _scan_tables(path)
+            f = open(path, "r+b")
+            f.truncate(end)  # Отрезаем недописанную запись, иначе следующие станут нечитаемыми
+            f.seek(end)
+            return cls(f, {s: i for i, s in enumerate(strings) if i}, {sh.key: i for i, sh in enumerate(shapes) if i})
+        f = open(path, "wb")
+        f.write(MAGIC)
+        return cls(f)
+
+    def _sid(self, s: str, out: List[bytes]) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.ids) + 1
+            b = s.encode("utf-8")
+            out.append(_HDR.pack(_TAG_STR, len(b)) + b)
+        return i
+
+    def _shape_id(self, fields: Tuple[Tuple[int, int], ...], out: List[bytes]) -> int:
+        i = self.shapes.get(fields)
+        if i is None:
+            i = self.shapes[fields] = len(self.shapes) + 1
+            out.append(_HDR.pack(_TAG_SHAPE, len(fields)) + b"".join(_FIELD.pack(k, t) for k, t in fields))
+        return i
+
+    def _ext(self, k: str, v: Any, fields: List[Tuple[int, int]], vals: List[Any], out: List[bytes]) -> None:
+        t = _ext_type(v)
+        fields.append((self._sid(k, out), t))
+        if t == _T_STR: vals.append(self._sid(v, out))
+        elif t == _T_JSON: vals.append(self._sid(json.dumps(v, ensure_ascii=False), out))
+        elif t == _T_INT or t == _T_FLOAT: vals.append(v)
+
+    def encode(self, ev: Dict[str, Any]) -> bytes:
+        out: List[bytes] = []
+        present = 0
+        core: Dict[str, Any] = {}
+        fields: List[Tuple[int, int]] = []
+        vals: List[Any] = []
+        for k, v in ev.items():
+            bit = _BIT.get(k)
+            # В фиксированную часть — только в порядке _CORE и до дополнительных полей, иначе порядок ключей потеряется
+            if bit is not None and bit > present and not fields and _core_ok(k, v):
+                present |= bit
+                core[k] = self._sid(v, out) if k in _STR_CORE else v
+            else:
+                self._ext(k, v, fields, vals, out)
+        shape = self._shape_id(tuple(fields), out) if fields else 0
+        out.append(_EVT.pack(_TAG_EVT, present, core.get("schema_version", 0), core.get("t_mono", 0.0), core.get("t_unix", 0.0),
+                             core.get("trial_id", 0), core.get("block_id", 0), core.get("instrument", 0), core.get("session_id", 0),
+                             core.get("run_id", 0), core.get("event_type", 0), shape))
+        if fields:
+            out.append(struct.pack("<" + "".join(_T_CODE[t] for _, t in fields), *vals))
+        return b"".join(out)
+
+    def write(self, ev: Dict[str, Any]) -> None:
+        self.f.write(self.encode(ev))
+
+    def close(self) -> None:
+        self.f.close()
+
+class _Shape:
+    # Форма дополнительных полей: имена ключей, структура значений и их типы
+    __slots__ = ("key", "names", "st", "kinds", "simple")
+
+    def __init__(self, fields: Tuple[Tuple[int, int], ...], strings: List[Any]):
+        self.key = fields
+        self.names = [strings[k] for k, _ in fields]
+        self.st = struct.Struct("<" + "".join(_T_CODE[t] for _, t in fields))
+        self.kinds = [t for _, t in fields]
+        self.simple = all(t in (_T_INT, _T_FLOAT, _T_STR) for t in self.kinds)  # Без констант и JSON
+
+    def decode(self, buf: Any, pos: int, strings: List[Any], ev: Dict[str, Any]) -> None:
+        raw = self.st.unpack_from(buf, pos)
+        if self.simple:
+            for name, t, v in zip(self.names, self.kinds, raw):
+                ev[name] = strings[v] if t == _T_STR else v
+            return
+        it = iter(raw)
+        for name, t in zip(self.names, self.kinds):
+            if t in _CONST: ev[name] = _CONST[t]
+            elif t == _T_STR: ev[name] = strings[next(it)]
+            elif t == _T_JSON: ev[name] = json.loads(strings[next(it)])
+            else: ev[name] = next(it)
+
+_EMPTY_SHAPE = _Shape((), [None])
+
+def _records(buf: Any, strings: List[Any], shapes: List[_Shape], on_string: Any=None) -> Iterator[Tuple[int, Any]]:
+    # Обходит записи; строки и формы пополняют таблицы, для событий выдаётся (смещение значений, заголовок)
+    pos = len(MAGIC)
+    end = len(buf)
+    hsize = _EVT.size
+    unpack_evt = _EVT.unpack_from
+    while pos < end:
+        tag = buf[pos]
+        if tag == _TAG_EVT:
+            if pos + hsize > end: return
+            h = unpack_evt(buf, pos)
+            if h[11] >= len(shapes):
+                raise ValueError(f"corrupt binary event log at offset {pos}")
+            nxt = pos + hsize + shapes[h[11]].st.size
+            if nxt > end: return
+            yield pos + hsize, h
+            pos = nxt
+        elif tag == _TAG_STR or tag == _TAG_SHAPE:
+            if pos + _HDR.size > end: return
+            _, n = _HDR.unpack_from(buf, pos)
+            body = pos + _HDR.size
+            if tag == _TAG_STR:
+                if body + n > end: return
+                s = bytes(buf[body:body + n]).decode("utf-8")
+                strings.append(s)
+                if on_string is not None: on_string(s, len(strings) - 1)
+                pos = body + n
+            else:
+                if body + n * _FIELD.size > end: return
+                fields = tuple(_FIELD.unpack_from(buf, body + i * _FIELD.size) for i in range(n))
+                shapes.append(_Shape(fields, strings))
+                pos = body + n * _FIELD.size
+        else:
+            raise ValueError(f"corrupt binary event log at offset {pos}")
+
+def _scan_tables(path: str) -> Tuple[List[Any], List[_Shape], int]:
+    # Таблицы строк и форм и смещение конца последней целой записи
+    strings: List[Any] = [None]
+    shapes: List[_Shape] = [_EMPTY_SHAPE]
+    end = len(MAGIC)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size > len(MAGIC):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for pos, h in _records(mm, strings, shapes):
+                    end = pos + shapes[h[11]].st.size
+                # Целые записи строк/форм после последнего события (их _records уже учёл)
+                pos = end
+                while pos + _HDR.size <= len(mm) and mm[pos] in (_TAG_STR, _TAG_SHAPE):
+                    tag, n = _HDR.unpack_from(mm, pos)
+                    nxt = pos + _HDR.size + (n if tag == _TAG_STR else n * _FIELD.size)
+                    if nxt > len(mm): break
+                    pos = nxt
+                end = pos
+    return strings, shapes, end
+
+def read_binlog(path: str, event_types: Optional[Sequence[str]]=None, instrument: Optional[str]=None,
+                counters: Optional[Dict[str, int]]=None) -> Iterator[Dict[str, Any]]:
+    """Читает бинарный лог. Фильтры по event_type/instrument сравнивают id строк до декодирования события.
+
+    Семантика фильтров и счётчиков ``counters`` как у ``event_log.read_jsonl_filtered``:
+    событие без ``instrument`` проходит фильтр по инструменту.
+    """
+    types = frozenset(event_types) if event_types else None
+    want = set()  # id строк из event_types
+    inst_id = [-1]  # id строки instrument
+
+    def on_string(s: str, i: int) -> None:
+        if types is not None and s in types: want.add(i)
+        if s == instrument: inst_id[0] = i
+
+    bit_et = _BIT["event_type"]; bit_inst = _BIT["instrument"]
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"not a binary event log: {path}")
+            strings: List[Any] = [None]
+            shapes: List[_Shape] = [_EMPTY_SHAPE]
+            n_rec = n_type = n_inst = n_out = 0
+            try:
+                for pos, h in _records(mm, strings, shapes, on_string):
+                    n_rec += 1
+                    present = h[1]
+                    if types is not None and present & bit_et and h[10] not in want: n_type += 1; continue
+                    if instrument is not None and present & bit_inst and h[7] != inst_id[0]: n_inst += 1; continue
+                    ev: Dict[str, Any] = {}
+                    if present == _ALL_CORE:
+                        ev["schema_version"] = h[2]; ev["instrument"] = strings[h[7]]; ev["session_id"] = strings[h[8]]
+                        ev["run_id"] = strings[h[9]]; ev["event_type"] = strings[h[10]]; ev["t_mono"] = h[3]; ev["t_unix"] = h[4]
+                        ev["trial_id"] = h[5]; ev["block_id"] = h[6]
+                    elif present:
+                        vals = (h[2], strings[h[7]], strings[h[8]], strings[h[9]], strings[h[10]], h[3], h[4], h[5], h[6])
+                        for k, v in zip(_CORE, vals):
+                            if present & _BIT[k]: ev[k] = v
+                    shape = shapes[h[11]]
+                    if shape.names:
+                        shape.decode(mm, pos, strings, ev)
+                    # Поля не строкового типа лежат среди дополнительных — проверяем после декодирования
+                    if types is not None and not present & bit_et and ev.get("event_type") not in types: n_type += 1; continue
+                    if instrument is not None and not present & bit_inst and ev.get("instrument") not in (None, instrument): n_inst += 1; continue
+                    n_out += 1
+                    yield ev
+            finally:
+                if counters is not None:
+                    for k, v in (("lines", n_rec), ("dropped_event_type", n_type), ("dropped_instrument", n_inst), ("events_read", n_out)):
+                        counters[k] = counters.get(k, 0) + v
+
+def read_string_table(path: str) -> List[str]:
+    return _scan_tables(path)[0][1:]
+
+def jsonl_to_binlog(src: str, dst: str) -> int:
+    # Конвертирует JSONL в бинарный лог (dst перезаписывается); возвращает число событий
+    n = 0
+    if os.path.exists(dst): os.remove(dst)
+    w = BinlogWriter.open(dst)
+    try:
+        with open(src, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                w.write(json.loads(line)); n += 1
+    finally:
+        w.close()
+    return n
+
+def binlog_to_jsonl(src: str, dst: str) -> int:
+    # Конвертирует бинарный лог обратно в JSONL (формат строк как у JsonlSink)
+    n = 0
+    with open(dst, "w", encoding="utf-8") as f:
+        for ev in read_binlog(src):
+            f.write(json.dumps(ev, ensure_ascii=False) + "\n"); n += 1
+    return n
@@ -0,0 +1,385 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import math, multiprocessing, os, random
+
+from .config import ProjectConfig
+from . import stats, vectorized
+from .quantiles import percentile_key, quantiles
+from .state_flags import _ERROR_CLASSES
+from .tasks import TaskRules, task_rules
+from .vectorized import np
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+_NAN = float("nan")
+CHUNK = 250  # Ресэмплов в одном блоке (матрица весов numpy или задание процесса); от числа процессов результат не зависит
+
+# Решающие статистики флагов: (флаг, статистика, порог FlagsThresholds, сравнение)
+DECISIONS = (
+    ("attention_scattered", "rt.rt_cv", "attention_cv_threshold", ">="),
+    ("attention_scattered", "rates.omission_rate", "attention_omission_threshold", ">="),
+    ("attention_scattered", "rt.lapse_rate", "attention_lapse_threshold", ">="),
+    ("aggressive_response_tactic", "rt.mean_rt_ms", "aggressive_fast_mean_ms", "<="),
+    ("aggressive_response_tactic", "flags.error_rate", "aggressive_error_rate_threshold", ">="),
+    ("many_anticipations", "rates.anticipation_rate", "many_anticipations_threshold", ">="),
+    ("post_error_slowing_detected", "flags.post_error_slowing_detected.delta_ms", "pes_min_delta_ms", ">="),
+    ("fatigue_trend_detected", "rt.rt_slope_ms_per_trial", "fatigue_slope_ms_per_trial", ">="),
+    ("fatigue_trend_detected", "flags.fatigue_trend_detected.delta_ms", "fatigue_delta_ms", ">="),
+    ("conservative_tactic", "rt.mean_rt_ms", "conservative_slow_mean_ms", ">="),
+)
+
+class _Ctx:
+    """Колонки триалов для бутстрепа: слагаемые сумм по триалу и отсортированные валидные RT.
+
+    Все статистики метрик выражаются через суммы слагаемых по триалам
+    ресэмпла (для numpy — одно умножение матрицы весов на матрицу
+    слагаемых) и квантили валидных RT. RT и номер триала центрированы,
+    чтобы суммы квадратов не теряли точность.
+    """
+
+    def __init__(self, trials: Sequence[TrialOutcome], rules: TaskRules, cfg: ProjectConfig):
+        self.rules = rules
+        self.lapse_ms = float(cfg.flags_thresholds.lapse_ms)
+        self.loglinear = cfg.use_loglinear_correction
+        self.percentiles = tuple(cfg.analysis.percentiles)
+        self.n = len(trials)
+        valid_rts = [float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None]
+        self.shift = math.fsum(valid_rts) / len(valid_rts) if valid_rts else 0.0
+        x_shift = (self.n + 1) / 2.0
+        # Метки PES и третей усталости — по исходному порядку триалов (как в state_flags)
+        pe: List[bool] = []; pc: List[bool] = []; prev: Optional[Tuple[bool, bool]] = None
+        for t in trials:
+            ok = bool(t.is_valid_rt and t.rt_ms is not None)
+            pe.append(ok and prev is not None and prev[1]); pc.append(ok and prev is not None and not prev[1] and prev[0])
+            prev = (bool(t.is_correct), (not t.is_correct) and (t.classification in _ERROR_CLASSES))
+        k = len(valid_rts); a = max(1, k // 3) if k >= 6 else 0
+        rank = 0; first: List[bool] = []; last: List[bool] = []
+        for t in trials:
+            ok = bool(t.is_valid_rt and t.rt_ms is not None)
+            first.append(ok and rank < a); last.append(ok and k - a <= rank)
+            rank += ok
+        conds = rules.conditions
+        cols: Dict[str, List[float]] = {}
+        rows = []
+        for i, t in enumerate(trials):
+            has = t.rt_ms is not None
+            r = float(t.rt_ms) - self.shift if has else 0.0
+            v = 1.0 if (t.is_valid_rt and has) else 0.0
+            x = (i + 1) - x_shift
+            m = 1.0 if (has and not t.is_timeout) else 0.0
+            c = 1.0 if t.is_correct else 0.0
+            g = rules.is_go(t); go = g is True
+            row = {"n": 1.0, "v": v, "vr": v * r, "vr2": v * r * r, "vx": v * x, "vx2": v * x * x, "vxr": v * x * r,
+                   "vl": v if (has and float(t.rt_ms) > self.lapse_ms) else 0.0,
+                   "correct": c, "omission": float(bool(t.is_omission)), "timeout": float(bool(t.is_timeout)),
+                   "anticipation": float(bool(t.is_anticipation)), "commission": float(bool(t.is_commission)),
+                   "go": float(go), "nogo": float(g is False), "hits": float(go and t.classification == "correct"),
+                   "m": m, "mr": m * r, "mr2": m * r * r, "mc": m * c, "mrc": m * r * c,
+                   "pe": float(pe[i]), "per": pe[i] * r, "pc": float(pc[i]), "pcr": pc[i] * r,
+                   "f": float(first[i]), "fr": first[i] * r, "l": float(last[i]), "lr": last[i] * r}
+            for j, cname in enumerate(conds):
+                on = t.stimulus_type == cname
+                row[f"c{j}n"] = float(on); row[f"c{j}c"] = on * c; row[f"c{j}v"] = on * v; row[f"c{j}vr"] = on * v * r
+            rows.append(row)
+        self.names = list(rows[0]) if rows else ["n"]
+        for name in self.names:
+            cols[name] = [row[name] for row in rows]
+        self.cols = cols
+        # Валидные RT по возрастанию и позиция каждого триала среди них (-1 — не валидный)
+        order = sorted((i for i in range(self.n) if cols["v"][i]), key=lambda i: float(trials[i].rt_ms))
+        self.sorted_rt = [float(trials[i].rt_ms) for i in order]
+        self.valid_order = order
+        self.pos = [-1] * self.n
+        for p, i in enumerate(order):
+            self.pos[i] = p
+        self.rt_of = [float(t.rt_ms) if t.rt_ms is not None else _NAN for t in trials]
+
+    def qs(self) -> List[float]:
+        return [0.5] + [p / 100.0 for p in self.percentiles]
+
+# --- Статистики по суммам (общие для numpy и stdlib) ---
+
+class _PyOps:
+    @staticmethod
+    def div(a: float, b: float) -> float:
+        return a / b if b else _NAN
+
+    @staticmethod
+    def sqrt(x: float) -> float:
+        return math.sqrt(x) if x >= 0 else _NAN
+
+    @staticmethod
+    def pos(x: float) -> float:
+        return x if x > 0 else 0.0
+
+    inv = staticmethod(stats.inv_norm_cdf)
+
+class _NpOps:
+    @staticmethod
+    def div(a: Any, b: Any) -> Any:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(b != 0, a / np.where(b != 0, b, 1.0), np.nan)
+
+    @staticmethod
+    def sqrt(x: Any) -> Any:
+        with np.errstate(invalid="ignore"):
+            return np.sqrt(np.where(x >= 0, x, np.nan))
+
+    @staticmethod
+    def pos(x: Any) -> Any:
+        return np.maximum(x, 0.0)
+
+    @staticmethod
+    def inv(p: Any) -> Any:
+        return vectorized.inv_norm_cdf(p, backend="numpy")
+
+def _finish(S: Dict[str, Any], Q: Sequence[Any], ctx: _Ctx, ops: Any) -> Dict[str, Any]:
+    # Статистики метрик и флагов из сумм S и квантилей валидных RT Q (медиана, затем analysis.percentiles)
+    div = ops.div
+    n = S["n"]; nv = S["v"]
+    mean_c = div(S["vr"], nv)
+    var = div(S["vr2"] - S["vr"] * mean_c, ops.pos(nv - 1.0))
+    std = ops.sqrt(var)
+    mean = ctx.shift + mean_c
+    m2x = S["vx2"] - S["vx"] * div(S["vx"], nv)
+    out = {"rt.mean_rt_ms": mean, "rt.median_rt_ms": Q[0], "rt.rt_std_ms": std, "rt.rt_cv": div(std, mean),
+           "rt.rt_slope_ms_per_trial": div(S["vxr"] - S["vx"] * mean_c, m2x), "rt.lapse_rate": div(S["vl"], nv)}
+    for p, q in zip(ctx.percentiles, Q[1:]):
+        out[f"rt.percentiles_ms.{percentile_key(p)}"] = q
+    accuracy = div(S["correct"], n)
+    required = S["go"] if ctx.rules.has_nogo else n
+    out.update({"rates.accuracy": accuracy, "rates.omission_rate": div(S["omission"], required),
+                "rates.timeout_rate": div(S["timeout"], required), "rates.anticipation_rate": div(S["anticipation"], n)})
+    if ctx.rules.has_nogo:
+        hit = div(S["hits"], S["go"]); fa = div(S["commission"], S["nogo"])
+        if ctx.loglinear:
+            d = ops.inv((S["hits"] + 0.5) / (S["go"] + 1.0)) - ops.inv((S["commission"] + 0.5) / (S["nogo"] + 1.0))
+        else:
+            d = ops.inv(hit) - ops.inv(fa)
+        out.update({"rates.commission_error_rate": fa, "rates.hit_rate": hit, "rates.false_alarm_rate": fa,
+                    "rates.d_prime": d + 0.0 * (hit + fa)})  # NaN, если нет Go или NoGo триалов
+    m = S["m"]; mc = div(S["mc"], m)
+    cxy = S["mrc"] - S["mr"] * mc
+    vx = S["mr2"] - S["mr"] * div(S["mr"], m); vy = S["mc"] - S["mc"] * mc
+    out["speed_accuracy.pearson_r_rt_correctness"] = div(cxy, ops.sqrt(vx * vy))
+    conds = ctx.rules.conditions
+    if conds:
+        cm = []
+        for j, cname in enumerate(conds):
+            cm.append(ctx.shift + div(S[f"c{j}vr"], S[f"c{j}v"]))
+            out[f"conditions.by_condition.{cname}.accuracy"] = div(S[f"c{j}c"], S[f"c{j}n"])
+            out[f"conditions.by_condition.{cname}.mean_rt_ms"] = cm[-1]
+        if len(conds) > 1:
+            out["conditions.effect_ms"] = cm[-1] - cm[0]
+    out["flags.error_rate"] = 1.0 - accuracy
+    out["flags.post_error_slowing_detected.delta_ms"] = div(S["per"], S["pe"]) - div(S["pcr"], S["pc"])
+    out["flags.fatigue_trend_detected.delta_ms"] = div(S["lr"], S["l"]) - div(S["fr"], S["f"])
+    return out
+
+# --- stdlib: ресэмплы по одному, блоки — в пуле процессов ---
+
+def _py_quantiles(vals: List[float], qs: Sequence[float]) -> List[float]:
+    return [_NAN if v is None else v for v in quantiles(vals, qs)]
+
+def _py_chunk(ctx: _Ctx, seed: int, chunk: int, size: int) -> List[Dict[str, float]]:
+    rnd = random.Random(f"{seed}:{chunk}")
+    population = range(ctx.n); qs = ctx.qs()
+    cols = [(name, ctx.cols[name].__getitem__) for name in ctx.names]
+    rt_of = ctx.rt_of.__getitem__; valid = ctx.cols["v"]
+    out = []
+    for _ in range(size):
+        idx = rnd.choices(population, k=ctx.n)
+        S = {name: sum(map(get, idx)) for name, get in cols}
+        Q = _py_quantiles([rt_of(i) for i in idx if valid[i]], qs)
+        out.append(_finish(S, Q, ctx, _PyOps))
+    return out
+
+def _py_jackknife(ctx: _Ctx) -> List[Dict[str, float]]:
+    # Оценки без i-го триала: суммы — общая минус слагаемые триала, квантили — сдвигом ранга
+    total = {name: math.fsum(col) for name, col in ctx.cols.items()}
+    qs = ctx.qs(); srt = ctx.sorted_rt; nv = len(srt)
+    out = []
+    for i in range(ctx.n):
+        S = {name: total[name] - ctx.cols[name][i] for name in ctx.names}
+        p = ctx.pos[i]
+        k = nv - (p >= 0)
+        Q = []
+        for q in qs:
+            if k == 0:
+                Q.append(_NAN); continue
+            h = (k - 1) * q; lo = int(math.floor(h)); frac = h - lo; hi = min(lo + 1, k - 1)
+            a = srt[lo + (0 <= p <= lo)]; b = srt[hi + (0 <= p <= hi)]
+            Q.append(a + (b - a) * frac)
+        out.append(_finish(S, Q, ctx, _PyOps))
+    return out
+
+def _py_replicates(ctx: _Ctx, n_resamples: int, seed: int, workers: int) -> List[Dict[str, float]]:
+    # Цикл по триалам каждого ресэмпла: ~1 мс на ресэмпл из 500 триалов, workers > 1 имеет смысл при нескольких ядрах
+    chunks = [(c, min(CHUNK, n_resamples - c * CHUNK)) for c in range((n_resamples + CHUNK - 1) // CHUNK)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [r for c, size in chunks for r in _py_chunk(ctx, seed, c, size)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as ex:
+        parts = ex.map(_py_chunk, [ctx] * len(chunks), [seed] * len(chunks), [c for c, _ in chunks], [s for _, s in chunks])
+        return [r for part in parts for r in part]
+
+# --- numpy: блок ресэмплов — матрица весов (сколько раз триал попал в ресэмпл) ---
+
+def _np_quantiles(W: Any, ctx: _Ctx) -> List[Any]:
+    # Квантили валидных RT по весам: ранг r — первый отсортированный RT, где накопленный вес > r
+    srt = np.asarray(ctx.sorted_rt, dtype=np.float64)
+    if srt.size == 0:
+        return [np.full(W.shape[0], np.nan) for _ in ctx.qs()]
+    cum = np.cumsum(W[:, ctx.valid_order], axis=1)
+    k = cum[:, -1]
+    out = []
+    for q in ctx.qs():
+        h = np.maximum(k - 1.0, 0.0) * q; lo = np.floor(h); frac = h - lo; hi = np.minimum(lo + 1.0, np.maximum(k - 1.0, 0.0))
+        a = srt[np.minimum((cum <= lo[:, None]).sum(axis=1), srt.size - 1)]
+        b = srt[np.minimum((cum <= hi[:, None]).sum(axis=1), srt.size - 1)]
+        out.append(np.where(k > 0, a + (b - a) * frac, np.nan))
+    return out
+
+def _np_stats(W: Any, F: Any, ctx: _Ctx) -> Dict[str, Any]:
+    sums = W @ F
+    S = {name: sums[:, j] for j, name in enumerate(ctx.names)}
+    return _finish(S, _np_quantiles(W, ctx), ctx, _NpOps)
+
+def _np_replicates(ctx: _Ctx, n_resamples: int, seed: int) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    n = ctx.n
+    F = np.array([ctx.cols[name] for name in ctx.names], dtype=np.float64).T
+    rng = np.random.default_rng(seed)
+    parts: List[Dict[str, Any]] = []
+    for start in range(0, n_resamples, CHUNK):
+        b = min(CHUNK, n_resamples - start)
+        idx = rng.integers(0, n, size=(b, n))
+        W = np.bincount((idx + (np.arange(b) * n)[:, None]).ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        parts.append(_np_stats(W, F, ctx))
+    reps = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    jparts: List[Dict[str, Any]] = []
+    for start in range(0, n, CHUNK):
+        rows = np.arange(start, min(n, start + CHUNK))
+        W = np.ones((rows.size, n)); W[np.arange(rows.size), rows] = 0.0
+        jparts.append(_np_stats(W, F, ctx))
+    jack = {k: np.concatenate([p[k] for p in jparts]) for k in jparts[0]}
+    return reps, jack
+
+# --- Интервалы ---
+
+def _norm_cdf(z: float) -> float:
+    return 0.5 * math.erfc(-z / math.sqrt(2.0))
+
+def _finite(xs: Any) -> Any:
+    # Конечные значения реплик: список (stdlib) или массив numpy
+    if isinstance(xs, list):
+        return [float(x) for x in xs if x is not None and math.isfinite(x)]
+    return xs[np.isfinite(xs)]
+
+def _interval(est: float, reps: Any, jack: Any, level: float) -> Dict[str, Any]:
+    alpha = (1.0 - level) / 2.0
+    n = len(reps)
+    if isinstance(reps, list):
+        mean = math.fsum(reps) / n
+        se = math.sqrt(math.fsum((x - mean) ** 2 for x in reps) / (n - 1)) if n > 1 else None
+        below = sum(1 for x in reps if x < est) + 0.5 * sum(1 for x in reps if x == est)
+        qf: Callable[[List[float]], List[Optional[float]]] = lambda ps: quantiles(reps, ps)
+        jm = math.fsum(jack) / len(jack) if jack else 0.0
+        d2 = math.fsum((jm - j) ** 2 for j in jack); d3 = math.fsum((jm - j) ** 3 for j in jack)
+    else:
+        se = float(reps.std(ddof=1)) if n > 1 else None
+        below = float(np.count_nonzero(reps < est)) + 0.5 * float(np.count_nonzero(reps == est))
+        qf = lambda ps: [float(x) for x in np.quantile(reps, ps)]
+        jd = jack.mean() - jack if len(jack) else jack
+        d2 = float((jd * jd).sum()); d3 = float((jd * jd * jd).sum())
+    pct = qf([alpha, 1.0 - alpha])
+    # BCa: поправка смещения z0 по доле ресэмплов ниже оценки, ускорение a — по jackknife
+    bca: List[Optional[float]] = [None, None]
+    if 0 < below < n and len(jack) > 2:
+        z0 = stats.inv_norm_cdf(below / n)
+        a = d3 / (6.0 * d2 ** 1.5) if d2 > 0 else 0.0
+        adj = []
+        for p in (alpha, 1.0 - alpha):
+            z = z0 + stats.inv_norm_cdf(p)
+            adj.append(_norm_cdf(z0 + z / (1.0 - a * z)) if a * z < 1.0 else (1.0 if z > 0 else 0.0))
+        bca = qf(adj)
+    return {"estimate": est, "se": se, "n_resamples": n, "percentile": pct, "bca": bca}
+
+def _decisions(intervals: Dict[str, Dict[str, Any]], cfg: ProjectConfig) -> List[Dict[str, Any]]:
+    # Устойчивость решений флагов: интервал целиком по одну сторону порога или пересекает его
+    th = cfg.flags_thresholds
+    out = []
+    for flag, key, attr, op in DECISIONS:
+        ci = intervals.get(key)
+        if ci is None:
+            continue
+        thr = float(getattr(th, attr))
+        lo, hi = ci["bca"] if ci["bca"][0] is not None else ci["percentile"]
+        meets = (lambda x: x >= thr) if op == ">=" else (lambda x: x <= thr)
+        verdict = "meets" if (meets(lo) and meets(hi)) else ("fails" if not (meets(lo) or meets(hi)) else "inconclusive")
+        out.append({"flag": flag, "statistic": key, "threshold": thr, "op": op, "estimate_meets": meets(ci["estimate"]),
+                    "ci": [lo, hi], "verdict": verdict})
+    return out
+
+def _default_workers() -> int:
+    # В рабочем процессе пула (run_batch, AnalysisService) параллелит уже сам пул: свой пул дал бы N×CPU процессов
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+def bootstrap_metrics(trials: Sequence[TrialOutcome], task: str, cfg: ProjectConfig, n_resamples: Optional[int]=None,
+                      level: Optional[float]=None, seed: Optional[int]=None, backend: Optional[str]=None,
+                      workers: Optional[int]=None, keys: Optional[Sequence[str]]=None) -> Dict[str, Any]:
+    """Бутстреп-интервалы (перцентильный и BCa) метрик compute_metrics и решающих статистик флагов.
+
+    Ресэмплы — выборки номеров триалов с возвращением (детерминированы
+    ``seed``). С numpy блок ресэмплов — матрица весов триалов, и все суммы
+    считаются одним матричным умножением; без numpy блоки ресэмплов
+    считаются в пуле из ``workers`` процессов (при одинаковом seed numpy и
+    stdlib дают разные, но одинаково распределённые ресэмплы). По умолчанию
+    ``workers`` — ``analysis.bootstrap_workers`` или число CPU, а в дочернем
+    процессе (пул ``run_batch`` или сервиса) — 1. Без numpy
+    бутстреп заметно медленнее: 10 000 ресэмплов сессии из 500 триалов —
+    около 10 с на одно ядро; пул ускоряет счёт примерно пропорционально
+    числу ядер, а на одном ядре только добавляет накладные расходы. PES и трети
+    усталости размечаются по исходному порядку триалов, номер триала для
+    наклона — исходный. ``keys`` ограничивает набор статистик
+    ("rt.mean_rt_ms", "rates.d_prime", "flags.error_rate", ...).
+    """
+    an = cfg.analysis
+    n_resamples = int(n_resamples if n_resamples is not None else (an.bootstrap_resamples or 2000))
+    level = float(level if level is not None else an.bootstrap_level)
+    seed = int(seed if seed is not None else an.bootstrap_seed)
+    if n_resamples < 2:
+        raise ValueError(f"n_resamples must be at least 2, got {n_resamples}")
+    if not 0.0 < level < 1.0:
+        raise ValueError(f"confidence level must be in (0, 1), got {level}")
+    trials = list(trials)
+    backend = vectorized.get_backend(backend if backend is not None else an.backend)
+    out: Dict[str, Any] = {"n_resamples": n_resamples, "level": level, "seed": seed, "backend": backend,
+                           "n_trials": len(trials), "intervals": {}, "decisions": []}
+    if not trials:
+        return out
+    ctx = _Ctx(trials, task_rules(task, cfg), cfg)
+    est = _finish({name: math.fsum(col) for name, col in ctx.cols.items()}, _py_quantiles(ctx.sorted_rt, ctx.qs()), ctx, _PyOps)
+    if backend == "numpy":
+        reps_by, jack_by = _np_replicates(ctx, n_resamples, seed)
+        get_reps: Callable[[str], Any] = lambda k: _finite(reps_by[k])
+        get_jack: Callable[[str], Any] = lambda k: _finite(jack_by[k])
+    else:
+        nw = workers if workers is not None else (an.bootstrap_workers or _default_workers())
+        reps_l = _py_replicates(ctx, n_resamples, seed, nw); jack_l = _py_jackknife(ctx)
+        get_reps = lambda k: _finite([r[k] for r in reps_l])
+        get_jack = lambda k: _finite([r[k] for r in jack_l])
+    for k in (keys if keys is not None else est):
+        if k not in est:
+            raise ValueError(f"unknown statistic: {k!r}")
+        e = est[k]
+        reps = get_reps(k)
+        if not math.isfinite(e) or len(reps) < 2:
+            out["intervals"][k] = {"estimate": e if math.isfinite(e) else None, "se": None, "n_resamples": len(reps),
+                                   "percentile": [None, None], "bca": [None, None]}
+            continue
+        out["intervals"][k] = _interval(e, reps, get_jack(k), level)
+    out["decisions"] = _decisions({k: v for k, v in out["intervals"].items() if v["percentile"][0] is not None}, cfg)
+    return out
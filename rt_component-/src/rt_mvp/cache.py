@@ -0,0 +1,196 @@
+from __future__ import annotations
+from dataclasses import asdict, fields
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib, json, os, shutil, time
+
+from . import __version__
+from .config import ProjectConfig, ReportCfg
+from .report_html import write_report_html
+from .shards import LogPath, log_paths
+
+HASH_CHUNK = 1 << 20
+TRIALS_FORMAT = 2  # 2: trials.json хранит и дополнительные колонки TrialTable (агрегаты каналов)
+
+def _atomic_write_text(path: str, text: str) -> None:
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def hash_file(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+class ResultCache:
+    """Дисковый кэш результатов анализа лога (summary, отчёт и триалы).
+
+    Ключ — хэш содержимого и размер лога, нормализованная конфигурация,
+    ``__version__`` пакета, задача и режим анализа. Хэш содержимого
+    запоминается по (size, mtime_ns, inode), поэтому тёплый повторный запуск
+    не читает лог. Записи вытесняются по LRU (время последнего обращения),
+    пока общий размер больше ``max_bytes``.
+
+    Структура каталога::
+
+        <root>/stat/<хэш пути>.json     — запомненный хэш содержимого лога
+        <root>/entries/<ключ>/          — entry.json, report_<i>.html, trials_<i>.json
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int]=512 << 20, auto_evict: bool=True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.auto_evict = auto_evict  # Вытеснять после каждой записи (в пакетном режиме — один раз в конце)
+        self.hits = 0
+        self.misses = 0
+        self.last_hit = False
+        os.makedirs(os.path.join(root, "stat"), exist_ok=True)
+        os.makedirs(os.path.join(root, "entries"), exist_ok=True)
+
+    def fingerprint(self, log_path: str) -> Dict[str, Any]:
+        # Размер, mtime и хэш содержимого; хэш пересчитывается, только если изменился stat файла
+        st = os.stat(log_path)
+        memo_path = os.path.join(self.root, "stat", hashlib.blake2b(os.path.realpath(log_path).encode("utf-8"), digest_size=16).hexdigest() + ".json")
+        stat = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+        try:
+            with open(memo_path, "r", encoding="utf-8") as f:
+                memo = json.load(f)
+            if all(memo.get(k) == v for k, v in stat.items()):
+                return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "blake2b": memo["blake2b"]}
+        except (OSError, ValueError, KeyError):
+            pass
+        digest = hash_file(log_path)
+        _atomic_write_text(memo_path, json.dumps({**stat, "blake2b": digest}))
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "blake2b": digest}
+
+    def key(self, log_path: LogPath, cfg: ProjectConfig, task: Optional[str], mode: str="session") -> str:
+        # mtime в ключ не входит: скопированный или восстановленный архив с тем же содержимым попадает в кэш;
+        # у шардов — отпечаток каждого файла в порядке перечисления
+        fps = [self.fingerprint(p) for p in log_paths(log_path)]
+        log = [{"size": fp["size"], "blake2b": fp["blake2b"]} for fp in fps]
+        parts = {"version": __version__, "trials_format": TRIALS_FORMAT, "log": log[0] if isinstance(log_path, str) else log,
+                 "config": asdict(cfg), "task": task, "mode": mode}
+        return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode("utf-8"), digest_size=20).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, "entries", key)
+
+    def restore(self, key: str, log_path: LogPath, base_dir: str, report_cfg: Optional[ReportCfg]=None) -> Optional[List[Dict[str, Any]]]:
+        """Восстанавливает отчёты из кэша в ``base_dir``; None — промах.
+
+        Если запись создана для другого пути с тем же содержимым, отчёт
+        перерисовывается по сохранённым триалам (без разбора лога).
+        """
+        edir = self._entry_dir(key)
+        try:
+            with open(os.path.join(edir, "entry.json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1; self.last_hit = False
+            return None
+        summaries = []
+        for i, rep in enumerate(entry["reports"]):
+            summary = rep["summary"]
+            meta = summary["meta"]
+            out_dir = os.path.join(base_dir, rep["rel"]) if rep["rel"] else base_dir
+            meta["log_path"] = log_path
+            if "out_dir" in meta: meta["out_dir"] = out_dir
+            if "profile" in meta: meta["profile"]["from_cache"] = True  # Время этапов — от исходного прогона
+            os.makedirs(out_dir, exist_ok=True)
+            with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            if entry["log_path"] == (log_path if isinstance(log_path, str) else list(log_path)):
+                shutil.copyfile(os.path.join(edir, f"report_{i}.html"), os.path.join(out_dir, "report.html"))
+            else:
+                with open(os.path.join(out_dir, "report.html"), "w", encoding="utf-8") as f:
+                    write_report_html(f, meta, self.load_trials(key, i), summary["metrics"], summary["flags"], report_cfg)
+            summaries.append(summary)
+        os.utime(os.path.join(edir, "entry.json"))  # Отметка для LRU
+        self.hits += 1; self.last_hit = True
+        return summaries
+
+    def put(self, key: str, log_path: LogPath, base_dir: str, reports: Sequence[Tuple[str, Dict[str, Any], Sequence[Any]]]) -> None:
+        # reports: (каталог отчёта, summary, триалы); report.html берётся из каталога отчёта
+        edir = self._entry_dir(key)
+        tmp = f"{edir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        entry: Dict[str, Any] = {"log_path": log_path, "created": time.time(), "reports": []}
+        for i, (out_dir, summary, trials) in enumerate(reports):
+            rel = os.path.relpath(out_dir, base_dir)
+            entry["reports"].append({"rel": "" if rel == "." else rel, "summary": summary})
+            shutil.copyfile(os.path.join(out_dir, "report.html"), os.path.join(tmp, f"report_{i}.html"))
+            with open(os.path.join(tmp, f"trials_{i}.json"), "w", encoding="utf-8") as f:
+                json.dump(_trials_to_json(trials), f, ensure_ascii=False)
+        with open(os.path.join(tmp, "entry.json"), "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, edir)
+        except OSError:  # Запись уже создана параллельным процессом
+            shutil.rmtree(tmp, ignore_errors=True)
+        if self.auto_evict:
+            self.evict()
+
+    def load_trials(self, key: str, i: int=0) -> Any:
+        with open(os.path.join(self._entry_dir(key), f"trials_{i}.json"), "r", encoding="utf-8") as f:
+            return _trials_from_json(json.load(f))
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        # (время последнего обращения, размер, каталог) для всех записей
+        out = []
+        with os.scandir(os.path.join(self.root, "entries")) as it:
+            for d in it:
+                if not d.is_dir() or ".tmp-" in d.name:
+                    continue
+                size = 0; atime = 0.0
+                with os.scandir(d.path) as files:
+                    for f in files:
+                        st = f.stat()
+                        size += st.st_size
+                        if f.name == "entry.json": atime = st.st_mtime
+                out.append((atime, size, d.path))
+        return out
+
+    def size_bytes(self) -> int:
+        return sum(s for _, s, _ in self._entries())
+
+    def evict(self) -> int:
+        # Удаляет давно не использованные записи, пока размер больше max_bytes; возвращает число удалённых
+        if self.max_bytes is None:
+            return 0
+        entries = sorted(self._entries())
+        total = sum(s for _, s, _ in entries)
+        n = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size; n += 1
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "root": self.root}
+
+def _trials_to_json(trials: Sequence[Any]) -> Dict[str, Any]:
+    from .analyzer import TrialOutcome
+    from .trial_table import TrialTable
+    names = [f.name for f in fields(TrialOutcome)]
+    extra = {}
+    if isinstance(trials, TrialTable):
+        # NaN в JSON не пишется — пропуски хранятся как null
+        extra = {c: [None if v != v else v for v in trials.column(c)] for c in trials.extra}
+    return {"fields": names, "rows": [[getattr(t, n) for n in names] for t in trials], "extra": extra}
+
+def _trials_from_json(data: Dict[str, Any]) -> Any:
+    from .analyzer import TrialOutcome
+    from .trial_table import TrialTable
+    names = data["fields"]
+    table = TrialTable.from_trials(TrialOutcome(**dict(zip(names, row))) for row in data["rows"])
+    for c, values in data.get("extra", {}).items():
+        table.set_column(c, (float("nan") if v is None else v for v in values))
+    return table
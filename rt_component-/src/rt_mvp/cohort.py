@@ -0,0 +1,202 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, TYPE_CHECKING
+import glob, html, json, math, os
+
+from .accumulators import Moments
+from .event_log import get_loads
+from .quantiles import TDigest, percentile_key, quantiles
+from .report_html import _fmt, svg_hist
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+# Метрики сессии, распределение которых показывается по когорте: (имя, раздел metrics, ключ)
+SESSION_METRICS = (("mean_rt_ms", "rt", "mean_rt_ms"), ("median_rt_ms", "rt", "median_rt_ms"), ("rt_cv", "rt", "rt_cv"),
+                   ("accuracy", "rates", "accuracy"), ("d_prime", "rates", "d_prime"),
+                   ("omission_rate", "rates", "omission_rate"), ("lapse_rate", "rt", "lapse_rate"))
+COHORT_PERCENTILES = (10.0, 25.0, 50.0, 75.0, 90.0)
+
+def session_partials(trials: Sequence[TrialOutcome], compression: float=100.0) -> Dict[str, Any]:
+    # Частичные агрегаты сессии для когортного отчёта: t-digest валидных RT
+    d = TDigest(compression).extend(float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None)
+    return {"rt_digest": d.to_dict()}
+
+class _Group:
+    # Агрегаты одной группы сессий (вся когорта или одна задача)
+    def __init__(self, compression: float) -> None:
+        self.n_sessions = 0
+        self.n_trials = 0
+        self.values: Dict[str, List[float]] = {name: [] for name, _, _ in SESSION_METRICS}  # Одно число на сессию
+        self.flags: Dict[str, List[int]] = {}  # имя флага -> [сколько True, сколько известно]
+        self.rt = Moments()  # Валидные RT всех триалов, из моментов сессий
+        self.rt_digest = TDigest(compression)
+        self.n_without_digest = 0
+
+    def add(self, summary: Dict[str, Any]) -> None:
+        meta = summary.get("meta", {}); metrics = summary.get("metrics", {})
+        self.n_sessions += 1
+        self.n_trials += int(meta.get("n_trials") or 0)
+        for name, section, key in SESSION_METRICS:
+            v = metrics.get(section, {}).get(key)
+            if v is not None and not (isinstance(v, float) and math.isnan(v)):
+                self.values[name].append(float(v))
+        for name, info in summary.get("flags", {}).items():
+            v = info.get("value")
+            c = self.flags.setdefault(name, [0, 0])
+            if v is not None:
+                c[1] += 1
+                if v: c[0] += 1
+        rt = metrics.get("rt", {})
+        n = int(rt.get("n_valid") or 0)
+        if n and rt.get("mean_rt_ms") is not None:
+            m = Moments()
+            sd = rt.get("rt_std_ms")
+            m.n, m.mean, m.total = n, float(rt["mean_rt_ms"]), float(rt["mean_rt_ms"]) * n
+            m.m2 = (float(sd) ** 2) * (n - 1) if sd is not None else 0.0
+            self.rt.merge(m)
+        dig = summary.get("partials", {}).get("rt_digest")
+        if dig and dig.get("means"):
+            self.rt_digest.merge(TDigest.from_dict(dig))
+        elif n:
+            self.n_without_digest += 1
+
+    def merge(self, o: "_Group") -> None:
+        self.n_sessions += o.n_sessions; self.n_trials += o.n_trials
+        for k, vs in o.values.items(): self.values[k].extend(vs)
+        for k, (t, n) in o.flags.items():
+            c = self.flags.setdefault(k, [0, 0]); c[0] += t; c[1] += n
+        self.rt.merge(o.rt)
+        self.rt_digest.merge(o.rt_digest)
+        self.n_without_digest += o.n_without_digest
+
+    def result(self) -> Dict[str, Any]:
+        qs = [p / 100.0 for p in COHORT_PERCENTILES]
+        dist = {}
+        for name, vs in self.values.items():
+            m = Moments()
+            for v in vs: m.add(v)
+            var = m.variance()
+            dist[name] = {"n": len(vs), "mean": m.mean_value(), "sd": None if var is None else math.sqrt(var),
+                          **{percentile_key(p): q for p, q in zip(COHORT_PERCENTILES, quantiles(vs, qs))}}
+        var = self.rt.variance()
+        pooled = {"n_valid": self.rt.n, "mean_rt_ms": self.rt.mean_value(), "rt_std_ms": None if var is None else math.sqrt(var),
+                  "percentiles_ms": {percentile_key(p): q for p, q in zip(COHORT_PERCENTILES, self.rt_digest.quantiles(qs))},
+                  "quantile_method": self.rt_digest.method, "n_sessions_without_digest": self.n_without_digest}
+        prevalence = {k: {"n_true": t, "n": n, "rate": (t / n) if n else None} for k, (t, n) in self.flags.items()}
+        return {"n_sessions": self.n_sessions, "n_trials": self.n_trials, "session_metrics": dist,
+                "pooled_rt": pooled, "flag_prevalence": prevalence}
+
+class CohortAggregator:
+    """Когортные агрегаты из summary.json отдельных сессий — без повторного чтения логов.
+
+    По каждой метрике сессии (mean_rt, rt_cv, d_prime, accuracy, ...)
+    хранится одно число на сессию; RT всех триалов объединяются через
+    моменты сессий (среднее, SD) и их t-digest из ``summary["partials"]``.
+    Группы: вся когорта ("all") и каждая задача. ``merge`` объединяет
+    агрегаторы, собранные по частям.
+    """
+
+    def __init__(self, compression: float=100.0):
+        self.compression = compression
+        self.groups: Dict[str, _Group] = {}
+        self.n_skipped = 0
+
+    def _group(self, name: str) -> _Group:
+        g = self.groups.get(name)
+        if g is None:
+            g = self.groups[name] = _Group(self.compression)
+        return g
+
+    def add(self, summary: Dict[str, Any]) -> None:
+        if "metrics" not in summary:
+            self.n_skipped += 1
+            return
+        self._group("all").add(summary)
+        self._group(str(summary.get("meta", {}).get("task") or "unknown")).add(summary)
+
+    def extend(self, summaries: Iterable[Dict[str, Any]]) -> "CohortAggregator":
+        for s in summaries:
+            self.add(s)
+        return self
+
+    def merge(self, o: "CohortAggregator") -> "CohortAggregator":
+        for name, g in o.groups.items():
+            self._group(name).merge(g)
+        self.n_skipped += o.n_skipped
+        return self
+
+    def result(self) -> Dict[str, Any]:
+        groups = {name: g.result() for name, g in sorted(self.groups.items(), key=lambda kv: (kv[0] != "all", kv[0]))}
+        return {"groups": groups, "n_skipped": self.n_skipped}
+
+def find_summaries(target: str) -> List[str]:
+    # Пути summary.json: из индекса пакетного запуска (index.jsonl) или рекурсивно по каталогу отчётов
+    if os.path.isfile(target) and target.endswith(".jsonl"):
+        out = []
+        with open(target, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line: continue
+                row = json.loads(line)
+                if row.get("status") != "ok": continue
+                dirs = [r["out_dir"] for r in row["runs"]] if "runs" in row else [row["out_dir"]]
+                out.extend(os.path.join(d, "summary.json") for d in dirs)
+        return out
+    return sorted(glob.glob(os.path.join(target, "**", "summary.json"), recursive=True))
+
+def iter_summaries(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    loads = get_loads()
+    for p in paths:
+        try:
+            with open(p, "rb") as f:
+                yield loads(f.read())
+        except (OSError, ValueError):
+            continue
+
+def write_cohort_html(fh: TextIO, cohort: Dict[str, Any], values: Optional[Dict[str, Dict[str, List[float]]]]=None) -> None:
+    """Когортный HTML-отчёт. ``values`` — значения метрик по сессиям для гистограмм (группа -> метрика -> список)."""
+    w = fh.write
+    w("""<!doctype html>
+<html lang="ru"><head><meta charset="utf-8"/>
+<title>RT cohort report</title>
+<style>body{font-family:Arial,sans-serif;margin:20px} svg{border:1px solid #eee;background:#fff} .small{color:#444} td,th{padding:4px 8px}</style>
+</head><body>
+<h1>RT cohort report</h1>
+""")
+    w(f'<div class="small">source: {html.escape(str(cohort.get("source","")))}</div>\n')
+    pk = [percentile_key(p) for p in COHORT_PERCENTILES]
+    for name, g in cohort["groups"].items():
+        w(f"<h2>{html.escape(name)}: {g['n_sessions']} сессий, {g['n_trials']} триалов</h2>\n")
+        w("<h3>Метрики сессий</h3><table border='1' cellspacing='0'><tr><th>metric</th><th>n</th><th>mean</th><th>sd</th>"
+          + "".join(f"<th>{k}</th>" for k in pk) + "</tr>")
+        for m, d in g["session_metrics"].items():
+            w(f"<tr><td>{html.escape(m)}</td><td>{d['n']}</td><td>{_fmt(d['mean'])}</td><td>{_fmt(d['sd'])}</td>"
+              + "".join(f"<td>{_fmt(d[k])}</td>" for k in pk) + "</tr>")
+        w("</table>\n")
+        p = g["pooled_rt"]
+        w(f"<h3>RT всех триалов</h3><div>n_valid={p['n_valid']}, mean={_fmt(p['mean_rt_ms'],2)} ms, sd={_fmt(p['rt_std_ms'],2)} ms, "
+          + ", ".join(f"{k}={_fmt(v,1)}" for k, v in p["percentiles_ms"].items()) + "</div>\n")
+        w("<h3>Частота флагов</h3><table border='1' cellspacing='0'><tr><th>flag</th><th>true</th><th>n</th><th>rate</th></tr>")
+        for f, d in g["flag_prevalence"].items():
+            w(f"<tr><td>{html.escape(f)}</td><td>{d['n_true']}</td><td>{d['n']}</td><td>{_fmt(d['rate'])}</td></tr>")
+        w("</table>\n")
+        for m in ("mean_rt_ms", "rt_cv", "d_prime", "accuracy"):
+            vs = (values or {}).get(name, {}).get(m)
+            if vs:
+                w(f"<h3>Распределение {html.escape(m)} по сессиям</h3>{svg_hist(vs, bins=20, h=200)}\n")
+    w("</body></html>")
+
+def cohort_report(target: str, out_dir: str, fmt: str="both", compression: float=100.0) -> Dict[str, Any]:
+    # Собирает когорту и пишет cohort.json и/или cohort.html в out_dir
+    agg = CohortAggregator(compression).extend(iter_summaries(find_summaries(target)))
+    res = agg.result()
+    res["source"] = target
+    os.makedirs(out_dir, exist_ok=True)
+    if fmt in ("json", "both"):
+        with open(os.path.join(out_dir, "cohort.json"), "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+    if fmt in ("html", "both"):
+        values = {name: g.values for name, g in agg.groups.items()}
+        with open(os.path.join(out_dir, "cohort.html"), "w", encoding="utf-8") as f:
+            write_cohort_html(f, res, values)
+    return res
@@ -1,6 +1,6 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Optional, Tuple
 import json
 
 # Класс для определения временных границ выполнения задачи
@@ -40,10 +40,58 @@ class FlagsThresholds:
     conservative_error_rate_max: float = 0.10  # Максимальный порог ошибок при консервативной стратегии
     conservative_omission_min: float = 0.10  # Минимальный порог пропусков
 
+    # Пороги по скользящим окнам (см. rolling; None — не использовать)
+    fatigue_window_delta_ms: Optional[float] = None  # Среднее RT последнего окна минус первого
+    attention_window_cv_threshold: Optional[float] = None  # Максимальный CV RT по окнам
+    attention_window_lapse_threshold: Optional[float] = None  # Максимальная доля lapses по окнам
+
+# Канал другого инструмента, агрегаты которого присоединяются к окну триала [t0, t0 + timeout_ms] (см. intervals)
+@dataclass(frozen=True)
+class ChannelCfg:
+    name: str  # Префикс колонок триала: <name>_n, <name>_mean или <name>_overlap_ms
+    instrument: str
+    event_type: Optional[str] = None  # None — любые события инструмента
+    field: Optional[str] = None  # Числовое или булево поле отсчёта; None — только число отсчётов
+    kind: str = "samples"  # "samples" — точечные отсчёты, "intervals" — события с длительностью (моргания)
+    duration_field: str = "duration_ms"  # Длительность для kind="intervals"
+
+DEFAULT_CHANNELS = (
+    ChannelCfg("gaze", "gaze", "gaze_sample", "on_screen"),  # gaze_mean — доля взгляда на экране
+    ChannelCfg("blink", "blink", "blink", kind="intervals"),  # blink_overlap_ms — время морганий внутри окна
+    ChannelCfg("hr", "hr", "hr_sample", "bpm"),
+)
+
 # Класс для конфигурации анализа
 @dataclass(frozen=True)
 class AnalysisCfg:
     premature_window_ms: int = 200  # Временное окно для анализа преждевременных ответов в миллисекундах
+    percentiles: Tuple[float, ...] = (10.0, 50.0, 90.0)  # Перцентили RT в метриках и отчёте
+    quantile_mode: str = "exact"  # "exact" — точные квантили, "tdigest" — потоковый скетч (без хранения всех RT)
+    tdigest_compression: float = 100.0  # Параметр точности t-digest
+    backend: str = "auto"  # "auto" — numpy, если установлен; "numpy" / "python" — явно (см. vectorized)
+    shard_reorder_window_s: float = 1.0  # Допустимый разброс t_mono внутри шарда при слиянии шардов (см. shards)
+    channels: Tuple[ChannelCfg, ...] = DEFAULT_CHANNELS  # Каналы других инструментов; () — не присоединять
+    rolling_mode: str = "trials"  # Скользящие метрики в metrics["rolling"]: "trials" — окно по числу триалов, "time" — по t0 в секундах, "off"
+    rolling_window: float = 20.0  # Ширина окна: триалов или секунд
+    rolling_step: int = 1  # Точка ряда — каждое rolling_step-е окно
+    bootstrap_resamples: int = 0  # Бутстреп-интервалы метрик и флагов в metrics["bootstrap"]; 0 — не считать (см. bootstrap)
+    bootstrap_level: float = 0.95  # Уровень доверия интервалов
+    bootstrap_seed: int = 0
+    bootstrap_workers: int = 0  # Процессы для stdlib-варианта (без numpy); 0 — по числу CPU, в рабочих процессах пула — 1
+    response_button: str = "space"  # Кнопка ответа на Go-стимул в go_nogo и cpt
+    cpt_target: str = "X"  # Целевой стимул cpt для триалов без is_go
+
+# Класс для настроек HTML-отчёта
+@dataclass(frozen=True)
+class ReportCfg:
+    mode: str = "svg"  # "svg" — графики в SVG, "canvas" — данные один раз в JSON, графики рисуются в браузере
+    max_points: int = 2000  # Выше этого числа точек SVG-графики прореживаются (LTTB / min-max по корзинам)
+
+# Класс для настроек колоночного датасета (см. dataset)
+@dataclass(frozen=True)
+class DatasetCfg:
+    format: str = "auto"  # "auto" — parquet, если установлен pyarrow, иначе "rtc"; "rtc" / "csv" / "parquet" — явно
+    row_group_size: int = 65536  # Строк в группе: столько триалов держится в памяти до записи в файл
 
 # Основной класс конфигурации проекта
 @dataclass(frozen=True)
@@ -52,6 +100,8 @@ class ProjectConfig:
     flags_thresholds: FlagsThresholds  # Пороговые значения флагов анализа
     analysis: AnalysisCfg  # Конфигурация анализа
     use_loglinear_correction: bool = True  # Использовать ли логарифмическую коррекцию для d-prime
+    report: ReportCfg = ReportCfg()  # Настройки HTML-отчёта
+    dataset: DatasetCfg = DatasetCfg()  # Настройки выгрузки в колоночный датасет
 
     @staticmethod
     def load(path: Optional[str]) -> "ProjectConfig":
@@ -86,9 +136,17 @@ class ProjectConfig:
         # Загружаем или создаем конфигурацию анализа
         an_raw = data.get("analysis", {})
         analysis = AnalysisCfg(**{**AnalysisCfg().__dict__, **an_raw})
+        analysis = replace(analysis, percentiles=tuple(float(p) for p in analysis.percentiles),
+                           channels=tuple(c if isinstance(c, ChannelCfg) else ChannelCfg(**c) for c in analysis.channels))
+        
+        # Загружаем настройки отчёта
+        report = ReportCfg(**{**ReportCfg().__dict__, **data.get("report", {})})
+        
+        # Загружаем настройки датасета
+        dataset = DatasetCfg(**{**DatasetCfg().__dict__, **data.get("dataset", {})})
         
         # Загружаем параметр логарифмической коррекции
         use_loglinear = bool(data.get("dprime", {}).get("use_loglinear_correction", True))
         
         # Возвращаем полностью инициализированный объект конфигурации
-        return ProjectConfig(task_bounds=task_bounds, flags_thresholds=flags_thresholds, analysis=analysis, use_loglinear_correction=use_loglinear)
+        return ProjectConfig(task_bounds=task_bounds, flags_thresholds=flags_thresholds, analysis=analysis, use_loglinear_correction=use_loglinear, report=report, dataset=dataset)
@@ -0,0 +1,523 @@
+"""Колоночный датасет триалов и метрик сессий для последующего анализа.
+
+Каталог партиционирован по задаче и дате сессии (UTC, по t_unix первого
+события), как hive-датасеты Arrow/Spark::
+
+    <root>/trials/task=<task>/date=<YYYY-MM-DD>/part-<id>.<ext>    — строки TrialOutcome
+    <root>/sessions/task=<task>/date=<YYYY-MM-DD>/part-<id>.<ext>  — строка на сессию: meta, метрики, флаги
+
+Триалы пишутся потоково группами строк по ``row_group_size``: в памяти
+только текущая группа. Форматы файлов:
+
+* ``rtc``     — stdlib: колонки группы строк как typed arrays (строки —
+  словарь JSON + коды), в конце файла JSON-индекс смещений колонок, поэтому
+  чтение подмножества колонок не читает остальные;
+* ``csv``     — stdlib: заголовок ``имя:тип``, данные по строкам;
+* ``parquet`` — через pyarrow, если установлен (``"auto"`` выбирает его).
+
+Файл пишется во временный и переименовывается при закрытии: читатель
+никогда не видит недописанную часть. Сессия, записанная с ``source``
+(ключ содержимого, например ключ ResultCache), отмечается файлом
+``<root>/_sources/<source>`` и повторно не дописывается. Метрики сессии разворачиваются в
+скалярные колонки ``rt.mean_rt_ms``, ``rates.accuracy``, ``flags.<флаг>``…
+(списки и ряды вроде ``rolling.series`` не попадают).
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import fields
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
+import csv, itertools, json, math, os, struct, sys
+
+from .config import DatasetCfg
+from .shards import log_name
+from .trial_table import FLAG_BITS, FLOAT_COLS, GO_KNOWN, GO_TRUE, INT_COLS, STR_COLS, TrialTable
+
+# pyarrow — опционально: без него датасет пишется в rtc или csv
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = pq = None
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+FORMATS = ("rtc", "csv", "parquet")
+EXT = {"rtc": ".rtc", "csv": ".csv", "parquet": ".parquet"}
+KINDS = ("trials", "sessions")
+PARTITION_COLS = ("task", "date")
+
+# Типы колонок: f — float64 (NaN = None), i — int64, b — bool (-1 = None), s — строка
+_TYPECODE = {"f": "d", "i": "q", "b": "b"}
+MAGIC = b"RTCD\x00\x01\r\n"
+_TAIL = struct.Struct("<Q")  # Длина JSON-индекса перед завершающим MAGIC
+
+SOURCES_DIR = "_sources"  # Отметки уже записанных источников (source в DatasetWriter.append)
+SESSION_META = ("session_id", "run_id", "log_path", "task_source", "n_trials", "t_unix_start")
+
+def available_formats() -> Sequence[str]:
+    return FORMATS if pa is not None else FORMATS[:2]
+
+def get_format(name: Optional[str]=None) -> str:
+    # "auto"/None — parquet, если установлен pyarrow, иначе rtc
+    if name in (None, "auto"):
+        return "parquet" if pa is not None else "rtc"
+    if name not in FORMATS:
+        raise ValueError(f"unknown dataset format: {name!r} (expected auto, {', '.join(FORMATS)})")
+    if name not in available_formats():
+        raise ValueError("dataset format 'parquet' requires pyarrow")
+    return name
+
+def trial_schema(extra: Sequence[str]=()) -> List[Tuple[str, str]]:
+    # Колонки триалов: ключ сессии, поля TrialOutcome в порядке dataclass, затем float-колонки каналов
+    from .analyzer import TrialOutcome
+    types = {**{c: "f" for c in FLOAT_COLS}, **{c: "i" for c in INT_COLS}, **{c: "s" for c in STR_COLS},
+             **{c: "b" for c in FLAG_BITS}, "is_go": "b"}
+    return [("session_id", "s"), ("run_id", "s")] + [(f.name, types[f.name]) for f in fields(TrialOutcome)] + [(c, "f") for c in extra]
+
+def session_date(meta: Dict[str, Any]) -> str:
+    # Дата партиции: по t_unix первого события, иначе по mtime лога, иначе сегодняшняя (UTC)
+    ts = meta.get("t_unix_start")
+    if ts is None:
+        lp = meta.get("log_path")
+        try:
+            ts = os.path.getmtime(lp if isinstance(lp, str) else lp[0])
+        except (OSError, TypeError, IndexError):
+            ts = datetime.now(timezone.utc).timestamp()
+    return datetime.fromtimestamp(float(ts), timezone.utc).date().isoformat()
+
+def _partition_value(v: str) -> str:
+    # Значение партиции безопасно как имя каталога
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(v)) or "_"
+
+def flatten(d: Dict[str, Any], prefix: str="") -> Dict[str, Any]:
+    # Вложенные словари -> скалярные колонки "a.b.c"; списки пропускаются
+    out: Dict[str, Any] = {}
+    for k, v in d.items():
+        name = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, name + "."))
+        elif v is None or isinstance(v, (bool, int, float, str)):
+            out[name] = v
+    return out
+
+def session_row(meta: Dict[str, Any], metrics: Dict[str, Any], flags: Dict[str, Any]) -> Dict[str, Any]:
+    lp = meta.get("log_path")
+    row = {k: meta.get(k) for k in SESSION_META}
+    row["log_path"] = lp if isinstance(lp, str) or lp is None else ";".join(map(str, lp))
+    row.update(flatten(metrics))
+    row.update({f"flags.{k}": v.get("value") for k, v in flags.items()})
+    return row
+
+def _infer_type(values: Iterable[Any]) -> str:
+    # Тип колонки сессий по значениям; целые с пропусками хранятся как float (NaN)
+    t = None; nulls = False
+    for v in values:
+        if v is None:
+            nulls = True; continue
+        vt = "b" if isinstance(v, bool) else "i" if isinstance(v, int) else "f" if isinstance(v, float) else "s"
+        if t is None or t == vt: t = vt
+        elif {t, vt} == {"i", "f"}: t = "f"
+        else: return "s"
+    return "f" if t is None or (t == "i" and nulls) else t
+
+# --- Колонки в памяти: f/i/b — array, s — список ---
+
+def _empty(t: str) -> Any:
+    return [] if t == "s" else array(_TYPECODE[t])
+
+def _convert(t: str, values: Iterable[Any]) -> Any:
+    # Python-значения (None допустим) -> колонка типа t
+    if t == "f": return array("d", (math.nan if v is None else float(v) for v in values))
+    if t == "i": return array("q", (int(v) for v in values))
+    if t == "b": return array("b", (-1 if v is None else int(bool(v)) for v in values))
+    return [None if v is None else str(v) for v in values]
+
+def _values(t: str, col: Any) -> List[Any]:
+    # Колонка -> Python-значения с None
+    if t == "f": return [None if v != v else v for v in col]
+    if t == "b": return [None if v < 0 else bool(v) for v in col]
+    return list(col)
+
+def trial_columns(trials: Iterable[Any], session_id: str, run_id: str, schema: Sequence[Tuple[str, str]]) -> Dict[str, Any]:
+    """Колонки триалов сессии по схеме ``trial_schema``.
+
+    У TrialTable числовые колонки копируются срезом typed array, строки
+    декодируются по таблице интернирования, булевы — из битовой маски; у
+    списка TrialOutcome значения берутся по атрибутам.
+    """
+    if isinstance(trials, TrialTable):
+        n = len(trials); cols = trials.cols; strings = trials.strings
+        distinct = set(cols["flags"])  # Масок немного: булевы колонки — через таблицы подстановки
+        out: Dict[str, Any] = {}
+        for name, t in schema:
+            if name in ("session_id", "run_id"):
+                out[name] = [session_id if name == "session_id" else run_id] * n
+            elif name in cols and name not in STR_COLS and name != "flags":
+                out[name] = array(_TYPECODE[t], cols[name])
+            elif name in STR_COLS:
+                out[name] = [strings[c] for c in cols[name]]
+            elif name == "is_go":
+                lut = {b: (1 if b & GO_TRUE else 0) if b & GO_KNOWN else -1 for b in distinct}
+                out[name] = array("b", map(lut.__getitem__, cols["flags"]))
+            elif name in FLAG_BITS:
+                bit = FLAG_BITS[name]
+                lut = {b: 1 if b & bit else 0 for b in distinct}
+                out[name] = array("b", map(lut.__getitem__, cols["flags"]))
+            else:
+                out[name] = array("d", [math.nan] * n)
+        return out
+    trials = list(trials)
+    out = {}
+    for name, t in schema:
+        if name in ("session_id", "run_id"):
+            out[name] = [session_id if name == "session_id" else run_id] * len(trials)
+        else:
+            out[name] = _convert(t, (getattr(tr, name, None) for tr in trials))
+    return out
+
+# --- Запись частей ---
+
+class _Part:
+    """Один файл части: буфер текущей группы строк, сброс каждые ``row_group_size`` строк."""
+
+    def __init__(self, path: str, schema: Sequence[Tuple[str, str]], row_group_size: int, meta: Optional[Dict[str, Any]]=None):
+        self.path = path
+        self.tmp = f"{path}.tmp-{os.getpid()}"
+        self.schema = list(schema)
+        self.types = dict(schema)
+        self.row_group_size = row_group_size
+        self.meta = meta or {}
+        self.rows = 0
+        self._buf = {name: _empty(t) for name, t in self.schema}
+        self._n = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._open()
+
+    def write(self, cols: Dict[str, Any]) -> None:
+        # Дописывает колонки (одинаковой длины); полные группы строк уходят в файл сразу
+        n = len(cols[self.schema[0][0]])
+        pos = 0
+        while pos < n:
+            take = min(n - pos, self.row_group_size - self._n)
+            for name, _ in self.schema:
+                self._buf[name].extend(cols[name][pos:pos + take])
+            self._n += take; pos += take
+            if self._n >= self.row_group_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self._n:
+            self._write_group(self._buf, self._n)
+            self.rows += self._n
+            self._buf = {name: _empty(t) for name, t in self.schema}
+            self._n = 0
+
+    def close(self) -> None:
+        self._flush()
+        self._close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self) -> None:
+        try:
+            self._close()
+        finally:
+            if os.path.exists(self.tmp): os.remove(self.tmp)
+
+    def _open(self) -> None: raise NotImplementedError
+    def _write_group(self, buf: Dict[str, Any], n: int) -> None: raise NotImplementedError
+    def _close(self) -> None: raise NotImplementedError
+
+class _RtcPart(_Part):
+    # Группа строк: колонки подряд; строковая колонка — JSON-словарь значений, затем коды uint32
+    def _open(self) -> None:
+        self.f = open(self.tmp, "wb")
+        self.f.write(MAGIC)
+        self.groups: List[Dict[str, Any]] = []
+
+    def _write_group(self, buf: Dict[str, Any], n: int) -> None:
+        f = self.f
+        index: Dict[str, List[int]] = {}
+        for name, t in self.schema:
+            col = buf[name]
+            off = f.tell()
+            if t == "s":
+                codes = {v: i for i, v in enumerate(dict.fromkeys(col))}
+                arr = array("I", map(codes.__getitem__, col))
+                d = json.dumps(list(codes), ensure_ascii=False).encode("utf-8")
+                f.write(d); f.write(arr.tobytes())
+                index[name] = [off, len(d) + arr.itemsize * n, len(d)]
+            else:
+                f.write(col.tobytes())
+                index[name] = [off, col.itemsize * n, 0]
+        self.groups.append({"n": n, "columns": index})
+
+    def _close(self) -> None:
+        footer = json.dumps({"schema": self.schema, "byteorder": sys.byteorder, "row_groups": self.groups, "meta": self.meta},
+                            ensure_ascii=False).encode("utf-8")
+        self.f.write(footer); self.f.write(_TAIL.pack(len(footer))); self.f.write(MAGIC)
+        self.f.close()
+
+class _CsvPart(_Part):
+    def _open(self) -> None:
+        self.f = open(self.tmp, "w", encoding="utf-8", newline="")
+        self.w = csv.writer(self.f)
+        self.w.writerow([f"{name}:{t}" for name, t in self.schema])
+
+    def _write_group(self, buf: Dict[str, Any], n: int) -> None:
+        cols = []
+        for name, t in self.schema:
+            col = buf[name]
+            if t == "f": cols.append(["" if v != v else repr(v) for v in col])
+            elif t == "b": cols.append(["" if v < 0 else str(v) for v in col])
+            elif t == "s": cols.append(["" if v is None else v for v in col])
+            else: cols.append(col)
+        self.w.writerows(zip(*cols))
+
+    def _close(self) -> None:
+        self.f.close()
+
+class _ParquetPart(_Part):
+    _PA = {"f": "float64", "i": "int64", "b": "bool_", "s": "string"}
+
+    def _open(self) -> None:
+        self.pa_schema = pa.schema([(name, getattr(pa, self._PA[t])()) for name, t in self.schema],
+                                   metadata={"rt_mvp": json.dumps(self.meta, ensure_ascii=False)})
+        self.w = pq.ParquetWriter(self.tmp, self.pa_schema)
+
+    def _write_group(self, buf: Dict[str, Any], n: int) -> None:
+        arrays = [pa.array(_values(t, buf[name]) if t in ("f", "b") else buf[name], type=self.pa_schema.field(name).type)
+                  for name, t in self.schema]
+        self.w.write_table(pa.Table.from_arrays(arrays, schema=self.pa_schema), row_group_size=n)
+
+    def _close(self) -> None:
+        self.w.close()
+
+_PARTS = {"rtc": _RtcPart, "csv": _CsvPart, "parquet": _ParquetPart}
+
+class DatasetWriter:
+    """Дописывает сессии в датасет ``root`` (см. модуль).
+
+    Триалы каждой партиции (задача, дата, набор колонок каналов) идут в
+    один открытый файл части группами строк; строки сессий копятся до
+    ``close`` — их схема (развёрнутые метрики) объединяется по всем сессиям
+    партиции. Новый писатель всегда создаёт новые файлы частей, поэтому
+    параллельные процессы пишут в один датасет без блокировок.
+    """
+
+    _seq = itertools.count()
+
+    def __init__(self, root: str, cfg: Optional[DatasetCfg]=None):
+        cfg = cfg or DatasetCfg()
+        if cfg.row_group_size < 1:
+            raise ValueError(f"dataset row_group_size must be >= 1, got {cfg.row_group_size}")
+        self.root = root
+        self.format = get_format(cfg.format)
+        self.row_group_size = cfg.row_group_size
+        self._trials: Dict[Tuple[str, str, Tuple[str, ...]], _Part] = {}
+        self._sessions: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._sources: Dict[str, None] = {}  # Источники, отмечаемые после публикации частей
+        self.n_sessions = 0
+        self.n_skipped = 0
+        self.n_trials = 0
+
+    def _path(self, kind: str, task: str, date: str) -> str:
+        name = f"part-{os.getpid()}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{next(self._seq)}{EXT[self.format]}"
+        return os.path.join(self.root, kind, f"task={_partition_value(task)}", f"date={date}", name)
+
+    def has_source(self, source: str) -> bool:
+        return os.path.exists(os.path.join(self.root, SOURCES_DIR, source))
+
+    def append(self, trials: Iterable[Any], meta: Dict[str, Any], metrics: Dict[str, Any], flags: Dict[str, Any],
+               source: Optional[str]=None) -> bool:
+        # Одна сессия (или один запуск): её триалы и строка метрик; False — source уже есть в датасете
+        if source is not None:
+            if self.has_source(source):
+                self.n_skipped += 1
+                return False
+            self._sources[source] = None
+        task = str(meta.get("task", "")); date = session_date(meta)
+        extra = tuple(trials.extra) if isinstance(trials, TrialTable) else ()
+        key = (task, date, extra)
+        part = self._trials.get(key)
+        if part is None:
+            part = self._trials[key] = _PARTS[self.format](self._path("trials", task, date), trial_schema(extra), self.row_group_size,
+                                                           {"kind": "trials", "task": task, "date": date})
+        lp = meta.get("log_path")
+        session_id = str(meta.get("session_id") or (log_name(lp) if lp else "")); run_id = str(meta.get("run_id") or "")
+        cols = trial_columns(trials, session_id, run_id, part.schema)
+        part.write(cols)
+        row = session_row({**meta, "session_id": session_id, "run_id": run_id}, metrics, flags)
+        self._sessions.setdefault((task, date), []).append(row)
+        self.n_sessions += 1; self.n_trials += len(cols["trial_id"])
+        return True
+
+    def close(self) -> None:
+        try:
+            while self._trials:
+                self._trials.popitem()[1].close()
+            for (task, date), rows in self._sessions.items():
+                names = list(dict.fromkeys(k for r in rows for k in r))
+                schema = [(k, _infer_type(r.get(k) for r in rows)) for k in names]
+                part = _PARTS[self.format](self._path("sessions", task, date), schema, self.row_group_size,
+                                           {"kind": "sessions", "task": task, "date": date})
+                part.write({k: _convert(t, (r.get(k) for r in rows)) for k, t in schema})
+                part.close()
+        except BaseException:
+            self.abort()
+            raise
+        if self._sources:
+            d = os.path.join(self.root, SOURCES_DIR)
+            os.makedirs(d, exist_ok=True)
+            for source in self._sources:
+                open(os.path.join(d, source), "wb").close()
+        self._trials.clear(); self._sessions.clear(); self._sources.clear()
+
+    def abort(self) -> None:
+        # Удаляет недописанные части (до close ничего не публикуется)
+        for part in self._trials.values():
+            part.abort()
+        self._trials.clear(); self._sessions.clear(); self._sources.clear()
+
+    def __enter__(self) -> "DatasetWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None: self.close()
+        else: self.abort()
+
+# --- Чтение ---
+
+def dataset_files(root: str, kind: str="trials", tasks: Optional[Iterable[str]]=None,
+                  date_from: Optional[str]=None, date_to: Optional[str]=None) -> List[Tuple[str, str, str]]:
+    """Файлы частей датасета: (путь, задача, дата), отобранные по партициям без чтения файлов.
+
+    ``date_from`` / ``date_to`` — границы включительно (ISO ``YYYY-MM-DD``).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown dataset kind: {kind!r} (expected {', '.join(KINDS)})")
+    base = os.path.join(root, kind)
+    want = {_partition_value(t) for t in tasks} if tasks is not None else None
+    out = []
+    for td in sorted(os.listdir(base)) if os.path.isdir(base) else []:
+        if not td.startswith("task=") or (want is not None and td[5:] not in want):
+            continue
+        for dd in sorted(os.listdir(os.path.join(base, td))):
+            date = dd[5:]
+            if not dd.startswith("date=") or (date_from and date < date_from) or (date_to and date > date_to):
+                continue
+            d = os.path.join(base, td, dd)
+            for name in sorted(os.listdir(d)):
+                ext = os.path.splitext(name)[1]
+                if name.startswith("part-") and ext in EXT.values():
+                    out.append((os.path.join(d, name), td[5:], date))
+    return out
+
+def _read_rtc(path: str, columns: Optional[Sequence[str]]) -> Tuple[Dict[str, str], Dict[str, Any], int]:
+    # Читает только нужные колонки: по индексу в конце файла — seek к каждому чанку
+    with open(path, "rb") as f:
+        f.seek(-(_TAIL.size + len(MAGIC)), os.SEEK_END)
+        tail = f.read()
+        if tail[_TAIL.size:] != MAGIC:
+            raise ValueError(f"not a dataset part: {path}")
+        (flen,) = _TAIL.unpack(tail[:_TAIL.size])
+        f.seek(-(_TAIL.size + len(MAGIC) + flen), os.SEEK_END)
+        footer = json.loads(f.read(flen).decode("utf-8"))
+        types = {name: t for name, t in footer["schema"]}
+        names = [c for c in (columns if columns is not None else types) if c in types]
+        swap = footer["byteorder"] != sys.byteorder
+        out = {name: _empty(types[name]) for name in names}
+        n_rows = 0
+        for g in footer["row_groups"]:
+            n_rows += g["n"]
+            for name in names:
+                off, size, dlen = g["columns"][name]
+                f.seek(off); raw = f.read(size)
+                t = types[name]
+                arr = array("I" if t == "s" else _TYPECODE[t]); arr.frombytes(raw[dlen:])
+                if swap: arr.byteswap()
+                if t == "s":
+                    d = json.loads(raw[:dlen].decode("utf-8"))
+                    out[name].extend(d[c] for c in arr)
+                else:
+                    out[name].extend(arr)
+    return {n: types[n] for n in names}, out, n_rows
+
+def _read_csv(path: str, columns: Optional[Sequence[str]]) -> Tuple[Dict[str, str], Dict[str, Any], int]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        r = csv.reader(f)
+        head = [h.rpartition(":") for h in next(r)]
+        types = {name: t for name, _, t in head}
+        names = [c for c in (columns if columns is not None else types) if c in types]
+        idx = [(name, i, types[name]) for i, (n, _, _) in enumerate(head) for name in names if n == name]
+        raw: Dict[str, List[str]] = {name: [] for name in names}
+        n_rows = 0
+        for row in r:
+            n_rows += 1
+            for name, i, _ in idx:
+                raw[name].append(row[i])
+    out: Dict[str, Any] = {}
+    for name, _, t in idx:
+        vals = raw[name]
+        if t == "f": out[name] = array("d", (float(v) if v else math.nan for v in vals))
+        elif t == "i": out[name] = array("q", map(int, vals))
+        elif t == "b": out[name] = array("b", (int(v) if v else -1 for v in vals))
+        else: out[name] = [v if v else None for v in vals]
+    return {n: types[n] for n in names}, out, n_rows
+
+def _read_parquet(path: str, columns: Optional[Sequence[str]]) -> Tuple[Dict[str, str], Dict[str, Any], int]:
+    if pq is None:
+        raise ValueError(f"reading {path} requires pyarrow")
+    pf = pq.ParquetFile(path)
+    kinds = {"double": "f", "int64": "i", "bool": "b", "string": "s"}
+    types = {f.name: kinds.get(str(f.type), "s") for f in pf.schema_arrow}
+    names = [c for c in (columns if columns is not None else types) if c in types]
+    table = pf.read(columns=names)
+    return {n: types[n] for n in names}, {n: _convert(types[n], table.column(n).to_pylist()) for n in names}, pf.metadata.num_rows
+
+_READERS = {".rtc": _read_rtc, ".csv": _read_csv, ".parquet": _read_parquet}
+
+def iter_parts(root: str, kind: str="trials", columns: Optional[Sequence[str]]=None, tasks: Optional[Iterable[str]]=None,
+               date_from: Optional[str]=None, date_to: Optional[str]=None) -> Iterator[Tuple[Dict[str, str], Dict[str, Any], int]]:
+    # По одной части: (типы, колонки, число строк); колонки партиций task/date добавляются по запросу
+    for path, task, date in dataset_files(root, kind, tasks, date_from, date_to):
+        file_cols = None if columns is None else [c for c in columns if c not in PARTITION_COLS]
+        types, cols, n = _READERS[os.path.splitext(path)[1]](path, file_cols)
+        if columns is None or "task" in columns: types["task"] = "s"; cols["task"] = [task] * n
+        if columns is None or "date" in columns: types["date"] = "s"; cols["date"] = [date] * n
+        yield types, cols, n
+
+def read_dataset(root: str, kind: str="trials", columns: Optional[Sequence[str]]=None, tasks: Optional[Iterable[str]]=None,
+                 date_from: Optional[str]=None, date_to: Optional[str]=None) -> Dict[str, Any]:
+    """Колонки датасета ``kind`` ("trials" / "sessions") по всем частям.
+
+    Читаются только ``columns`` (None — все) и только партиции из ``tasks``
+    и диапазона дат. Числа — ``array`` (float: NaN = None, bool: -1 = None,
+    0/1), строки — списки; с numpy ``np.frombuffer`` даёт массивы без копии.
+    Колонки, которых нет в части (другие метрики сессий), заполняются None.
+    """
+    types: Dict[str, str] = {}
+    out: Dict[str, Any] = {}
+    total = 0
+    for ptypes, cols, n in iter_parts(root, kind, columns, tasks, date_from, date_to):
+        for name in list(dict.fromkeys([*types, *ptypes])):
+            t_old = types.get(name); t_new = ptypes.get(name)
+            # Общий тип колонки по частям: int без значений (нет в части) и int/float — float, прочие расхождения — строка
+            if t_old is None: t = "f" if (t_new == "i" and total) else t_new
+            elif t_new is None: t = "f" if t_old == "i" else t_old
+            else: t = t_old if t_old == t_new else "f" if {t_old, t_new} <= {"i", "f"} else "s"
+            if t_old is None: out[name] = _convert(t, [None] * total)
+            elif t != t_old: out[name] = _convert(t, _values(t_old, out[name]))
+            types[name] = t
+            col = cols.get(name)
+            if col is None: out[name].extend(_convert(t, [None] * n))
+            elif t_new != t: out[name].extend(_convert(t, _values(t_new, col)))
+            else: out[name].extend(col)
+        total += n
+    if columns is not None:
+        missing = [c for c in columns if c not in out]
+        if missing and total:
+            raise KeyError(f"columns not in dataset: {', '.join(missing)}")
+        return {c: out.get(c, []) for c in columns}
+    return out
@@ -1,11 +1,156 @@
 from __future__ import annotations
-from typing import Any, Dict, Iterator
-import json
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Union
+import json, mmap, os, re
+
+# Быстрые JSON-декодеры (опционально); без них используется stdlib json
+try:
+    import orjson as _orjson  # type: ignore
+except ImportError:
+    _orjson = None
+try:
+    import ujson as _ujson  # type: ignore
+except ImportError:
+    _ujson = None
+
+# Типы событий, которые нужны анализатору для сборки триалов
+ANALYZER_EVENT_TYPES = ("stimulus_on", "keypress", "trial_end")
+CHUNK_SIZE = 1 << 20  # Размер блока чтения в байтах
 
 def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             line=line.strip()
-            if not line: 
+            if not line:
                 continue
             yield json.loads(line)
+
+def available_json_backends() -> Sequence[str]:
+    out = []
+    if _orjson is not None: out.append("orjson")
+    if _ujson is not None: out.append("ujson")
+    out.append("json")
+    return out
+
+def get_loads(backend: Optional[str]=None) -> Callable[[bytes], Any]:
+    # Возвращает функцию декодирования JSON из bytes: самую быструю из доступных или указанную явно
+    name = backend or available_json_backends()[0]
+    if name == "orjson" and _orjson is not None:
+        return _orjson.loads
+    if name == "ujson" and _ujson is not None:
+        return _ujson.loads
+    if name == "json":
+        return json.loads
+    raise ValueError(f"JSON backend недоступен: {name}")
+
+def _matching_lines(buf: Any, rx: "re.Pattern[bytes]", start: int, end: int) -> Iterator[bytes]:
+    # Выдаёт строки буфера, в которых встречается rx; остальные строки не просматриваются построчно
+    pos = start
+    while True:
+        m = rx.search(buf, pos, end)
+        if m is None:
+            return
+        s = buf.rfind(b"\n", start, m.start()) + 1
+        if s < start: s = start
+        e = buf.find(b"\n", m.end(), end)
+        if e < 0: e = end
+        yield buf[s:e]
+        pos = e + 1
+
+def _add(counters: Optional[Dict[str, int]], key: str, n: int) -> None:
+    if counters is not None:
+        counters[key] = counters.get(key, 0) + n
+
+def _iter_raw_lines(path: str, rx: Optional["re.Pattern[bytes]"], use_mmap: bool, chunk_size: int,
+                    counters: Optional[Dict[str, int]]=None) -> Iterator[bytes]:
+    # counters["lines"] — все строки файла, включая отброшенные предфильтром (считаются по блокам, не построчно)
+    if rx is None:
+        n = 0
+        try:
+            with open(path, "rb", buffering=chunk_size) as f:
+                for line in f:
+                    n += 1
+                    yield line
+        finally:
+            _add(counters, "lines", n)
+        return
+    with open(path, "rb") as f:
+        if use_mmap:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if counters is not None:
+                    n = sum(mm[i:i + chunk_size].count(b"\n") for i in range(0, size, chunk_size))
+                    _add(counters, "lines", n + (mm[size - 1] != 10))
+                yield from _matching_lines(mm, rx, 0, len(mm))
+            return
+        tail = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buf = tail + chunk
+            cut = buf.rfind(b"\n") + 1  # Незавершённая строка переносится в следующий блок
+            if counters is not None: _add(counters, "lines", buf.count(b"\n", 0, cut))
+            yield from _matching_lines(buf, rx, 0, cut)
+            tail = buf[cut:]
+        if tail:
+            _add(counters, "lines", 1)
+            yield from _matching_lines(tail, rx, 0, len(tail))
+
+def read_jsonl_filtered(path: str, event_types: Optional[Sequence[str]]=ANALYZER_EVENT_TYPES, instrument: Optional[str]="rt",
+                        backend: Optional[str]=None, use_mmap: bool=False, chunk_size: int=CHUNK_SIZE,
+                        counters: Optional[Dict[str, int]]=None) -> Iterator[Dict[str, Any]]:
+    """Читает JSONL, отбрасывая ненужные строки до декодирования.
+
+    Строка декодируется, только если в ней есть байтовое вхождение одного из
+    ``"<event_type>"``; после декодирования условие проверяется точно. События
+    с другим ``instrument`` пропускаются, события без поля ``instrument`` — нет.
+    В ``counters`` (если передан) добавляются: lines, dropped_prefilter,
+    dropped_blank, dropped_event_type, dropped_instrument, events_read.
+    """
+    loads = get_loads(backend)
+    rx = None
+    types = None
+    if event_types:
+        types = frozenset(event_types)
+        rx = re.compile(b'"(?:' + b"|".join(re.escape(t.encode("utf-8")) for t in event_types) + b')"')
+    n_raw = n_blank = n_type = n_inst = n_out = 0  # Локальные счётчики: словарь обновляется один раз в конце
+    lines: Optional[Dict[str, int]] = {} if counters is not None else None
+    try:
+        for raw in _iter_raw_lines(path, rx, use_mmap, chunk_size, lines):
+            n_raw += 1
+            line = raw.strip()
+            if not line:
+                n_blank += 1
+                continue
+            ev = loads(line)
+            if types is not None and ev.get("event_type") not in types:
+                n_type += 1
+                continue
+            if instrument is not None:
+                inst = ev.get("instrument")
+                if inst is not None and inst != instrument:
+                    n_inst += 1
+                    continue
+            n_out += 1
+            yield ev
+    finally:
+        if counters is not None and lines is not None:
+            n_lines = lines.get("lines", 0)
+            for k, v in (("lines", n_lines), ("dropped_prefilter", n_lines - n_raw if rx is not None else 0), ("dropped_blank", n_blank),
+                         ("dropped_event_type", n_type), ("dropped_instrument", n_inst), ("events_read", n_out)):
+                _add(counters, k, v)
+
+def read_events(path: Union[str, Sequence[str]], event_types: Optional[Sequence[str]]=ANALYZER_EVENT_TYPES, instrument: Optional[str]="rt",
+                counters: Optional[Dict[str, int]]=None, reorder_window_s: float=1.0, **kw: Any) -> Iterator[Dict[str, Any]]:
+    # Читает лог в любом формате: бинарный (см. binlog) определяется по сигнатуре, иначе JSONL.
+    # Список путей — шарды одной сессии, сливаются по t_mono (см. shards.read_shards)
+    if not isinstance(path, str):
+        from .shards import read_shards
+        return read_shards(path, event_types=event_types, instrument=instrument, reorder_window_s=reorder_window_s, counters=counters, **kw)
+    from .binlog import is_binlog, read_binlog
+    if is_binlog(path):
+        return read_binlog(path, event_types=event_types, instrument=instrument, counters=counters)
+    kw["counters"] = counters
+    return read_jsonl_filtered(path, event_types=event_types, instrument=instrument, **kw)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Optional, Tuple
+import hashlib, json, os, pickle, time
+
+from . import __version__
+from .config import ProjectConfig
+from .event_log import ANALYZER_EVENT_TYPES, get_loads
+from .analyzer import _bounds_meta, _write_report
+from .intervals import is_rt_event
+from .online import OnlineAnalyzer
+from .trial_table import TrialTable
+
+CHECK_BYTES = 4096  # Сколько байт в начале лога и перед смещением сверяется при восстановлении контрольной точки
+
+def _atomic_write_json(path: str, data: Any) -> None:
+    # Читатель (дашборд) видит либо старый, либо новый файл целиком
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def _prefix_hash(path: str, n: int) -> str:
+    # Начало лога и окно перед смещением: пересозданный лог той же сессии начинается теми же событиями
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(min(n, CHECK_BYTES)))
+        if n > CHECK_BYTES:
+            f.seek(max(CHECK_BYTES, n - CHECK_BYTES))
+            h.update(f.read(n - f.tell()))
+    return h.hexdigest()
+
+class LogFollower:
+    """Инкрементальный анализ растущего JSONL-лога сессии.
+
+    Хранит смещение в байтах, открытые триалы и аккумуляторы метрик
+    (OnlineAnalyzer); ``poll()`` читает только байты, дописанные с прошлого
+    вызова. Незавершённая последняя строка (без ``\\n``) не потребляется и
+    дочитывается на следующем опросе. Если лог укоротился или заменён,
+    анализ начинается заново.
+
+    Анализируется один запуск ``run`` = (session_id, run_id), по умолчанию —
+    запуск первого события RT; события других запусков и инструментов
+    пропускаются. Задача берётся из ``task``, иначе из ``task_variant``
+    первого события запуска (по умолчанию "simple"), как в ``build_runs``.
+    """
+
+    def __init__(self, log_path: str, cfg: ProjectConfig, out_dir: str, task: Optional[str]=None,
+                 horizon_s: Optional[float]=None, checkpoint_path: Optional[str]=None,
+                 on_alert: Optional[Callable[[str, Dict[str, Any]], None]]=None, run: Optional[Tuple[str, str]]=None):
+        self.log_path = log_path
+        self.select = run
+        self.cfg = cfg
+        self.out_dir = out_dir
+        self.task = task
+        self.horizon_s = horizon_s
+        self.checkpoint_path = checkpoint_path
+        self.on_alert = on_alert
+        self._loads = get_loads()
+        self._reset()
+        if checkpoint_path:
+            self._load_checkpoint()
+
+    def _reset(self) -> None:
+        self.offset = 0
+        self.online: Optional[OnlineAnalyzer] = None
+        self.key: Optional[Tuple[str, str]] = self.select
+        self.n_skipped = 0  # События RT других запусков
+        self.trials = TrialTable()
+        self.n_polls = 0
+        self.n_bad_lines = 0
+        self.session_ended = False
+
+    def _analyzer(self, ev: Dict[str, Any]) -> Optional[OnlineAnalyzer]:
+        # Анализатор запуска события RT; None — событие другого запуска или запуск ещё не начался
+        key = (str(ev.get("session_id", "")), str(ev.get("run_id", "")))
+        if self.key is None:
+            if ev.get("event_type") not in ANALYZER_EVENT_TYPES:
+                return None
+            self.key = key
+        elif key != self.key:
+            self.n_skipped += 1
+            return None
+        if self.online is None:
+            task = self.task or (str(ev["task_variant"]) if ev.get("task_variant") else "simple")
+            self.online = OnlineAnalyzer(task, self.cfg, horizon_s=self.horizon_s, on_alert=self.on_alert)
+        return self.online
+
+    def poll(self) -> int:
+        # Обрабатывает новые полные строки; возвращает число прочитанных событий
+        self.n_polls += 1
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            return 0
+        if size < self.offset:
+            self._reset(); self.n_polls = 1  # Лог пересоздан
+        if size == self.offset:
+            return 0
+        with open(self.log_path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            return 0
+        n = 0
+        loads = self._loads
+        for line in data[:cut].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                ev = loads(line)
+            except ValueError:
+                self.n_bad_lines += 1  # Полная, но битая строка — пропускаем
+                continue
+            n += 1
+            if not is_rt_event(ev):
+                continue  # События каналов не анализируются и не завершают сессию
+            online = self._analyzer(ev)
+            if online is None:
+                continue
+            self.trials.extend(online.feed(ev))
+            if ev.get("event_type") == "session_end":
+                self.session_ended = True
+        self.offset += cut
+        return n
+
+    def summary(self) -> Dict[str, Any]:
+        meta: Dict[str, Any] = {"log_path": self.log_path, "task": None, "bounds": None, "n_trials": len(self.trials), "mode": "follow"}
+        metrics: Dict[str, Any] = {}
+        flags: Dict[str, Any] = {}
+        online = self.online
+        if online is not None:
+            meta["task"] = online.task
+            meta["session_id"], meta["run_id"] = self.key
+            meta["bounds"] = _bounds_meta(online.acc.bounds)
+            metrics, flags = online.metrics, online.flags
+        meta["follow"] = {"offset": self.offset, "n_events": online.n_events if online else 0,
+                          "open_trials": online.assembler.open_trials if online else 0, "n_polls": self.n_polls,
+                          "n_bad_lines": self.n_bad_lines, "n_skipped": self.n_skipped, "session_ended": self.session_ended, "updated_unix": time.time()}
+        return {"meta": meta, "metrics": metrics, "flags": flags}
+
+    def write_summary(self) -> Dict[str, Any]:
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary = self.summary()
+        _atomic_write_json(os.path.join(self.out_dir, "summary.json"), summary)
+        return summary
+
+    def finish(self) -> Dict[str, Any]:
+        # Закрывает оставшиеся триалы и пишет итоговые summary.json и report.html
+        self.poll()
+        if self.online is not None:
+            self.trials.extend(self.online.close_open())
+        s = self.summary()
+        self.trials.sort_by_trial_id()
+        return _write_report(self.out_dir, s["meta"], self.trials, s["metrics"], s["flags"], self.cfg.report)
+
+    def save_checkpoint(self) -> None:
+        if not self.checkpoint_path or self.offset == 0:
+            return
+        state = {"version": __version__, "log_path": os.path.realpath(self.log_path), "prefix": _prefix_hash(self.log_path, self.offset),
+                 "offset": self.offset, "run": self.key, "online": self.online, "trials": self.trials, "n_bad_lines": self.n_bad_lines,
+                 "n_skipped": self.n_skipped, "session_ended": self.session_ended}
+        d = os.path.dirname(self.checkpoint_path)
+        if d: os.makedirs(d, exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.checkpoint_path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)  # Недописанная контрольная точка не остаётся рядом с целевой
+
+    def _load_checkpoint(self) -> bool:
+        # Продолжает с контрольной точки, если она от того же лога и той же версии; иначе — с начала
+        assert self.checkpoint_path
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                state = pickle.load(f)
+            if (state["version"] != __version__ or state["log_path"] != os.path.realpath(self.log_path)
+                    or (self.select is not None and state["run"] != self.select)
+                    or os.path.getsize(self.log_path) < state["offset"] or _prefix_hash(self.log_path, state["offset"]) != state["prefix"]):
+                return False
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            return False
+        self.offset = state["offset"]
+        self.key = state["run"]
+        self.online = state["online"]
+        if self.online is not None:
+            self.online.on_alert = self.on_alert
+        self.trials = state["trials"]
+        self.n_bad_lines = state["n_bad_lines"]
+        self.n_skipped = state["n_skipped"]
+        self.session_ended = state["session_ended"]
+        return True
+
+    def run(self, interval_s: float=1.0, checkpoint_every: int=10, stop_on_session_end: bool=True,
+            max_idle_s: Optional[float]=None) -> Dict[str, Any]:
+        """Опрашивает лог каждые ``interval_s`` секунд и обновляет summary.json.
+
+        Останавливается после ``session_end`` (если ``stop_on_session_end``),
+        после ``max_idle_s`` секунд без новых данных или по Ctrl+C; в конце
+        пишет полный отчёт.
+        """
+        idle_since = time.monotonic()
+        try:
+            while True:
+                if self.poll():
+                    idle_since = time.monotonic()
+                    self.write_summary()
+                    if self.n_polls % checkpoint_every == 0:
+                        self.save_checkpoint()
+                if stop_on_session_end and self.session_ended:
+                    break
+                if max_idle_s is not None and time.monotonic() - idle_since > max_idle_s:
+                    break
+                time.sleep(interval_s)
+        except KeyboardInterrupt:
+            pass
+        self.save_checkpoint()
+        return self.finish()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import math
+
+from .config import ChannelCfg
+from .event_log import ANALYZER_EVENT_TYPES
+from .trial_table import TrialTable
+
+_NAN = float("nan")
+
+def is_rt_event(ev: Dict[str, Any]) -> bool:
+    # События без instrument считаются событиями RT (как в read_jsonl_filtered)
+    inst = ev.get("instrument")
+    return inst is None or inst == "rt"
+
+def reader_filter(channels: Sequence[ChannelCfg]) -> Tuple[Optional[Tuple[str, ...]], Optional[str]]:
+    # (event_types, instrument) для read_events: события RT и событий каналов за одно чтение
+    if not channels:
+        return ANALYZER_EVENT_TYPES, "rt"
+    if any(c.event_type is None for c in channels):
+        return None, None  # Канал без event_type — префильтр по типу невозможен
+    return tuple(dict.fromkeys(ANALYZER_EVENT_TYPES + tuple(c.event_type for c in channels if c.event_type))), None
+
+def _prefix(values: Iterable[float]) -> array:
+    # Префиксные суммы: p[i] — сумма первых i значений
+    p = array("d", [0.0])
+    acc = 0.0
+    for v in values:
+        acc += v
+        p.append(acc)
+    return p
+
+class SampleIndex:
+    """Точечные отсчёты канала: отсортированные времена и префиксные суммы значений.
+
+    ``window(t0, t1)`` — число отсчётов в [t0, t1], число отсчётов со
+    значением и сумма значений за O(log n) (два bisect).
+    """
+
+    def __init__(self, times: Sequence[float], values: Sequence[float]):
+        order = range(len(times))
+        if any(times[i] > times[i + 1] for i in range(len(times) - 1)):
+            order = sorted(order, key=times.__getitem__)
+        self.times = array("d", (times[i] for i in order))
+        vals = [values[i] for i in order]
+        self._n_val = _prefix(0.0 if math.isnan(v) else 1.0 for v in vals)
+        self._sum = _prefix(0.0 if math.isnan(v) else v for v in vals)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def window(self, t0: float, t1: float) -> Tuple[int, int, float]:
+        lo = bisect_left(self.times, t0); hi = bisect_right(self.times, t1)
+        if hi <= lo:
+            return 0, 0, 0.0
+        return hi - lo, int(self._n_val[hi] - self._n_val[lo]), self._sum[hi] - self._sum[lo]
+
+class IntervalIndex:
+    """События с длительностью (моргания): число пересекающих окно и суммарное перекрытие.
+
+    Число пересечений — по отдельно отсортированным началам и концам
+    (#начал < t1 минус #концов <= t0). Перекрытие — по объединению
+    интервалов (без наложений, концы отсортированы) с префиксными суммами
+    длительностей и поправкой на два крайних интервала. Оба — O(log n).
+    """
+
+    def __init__(self, starts: Sequence[float], ends: Sequence[float]):
+        self.starts = array("d", sorted(starts))
+        self.ends = array("d", sorted(ends))
+        us: List[float] = []; ue: List[float] = []
+        for s, e in sorted(zip(starts, ends)):
+            if ue and s <= ue[-1]:
+                if e > ue[-1]: ue[-1] = e
+            else:
+                us.append(s); ue.append(e)
+        self._us = array("d", us); self._ue = array("d", ue)
+        self._dur = _prefix(e - s for s, e in zip(us, ue))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def window(self, t0: float, t1: float) -> Tuple[int, float]:
+        n = bisect_left(self.starts, t1) - bisect_right(self.ends, t0)
+        i0 = bisect_right(self._ue, t0); i1 = bisect_left(self._us, t1)
+        if i1 <= i0:
+            return max(n, 0), 0.0
+        total = self._dur[i1] - self._dur[i0]
+        total -= max(0.0, t0 - self._us[i0]) + max(0.0, self._ue[i1 - 1] - t1)
+        return max(n, 0), total
+
+ChannelIndex = Union[SampleIndex, IntervalIndex]
+
+def _num(v: Any) -> float:
+    # Значение поля отсчёта: bool -> 0/1, число -> float, иначе NaN
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    if isinstance(v, (int, float)):
+        return float(v)
+    return _NAN
+
+class ChannelCollector:
+    """Собирает отсчёты каналов из потока событий (не RT) и строит по ним индексы."""
+
+    def __init__(self, channels: Sequence[ChannelCfg], counters: Optional[Dict[str, int]]=None):
+        self.channels = list(channels)
+        self.counters = counters
+        self._route: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for i, c in enumerate(self.channels):
+            self._route.setdefault((c.instrument, c.event_type), []).append(i)
+        self._t: List[array] = [array("d") for _ in self.channels]
+        self._v: List[array] = [array("d") for _ in self.channels]
+
+    def add(self, ev: Dict[str, Any]) -> bool:
+        # Отсчёт события в подходящие каналы; False — событие не относится ни к одному каналу
+        inst = ev.get("instrument")
+        idx = self._route.get((inst, ev.get("event_type")), []) + self._route.get((inst, None), [])
+        t = ev.get("t_mono")
+        if not idx or t is None:
+            if self.counters is not None: self.counters["dropped_instrument"] = self.counters.get("dropped_instrument", 0) + 1
+            return False
+        t = float(t)
+        for i in idx:
+            c = self.channels[i]
+            if c.kind == "intervals":
+                self._t[i].append(t); self._v[i].append(t + _num(ev.get(c.duration_field, 0.0)) / 1000.0)
+            else:
+                self._t[i].append(t); self._v[i].append(_num(ev.get(c.field)) if c.field else _NAN)
+        if self.counters is not None: self.counters["channel_samples"] = self.counters.get("channel_samples", 0) + 1
+        return True
+
+    def build(self) -> Dict[str, ChannelIndex]:
+        # Индексы каналов, в которых есть хотя бы один отсчёт
+        out: Dict[str, ChannelIndex] = {}
+        for c, ts, vs in zip(self.channels, self._t, self._v):
+            if not ts:
+                continue
+            if c.kind == "intervals":
+                ends = [e if not math.isnan(e) else s for s, e in zip(ts, vs)]
+                out[c.name] = IntervalIndex(ts, ends)
+            else:
+                out[c.name] = SampleIndex(ts, vs)
+        return out
+
+def attach_channels(table: TrialTable, indexes: Dict[str, ChannelIndex], channels: Sequence[ChannelCfg]) -> List[str]:
+    """Колонки агрегатов каналов в окне каждого триала [t0, t0 + timeout_ms].
+
+    samples: ``<name>_n`` и (если задано поле) ``<name>_mean``; intervals:
+    ``<name>_n`` и ``<name>_overlap_ms``. Триалы без t0 — NaN. Возвращает
+    имена добавленных колонок.
+    """
+    t0s = table.cols["t0"]; tos = table.cols["timeout_ms"]
+    added: List[str] = []
+    for c in channels:
+        ix = indexes.get(c.name)
+        if ix is None:
+            continue
+        n_col = array("d"); v_col = array("d")
+        for t0, to in zip(t0s, tos):
+            if math.isnan(t0):
+                n_col.append(_NAN); v_col.append(_NAN)
+                continue
+            t1 = t0 + to / 1000.0
+            if isinstance(ix, IntervalIndex):
+                n, overlap = ix.window(t0, t1)
+                n_col.append(float(n)); v_col.append(overlap * 1000.0)
+            else:
+                n, n_val, total = ix.window(t0, t1)
+                n_col.append(float(n)); v_col.append(total / n_val if n_val else _NAN)
+        table.set_column(f"{c.name}_n", n_col); added.append(f"{c.name}_n")
+        if isinstance(ix, IntervalIndex):
+            table.set_column(f"{c.name}_overlap_ms", v_col); added.append(f"{c.name}_overlap_ms")
+        elif c.field:
+            table.set_column(f"{c.name}_mean", v_col); added.append(f"{c.name}_mean")
+    return added
+
+def channel_summary(table: TrialTable, indexes: Dict[str, ChannelIndex], channels: Sequence[ChannelCfg]) -> Dict[str, Any]:
+    # Сводка для meta["channels"]: отсчёты, покрытие триалов, среднее по триалам и по классам исходов
+    out: Dict[str, Any] = {}
+    cls = table.column("classification")
+    for c in channels:
+        ix = indexes.get(c.name)
+        if ix is None:
+            continue
+        value_col = f"{c.name}_overlap_ms" if c.kind == "intervals" else (f"{c.name}_mean" if c.field else None)
+        ns = table.column(f"{c.name}_n")
+        vals = table.column(value_col) if value_col else ns
+        by: Dict[str, List[float]] = {}
+        for k, n, v in zip(cls, ns, vals):
+            if n > 0 and not math.isnan(v):
+                by.setdefault(k, []).append(v)
+        allv = [v for vs in by.values() for v in vs]
+        out[c.name] = {"instrument": c.instrument, "kind": c.kind, "field": c.field, "column": value_col or f"{c.name}_n",
+                       "n_samples": len(ix), "trials_with_data": sum(1 for n in ns if n > 0),
+                       "mean": math.fsum(allv) / len(allv) if allv else None,
+                       "by_classification": {k: math.fsum(vs) / len(vs) for k, vs in sorted(by.items())}}
+    return out
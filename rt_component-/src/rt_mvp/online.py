@@ -0,0 +1,113 @@
+from __future__ import annotations
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import ProjectConfig
+from .event_log import ANALYZER_EVENT_TYPES
+from .analyzer import TrialAssembler, TrialOutcome
+from .accumulators import MetricsAccumulator, RunningMedian
+from .state_flags import PostErrorSlowingAccumulator, decide_state_flags
+from .rolling import make_window
+
+class OnlineAnalyzer:
+    """Анализ RT во время сессии: подаётся по одному событию (например, через CallbackSink).
+
+    Триал классифицируется, когда закрывается (см. TrialAssembler); метрики и
+    все флаги состояния обновляются после каждого закрытого триала за O(1)
+    (медиана — O(log n)). ``on_trial(trial, analyzer)`` вызывается после
+    каждого триала, ``on_alert(name, info)`` — когда флаг меняет значение.
+
+        online = OnlineAnalyzer("simple", cfg, on_alert=print)
+        sink = CallbackSink(online)
+    """
+
+    def __init__(self, task: str, cfg: ProjectConfig, horizon_s: Optional[float]=None,
+                 on_trial: Optional[Callable[[TrialOutcome, "OnlineAnalyzer"], None]]=None,
+                 on_alert: Optional[Callable[[str, Dict[str, Any]], None]]=None):
+        self.task = task
+        self.cfg = cfg
+        self.on_trial = on_trial
+        self.on_alert = on_alert
+        self.assembler = TrialAssembler(task, cfg, horizon_s=horizon_s)
+        self.acc = MetricsAccumulator(task, cfg, rt_store=RunningMedian(cfg.analysis.tdigest_compression))
+        self.pes = PostErrorSlowingAccumulator()
+        self._prefix = array("d", [0.0])  # Префиксные суммы валидных RT (для третей усталости)
+        self.window = make_window(cfg, keep_series=False)  # Скользящее окно: сводка для оконных порогов флагов
+        self.n_events = 0
+        self.metrics: Dict[str, Any] = self.acc.result()
+        self.flags: Dict[str, Any] = self._decide()
+
+    def __call__(self, event: Dict[str, Any]) -> None:
+        self.feed(event)
+
+    def feed(self, event: Dict[str, Any]) -> List[TrialOutcome]:
+        # Принимает событие; возвращает закрывшиеся на нём триалы
+        self.n_events += 1
+        et = event.get("event_type")
+        inst = event.get("instrument")
+        if inst is not None and inst != "rt":
+            return []
+        if et == "session_end":
+            closed = self.assembler.push(event) + self.assembler.flush()
+        elif et in ANALYZER_EVENT_TYPES:
+            closed = self.assembler.push(event)
+        else:
+            return []
+        for t in closed:
+            self._add_trial(t)
+        return closed
+
+    def close_open(self) -> List[TrialOutcome]:
+        # Закрывает оставшиеся триалы и возвращает их
+        closed = self.assembler.flush()
+        for t in closed:
+            self._add_trial(t)
+        return closed
+
+    def finish(self) -> Dict[str, Any]:
+        # Закрывает оставшиеся триалы (конец сессии без session_end)
+        self.close_open()
+        return self.snapshot()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Для контрольных точек: колбэки не сохраняются
+        state = dict(self.__dict__)
+        state["on_trial"] = state["on_alert"] = None
+        return state
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"metrics": self.metrics, "flags": self.flags, "n_events": self.n_events, "open_trials": self.assembler.open_trials}
+
+    def _add_trial(self, t: TrialOutcome) -> None:
+        self.acc.add(t)
+        self.pes.add(t)
+        if t.is_valid_rt and t.rt_ms is not None:
+            self._prefix.append(self._prefix[-1] + float(t.rt_ms))
+        if self.window is not None:
+            self.window.push(t)
+        self.metrics = self.acc.result()
+        prev = self.flags
+        self.flags = self._decide()
+        if self.on_alert is not None:
+            for name, info in self.flags.items():
+                if info.get("value") != prev.get(name, {}).get("value"):
+                    self.on_alert(name, info)
+        if self.on_trial is not None:
+            self.on_trial(t, self)
+
+    def _fatigue(self) -> Dict[str, Any]:
+        # Трети валидных RT по префиксным суммам — как fatigue_thirds, но за O(1)
+        slope = self.metrics.get("rt", {}).get("rt_slope_ms_per_trial")
+        fatigue = {"slope": slope, "first_third_mean": None, "last_third_mean": None, "delta_ms": None}
+        p = self._prefix
+        k = len(p) - 1
+        if k >= 6:
+            a = max(1, k // 3)
+            mf = p[a] / a
+            ml = (p[k] - p[k - a]) / a
+            fatigue.update(first_third_mean=mf, last_third_mean=ml, delta_ms=ml - mf)
+        return fatigue
+
+    def _decide(self) -> Dict[str, Any]:
+        return decide_state_flags(self.metrics, self.pes.result(), self._fatigue(), self.cfg,
+                                  self.window.summary() if self.window is not None else None)
@@ -0,0 +1,87 @@
+from __future__ import annotations
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, Mapping, Optional
+import cProfile, io, os, pstats, time, tracemalloc
+
+class PipelineProfile:
+    """Время этапов анализа (wall и CPU) и счётчики событий/триалов одного прогона.
+
+    Этапы замеряются целиком (``with profile.stage(name)``), без таймеров на
+    каждое событие; счётчики заполняют читатели лога и ``TrialAssembler``.
+    ``to_dict()`` попадает в ``summary["meta"]["profile"]``.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        w0 = time.perf_counter(); c0 = time.process_time()
+        try:
+            yield
+        finally:
+            s = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            s["wall_s"] += time.perf_counter() - w0
+            s["cpu_s"] += time.process_time() - c0
+            s["calls"] += 1
+
+    def count(self, key: str, n: int=1) -> None:
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def update(self, counters: Mapping[str, int]) -> None:
+        for k, v in counters.items():
+            self.counters[k] = self.counters.get(k, 0) + v
+
+    def copy(self) -> "PipelineProfile":
+        p = PipelineProfile()
+        p.stages = {k: dict(v) for k, v in self.stages.items()}
+        p.counters = dict(self.counters)
+        return p
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {k: {"wall_s": round(v["wall_s"], 6), "cpu_s": round(v["cpu_s"], 6), "calls": v["calls"]} for k, v in self.stages.items()}
+        total = sum(v["wall_s"] for v in self.stages.values())
+        return {"stages": stages, "total_wall_s": round(total, 6), "counters": dict(sorted(self.counters.items()))}
+
+@contextmanager
+def cprofile_to(path: str, top: int=40) -> Iterator[cProfile.Profile]:
+    # cProfile блока: <path> (pstats, для snakeviz/pstats) и <path>.txt — топ функций по накопленному времени
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+        prof.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+
+@contextmanager
+def tracemalloc_to(path: str, top: int=30, frames: int=1) -> Iterator[None]:
+    # Аллокации блока: пик и текущий объём, топ строк кода по памяти, оставшейся после блока
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"peak_kb: {peak / 1024.0:.1f}\ncurrent_kb: {current / 1024.0:.1f}\n\n")
+            for stat in snap.statistics("lineno")[:top]:
+                f.write(f"{stat}\n")
+
+def stage(profile: Optional[PipelineProfile], name: str) -> Any:
+    # Замер этапа, если профиль передан; иначе пустой контекст
+    return profile.stage(name) if profile is not None else nullcontext()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import math
+
+# Ниже этого размера сортировка (на C) быстрее выбора на Python
+_SELECT_MIN_N = 20000
+
+def select_kth(xs: Sequence[float], k: int) -> float:
+    # k-я порядковая статистика (0-based) выбором Хоара без полной сортировки
+    if not 0 <= k < len(xs):
+        raise IndexError("k out of range")
+    data = list(xs)
+    while True:
+        n = len(data)
+        if n <= _SELECT_MIN_N:
+            return sorted(data)[k]
+        a, b, c = data[0], data[n // 2], data[-1]
+        pivot = max(min(a, b), min(max(a, b), c))  # Медиана из трёх
+        lo = [x for x in data if x < pivot]
+        if k < len(lo):
+            data = lo
+            continue
+        hi = [x for x in data if x > pivot]
+        n_eq = n - len(lo) - len(hi)
+        if k < len(lo) + n_eq:
+            return pivot
+        k -= len(lo) + n_eq
+        data = hi
+
+def _interp(lo: float, hi: float, frac: float) -> float:
+    return lo if frac == 0 else lo + (hi - lo) * frac
+
+def quantile(xs: Sequence[float], q: float) -> Optional[float]:
+    # Точный квантиль q∈[0,1] с линейной интерполяцией (как numpy "linear"; q=0.5 совпадает со stats.median)
+    n = len(xs)
+    if n == 0: return None
+    h = (n - 1) * min(max(q, 0.0), 1.0)
+    i = int(math.floor(h)); frac = h - i
+    lo = select_kth(xs, i)
+    if frac == 0 or i + 1 >= n:
+        return lo
+    hi = select_kth(xs, i + 1)
+    return _interp(lo, hi, frac)
+
+def quantiles(xs: Sequence[float], qs: Sequence[float]) -> List[Optional[float]]:
+    # Набор точных квантилей: выбором для 1–2 квантилей, иначе одной сортировкой
+    n = len(xs)
+    if n == 0: return [None for _ in qs]
+    if len(qs) <= 2 and n > _SELECT_MIN_N:
+        return [quantile(xs, q) for q in qs]
+    ys = sorted(xs)
+    out: List[Optional[float]] = []
+    for q in qs:
+        h = (n - 1) * min(max(q, 0.0), 1.0)
+        i = int(math.floor(h)); frac = h - i
+        out.append(ys[i] if (frac == 0 or i + 1 >= n) else _interp(ys[i], ys[i + 1], frac))
+    return out
+
+def percentile_key(p: float) -> str:
+    # Имя ключа для перцентиля: 10 -> "p10", 97.5 -> "p97.5"
+    return f"p{p:g}"
+
+class TDigest:
+    """Потоковый объединяемый скетч квантилей (t-digest, вариант со слиянием).
+
+    Предел веса центроида ~ q(1-q) дробит хвосты сильнее середины, поэтому
+    число центроидов растёт как O(compression·log n): при compression=100
+    около 270 на 10³ значений и около 730 на 10⁶ (плюс буфер до
+    5·compression значений). Ошибка квантиля мала у хвостов и порядка
+    1/compression в середине. Минимум и максимум точные.
+    """
+    method = "tdigest"
+
+    def __init__(self, compression: float=100.0):
+        self.compression = float(compression)
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.n = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buf: List[float] = []
+        self._wbuf: List[Any] = []  # Взвешенные центроиды, ждущие сжатия (из add с весом и merge)
+        self._buf_cap = max(32, int(5 * self.compression))
+
+    def add(self, x: float, w: float=1.0) -> None:
+        if w != 1.0:
+            self._wbuf.append((x, w))
+        else:
+            self._buf.append(x)
+        if len(self._buf) + len(self._wbuf) >= self._buf_cap:
+            self._compress()
+
+    def extend(self, xs: Iterable[float]) -> "TDigest":
+        for x in xs:
+            self.add(x)
+        return self
+
+    def merge(self, o: "TDigest") -> None:
+        # Центроиды другого скетча буферизуются: при слиянии многих скетчей сжатие идёт пачками
+        o._compress()
+        self._wbuf.extend(zip(o.means, o.weights))
+        if o.means:
+            self.min = min(self.min, o.min); self.max = max(self.max, o.max)
+        if len(self._buf) + len(self._wbuf) >= self._buf_cap:
+            self._compress()
+
+    def _compress(self, extra: Optional[List[Any]]=None) -> None:
+        if not (self._buf or self._wbuf or extra):
+            return  # Центроиды уже сжаты
+        items = list(zip(self.means, self.weights))
+        if self._buf:
+            items.extend((x, 1.0) for x in self._buf)
+            self._buf = []
+        if self._wbuf:
+            items.extend(self._wbuf)
+            self._wbuf = []
+        if extra:
+            items.extend(extra)
+        if not items:
+            return
+        items.sort()
+        total = math.fsum(w for _, w in items)
+        k = 4.0 * total / self.compression
+        means: List[float] = []; weights: List[float] = []
+        cm, cw = items[0]
+        seen = 0.0  # Вес центроидов, уже закрытых слева
+        for m, w in items[1:]:
+            nw = cw + w
+            q = (seen + nw / 2.0) / total
+            if nw <= 1.0 or nw <= k * q * (1.0 - q):
+                cm += (m - cm) * w / nw
+                cw = nw
+            else:
+                means.append(cm); weights.append(cw)
+                seen += cw
+                cm, cw = m, w
+        means.append(cm); weights.append(cw)
+        self.means, self.weights = means, weights
+        self.n = total
+        self.min = min(self.min, items[0][0])
+        self.max = max(self.max, items[-1][0])
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._compress()
+        if not self.means: return None
+        q = min(max(q, 0.0), 1.0)
+        if len(self.means) == 1 or q == 0.0:
+            return self.min if q == 0.0 else self.means[0]
+        if q == 1.0:
+            return self.max
+        target = q * self.n
+        # Центр i-го центроида на оси накопленного веса; края — точные min/max
+        cum = 0.0
+        prev_pos = 0.0; prev_val = self.min
+        for m, w in zip(self.means, self.weights):
+            pos = cum + w / 2.0
+            if target < pos:
+                span = pos - prev_pos
+                return prev_val if span <= 0 else prev_val + (m - prev_val) * (target - prev_pos) / span
+            prev_pos, prev_val = pos, m
+            cum += w
+        span = self.n - prev_pos
+        return prev_val if span <= 0 else prev_val + (self.max - prev_val) * (target - prev_pos) / span
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[float]]:
+        return [self.quantile(q) for q in qs]
+
+    def median(self) -> Optional[float]:
+        return self.quantile(0.5)
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {"compression": self.compression, "n": self.n, "min": self.min if self.means else None,
+                "max": self.max if self.means else None, "means": self.means, "weights": self.weights}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "TDigest":
+        t = cls(d.get("compression", 100.0))
+        t.means = [float(x) for x in d.get("means", [])]
+        t.weights = [float(x) for x in d.get("weights", [])]
+        t.n = float(sum(t.weights))
+        if t.means:
+            t.min = float(d["min"]) if d.get("min") is not None else t.means[0]
+            t.max = float(d["max"]) if d.get("max") is not None else t.means[-1]
+        return t
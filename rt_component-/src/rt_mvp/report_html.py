@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple, TYPE_CHECKING
-import html
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple, TYPE_CHECKING
+import html, io, json
 from . import stats
 
 if TYPE_CHECKING:
     from .analyzer import TrialOutcome
+    from .config import ReportCfg
+
+MAX_POINTS = 2000  # Порог прореживания точек по умолчанию (см. ReportCfg.max_points)
+
+COLORS = {"correct":"#2e7d32","correct_inhibition":"#2e7d32","wrong":"#c62828","commission":"#ad1457","omission":"#616161","timeout":"#6d4c41","anticipation":"#1565c0","lapse":"#ef6c00","unknown":"#000"}
 
 # Форматирование числа или строки с обработкой None
 def _fmt(x: Any, nd: int=3) -> str:
@@ -34,78 +39,210 @@ def _scale(val: float, vmin: float, vmax: float, a: float, b: float) -> float:
     t=(val-vmin)/(vmax-vmin)
     return a+t*(b-a)
 
+# Индексы точек, оставляемых LTTB (Largest-Triangle-Three-Buckets): форма ряда сохраняется при n_out точках
+def lttb(xs: Sequence[float], ys: Sequence[float], n_out: int) -> List[int]:
+    n=len(xs)
+    if n_out>=n or n_out<3: return list(range(n))
+    every=(n-2)/(n_out-2)
+    out=[0]; a=0
+    for i in range(n_out-2):
+        s=int(i*every)+1; e=int((i+1)*every)+1  # Текущая корзина [s, e)
+        ns=e; ne=min(int((i+2)*every)+1, n)  # Следующая корзина — её среднее служит третьей вершиной
+        if ne<=ns: ne=min(ns+1, n)
+        cnt=ne-ns
+        ax=sum(xs[ns:ne])/cnt; ay=sum(ys[ns:ne])/cnt
+        px,py=xs[a],ys[a]
+        best=s; best_area=-1.0
+        for j in range(s, e):
+            area=abs((px-ax)*(ys[j]-py)-(px-xs[j])*(ay-py))
+            if area>best_area: best_area=area; best=j
+        out.append(best); a=best
+    out.append(n-1)
+    return out
+
+# Прореживание точек рассеяния: в каждой корзине по X для каждого класса остаются точки с минимальным и максимальным Y
+def minmax_bins(pts: Sequence[Tuple[float,float,str]], max_points: int) -> List[Tuple[float,float,str]]:
+    if len(pts)<=max_points: return list(pts)
+    classes={p[2] for p in pts}
+    nb=max(1, max_points//(2*len(classes)))
+    xmin=pts[0][0]; xmax=pts[0][0]
+    for p in pts:
+        if p[0]<xmin: xmin=p[0]
+        if p[0]>xmax: xmax=p[0]
+    span=(xmax-xmin) or 1.0
+    keep: Dict[Tuple[int,str],List[Any]]={}
+    for p in pts:
+        b=min(nb-1, int((p[0]-xmin)/span*nb))
+        k=(b,p[2]); cur=keep.get(k)
+        if cur is None: keep[k]=[p,p]
+        else:
+            if p[1]<cur[0][1]: cur[0]=p
+            if p[1]>cur[1][1]: cur[1]=p
+    out={q for lo_hi in keep.values() for q in lo_hi}
+    return sorted(out, key=lambda q: q[0])
+
 # Генерация SVG-диаграммы рассеяния (scatter plot)
-def svg_scatter(trials: List[TrialOutcome], w: int=900, h: int=320) -> str:
-    pts=[]
-    for i,t in enumerate(trials, start=1):
-        if t.rt_ms is None: continue  # Игнорировать отсутствующие значения RT
-        pts.append((i,float(t.rt_ms),t.classification))
+def svg_scatter(trials: Sequence[TrialOutcome], w: int=900, h: int=320, max_points: int=MAX_POINTS,
+                pts: Optional[Sequence[Tuple[float,float,str]]]=None) -> str:
+    if pts is None:
+        pts=[(float(i),float(t.rt_ms),t.classification) for i,t in enumerate(trials, start=1) if t.rt_ms is not None]
     if not pts: return "<p>Нет RT-точек.</p>"  # Если нет данных, вернуть сообщение
-    xs=[p[0] for p in pts]; ys=[p[1] for p in pts]
-    xmin,xmax=min(xs),max(xs)
-    ymin,ymax=min(ys),max(ys)
+    n_all=len(pts)
+    xmin,xmax=pts[0][0],pts[-1][0]  # Номера триалов идут по возрастанию
+    ymin=min(p[1] for p in pts); ymax=max(p[1] for p in pts)
+    pts=minmax_bins(pts, max_points)
     ymax=ymax*1.05+1.0; ymin=max(0.0,ymin*0.95-1.0)  # Расширяем диапазоны
     x0,y0,x1,y1,ax=_axes(w,h)
-    color={"correct":"#2e7d32","correct_inhibition":"#2e7d32","wrong":"#c62828","commission":"#ad1457","omission":"#616161","timeout":"#6d4c41","anticipation":"#1565c0","unknown":"#000"}
     svg=[_svg_header(w,h),ax]
     for xi,yi,cls in pts:
-        cx=_scale(float(xi),float(xmin),float(xmax),x0,x1)  # Масштабирование X
-        cy=_scale(float(yi),float(ymin),float(ymax),y1,y0)  # Масштабирование Y
-        svg.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="3.3" fill="{color.get(cls,"#000")}" />')  # Добавление точки
+        cx=_scale(xi,xmin,xmax,x0,x1)  # Масштабирование X
+        cy=_scale(yi,ymin,ymax,y1,y0)  # Масштабирование Y
+        svg.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="3.3" fill="{COLORS.get(cls,"#000")}" />')  # Добавление точки
+    if len(pts)<n_all: svg.append(_thinned_note(w, len(pts), n_all))
     svg.append(_svg_footer())
     return "\n".join(svg)
 
-# Генерация SVG-гистограммы распределения значений
-def svg_hist(values: List[float], bins: int=12, w: int=900, h: int=260) -> str:
-    if not values: return "<p>Нет валидных RT.</p>"  # Если нет данных, вернуть сообщение
-    vmin,vmax=min(values),max(values)
+def _thinned_note(w: int, n_shown: int, n_all: int) -> str:
+    return f'<text x="{w-10}" y="14" font-size="11" text-anchor="end" fill="#666">{n_shown} из {n_all} точек</text>'
+
+# Генерация SVG-гистограммы распределения значений; с vrange диапазон известен заранее и данные проходятся один раз
+def svg_hist(values: Iterable[float], bins: int=12, w: int=900, h: int=260, vrange: Optional[Tuple[float,float]]=None) -> str:
+    if vrange is None:
+        values=list(values)
+        if not values: return "<p>Нет валидных RT.</p>"  # Если нет данных, вернуть сообщение
+        vrange=(min(values),max(values))
+    vmin,vmax=vrange
     if vmax<=vmin: vmax=vmin+1.0  # Избежать деления на ноль
     counts=[0]*bins
+    k=bins/(vmax-vmin)
     for v in values:
-        t=(v-vmin)/(vmax-vmin)
-        idx=int(t*bins)  # Определяем корзину (bin)
-        if idx==bins: idx=bins-1
+        idx=int((v-vmin)*k)  # Определяем корзину (bin)
+        if idx>=bins: idx=bins-1
+        elif idx<0: idx=0
         counts[idx]+=1
-    maxc=max(counts) if counts else 1
+    maxc=max(counts)
+    if maxc==0: return "<p>Нет валидных RT.</p>"
     x0,y0,x1,y1,ax=_axes(w,h)
     svg=[_svg_header(w,h),ax]
     bar_w=(x1-x0)/bins
     for i,c in enumerate(counts):
-        bh=0 if maxc==0 else (c/maxc)*(y1-y0)  # Высота столбца
+        bh=(c/maxc)*(y1-y0)  # Высота столбца
         x=x0+i*bar_w; y=y1-bh
         svg.append(f'<rect x="{x:.1f}" y="{y:.1f}" width="{bar_w-2:.1f}" height="{bh:.1f}" fill="#78909c" />')  # Рисуем прямоугольник
     svg.append(_svg_footer())
     return "\n".join(svg)
 
 # Генерация SVG тренда с использованием линейной регрессии
-def svg_trend(trials: List[TrialOutcome], w: int=900, h: int=260) -> str:
-    xs=[]; ys=[]
-    for i,t in enumerate(trials, start=1):
-        if t.is_valid_rt and t.rt_ms is not None:
-            xs.append(float(i)); ys.append(float(t.rt_ms))
+def svg_trend(trials: Sequence[TrialOutcome], w: int=900, h: int=260, max_points: int=MAX_POINTS,
+              xs: Optional[List[float]]=None, ys: Optional[List[float]]=None) -> str:
+    if xs is None or ys is None:
+        xs=[]; ys=[]
+        for i,t in enumerate(trials, start=1):
+            if t.is_valid_rt and t.rt_ms is not None:
+                xs.append(float(i)); ys.append(float(t.rt_ms))
     if len(xs)<2: return "<p>Недостаточно валидных RT.</p>"  # Если данных недостаточно
     xmin,xmax=min(xs),max(xs); ymin,ymax=min(ys),max(ys)
     ymax=ymax*1.05+1.0; ymin=max(0.0,ymin*0.95-1.0)
-    slope=stats.linear_regression_slope(xs,ys) or 0.0  # Вычисление наклон��
+    slope=stats.linear_regression_slope(xs,ys) or 0.0  # Вычисление наклона (по всем точкам, до прореживания)
     xm=stats.mean(xs) or 0.0; ym=stats.mean(ys) or 0.0  # Средние значения
     a=ym-slope*xm  # Вычисление интерсепта
     x0,y0,x1,y1,ax=_axes(w,h)
     svg=[_svg_header(w,h),ax]
-    for xi,yi in zip(xs,ys):
-        cx=_scale(xi,xmin,xmax,x0,x1); cy=_scale(yi,ymin,ymax,y1,y0)
+    keep=lttb(xs, ys, max_points)
+    for j in keep:
+        cx=_scale(xs[j],xmin,xmax,x0,x1); cy=_scale(ys[j],ymin,ymax,y1,y0)
         svg.append(f'<circle cx="{cx:.1f}" cy="{cy:.1f}" r="3.2" fill="#2e7d32" />')  # Точки на графике
     xL,xR=xmin,xmax; yL=a+slope*xL; yR=a+slope*xR  # Прямая линия тренда
     lx1=_scale(xL,xmin,xmax,x0,x1); lx2=_scale(xR,xmin,xmax,x0,x1)
     ly1=_scale(yL,ymin,ymax,y1,y0); ly2=_scale(yR,ymin,ymax,y1,y0)
     svg.append(f'<line x1="{lx1:.1f}" y1="{ly1:.1f}" x2="{lx2:.1f}" y2="{ly2:.1f}" stroke="#000" stroke-width="2" />')  # Линия регрессии
+    if len(keep)<len(xs): svg.append(_thinned_note(w, len(keep), len(xs)))
     svg.append(_svg_footer())
     return "\n".join(svg)
 
-# Построение HTML-отчета на основе данных
-def build_report_html(meta: Dict[str, Any], trials: List[TrialOutcome], metrics: Dict[str, Any], flags: Dict[str, Any]) -> str:
-    task=html.escape(str(meta.get("task","")))  # Получение информации о задаче
-    rt_valid=[float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None]
-    scatter=svg_scatter(trials); hist=svg_hist(rt_valid); trend=svg_trend(trials)  # Генерация SVG графиков
+ROLLING_COLORS = {"mean_rt_ms":"#2e7d32","lapse_rate":"#ef6c00","accuracy":"#1565c0","anticipation_rate":"#ad1457"}
+
+# SVG-линии скользящих метрик по окнам (ряд metrics["rolling"]["series"]); каждая линия прореживается LTTB до max_points
+def svg_rolling(series: Dict[str, List[Any]], fields: Sequence[str], w: int=900, h: int=260, max_points: int=MAX_POINTS,
+                vrange: Optional[Tuple[float,float]]=None) -> str:
+    xs_all=series.get("t_s") if series.get("mode")=="time" else series.get("trial_id")  # Ось X: секунды от начала или номер триала
+    lines=[]
+    for f in fields:
+        xs=[]; ys=[]
+        for x,y in zip(xs_all or [], series.get(f) or []):
+            if x is not None and y is not None: xs.append(float(x)); ys.append(float(y))
+        if xs: lines.append((f,xs,ys))
+    if not lines or sum(len(l[1]) for l in lines)<2: return "<p>Недостаточно окон.</p>"
+    xmin=min(l[1][0] for l in lines); xmax=max(l[1][-1] for l in lines)
+    if vrange is None:
+        ymin=min(min(l[2]) for l in lines); ymax=max(max(l[2]) for l in lines)
+        ymax=ymax*1.05+1.0; ymin=max(0.0,ymin*0.95-1.0)
+    else:
+        ymin,ymax=vrange
+    x0,y0,x1,y1,ax=_axes(w,h)
+    svg=[_svg_header(w,h),ax]
+    n_all=n_shown=0
+    for k,(f,xs,ys) in enumerate(lines):
+        keep=lttb(xs, ys, max_points)
+        n_all+=len(xs); n_shown+=len(keep)
+        pts=" ".join(f"{_scale(xs[j],xmin,xmax,x0,x1):.1f},{_scale(ys[j],ymin,ymax,y1,y0):.1f}" for j in keep)
+        color=ROLLING_COLORS.get(f,"#000")
+        svg.append(f'<polyline points="{pts}" fill="none" stroke="{color}" stroke-width="1.6" />')  # Линия метрики
+        svg.append(f'<text x="{x0+8}" y="{y0+14*(k+1)}" font-size="11" fill="{color}">{html.escape(f)}</text>')  # Легенда
+    if n_shown<n_all: svg.append(_thinned_note(w, n_shown, n_all))
+    svg.append(_svg_footer())
+    return "\n".join(svg)
+
+def _rolling_html(rolling: Dict[str, Any], max_points: int) -> str:
+    # Скользящие метрики: RT по окнам и доли (lapses, точность, антиципации) на шкале [0; 1]
+    series={**rolling.get("series",{}),"mode":rolling.get("mode")}
+    summ=rolling.get("summary",{})
+    unit="триалов" if rolling.get("mode")=="trials" else "с"
+    note=(f"<div class='small'>окно {_fmt(rolling.get('window'),1)} {unit}, шаг {rolling.get('step')}, окон {summ.get('windows')}; "
+          f"mean RT первого/последнего окна {_fmt(summ.get('first_mean_rt_ms'),1)}/{_fmt(summ.get('last_mean_rt_ms'),1)} мс, "
+          f"max rt_cv {_fmt(summ.get('max_rt_cv'),3)}, max lapse_rate {_fmt(summ.get('max_lapse_rate'),3)}</div>")
+    return (note+svg_rolling(series, ("mean_rt_ms",), max_points=max_points)+"\n"
+            +svg_rolling(series, ("lapse_rate","accuracy","anticipation_rate"), max_points=max_points, vrange=(0.0,1.0)))
+
+# Рисование графиков в браузере по данным, встроенным в отчёт один раз (режим "canvas")
+_CANVAS_JS = """
+(function(){
+const D=JSON.parse(document.getElementById('rt-data').textContent);
+function ctx(id){const c=document.getElementById(id);const g=c.getContext('2d');g.strokeStyle='#000';
+ g.beginPath();g.moveTo(40,c.height-40);g.lineTo(c.width-40,c.height-40);g.moveTo(40,40);g.lineTo(40,c.height-40);g.stroke();return [c,g];}
+function sc(v,a,b,p,q){return b<=a?(p+q)/2:p+(v-a)/(b-a)*(q-p);}
+function mn(a){let m=Infinity;for(const v of a)if(v<m)m=v;return m;}
+function mx(a){let m=-Infinity;for(const v of a)if(v>m)m=v;return m;}
+const n=D.x.length;
+if(n){let lo=mn(D.rt),hi=mx(D.rt);hi=hi*1.05+1;lo=Math.max(0,lo*0.95-1);
+ const [c,g]=ctx('rt-scatter');const x0=D.x[0],x1=D.x[n-1];
+ for(let i=0;i<n;i++){g.fillStyle=D.colors[D.classes[D.c[i]]]||'#000';g.beginPath();
+  g.arc(sc(D.x[i],x0,x1,40,c.width-40),sc(D.rt[i],lo,hi,c.height-40,40),3.3,0,6.3);g.fill();}}
+const vx=[],vy=[];for(let i=0;i<n;i++){if(D.v[i]){vx.push(D.x[i]);vy.push(D.rt[i]);}}
+if(vy.length){const [c,g]=ctx('rt-hist');let lo=mn(vy),hi=mx(vy);if(hi<=lo)hi=lo+1;
+ const B=D.bins,cnt=new Array(B).fill(0);for(const v of vy){cnt[Math.min(B-1,Math.floor((v-lo)/(hi-lo)*B))]++;}
+ const m=mx(cnt),bw=(c.width-80)/B;g.fillStyle='#78909c';
+ for(let i=0;i<B;i++){const bh=cnt[i]/m*(c.height-80);g.fillRect(40+i*bw,c.height-40-bh,bw-2,bh);}}
+if(vy.length>=2){const [c,g]=ctx('rt-trend');const k=vy.length;let lo=mn(vy),hi=mx(vy);hi=hi*1.05+1;lo=Math.max(0,lo*0.95-1);
+ const a0=vx[0],a1=vx[k-1];g.fillStyle='#2e7d32';
+ for(let i=0;i<k;i++){g.beginPath();g.arc(sc(vx[i],a0,a1,40,c.width-40),sc(vy[i],lo,hi,c.height-40,40),3.2,0,6.3);g.fill();}
+ const L=D.trend;g.lineWidth=2;g.beginPath();g.moveTo(40,sc(L[0]+L[1]*a0,lo,hi,c.height-40,40));
+ g.lineTo(c.width-40,sc(L[0]+L[1]*a1,lo,hi,c.height-40,40));g.stroke();}
+})();
+"""
+
+def _canvas_data(pts: Sequence[Tuple[float,float,str]], valid: Sequence[bool], xs: List[float], ys: List[float], bins: int) -> str:
+    # Данные триалов одним компактным JSON: номера, RT (0.1 мс), коды классов, признак валидности
+    classes: Dict[str,int]={}
+    codes=[classes.setdefault(p[2], len(classes)) for p in pts]
+    slope=stats.linear_regression_slope(xs,ys) or 0.0 if len(xs)>=2 else 0.0
+    a=(stats.mean(ys) or 0.0)-slope*(stats.mean(xs) or 0.0) if xs else 0.0
+    data={"x":[int(p[0]) for p in pts],"rt":[round(p[1],1) for p in pts],"c":codes,"v":[1 if v else 0 for v in valid],
+          "classes":list(classes),"colors":COLORS,"bins":bins,"trend":[a,slope]}
+    # "</" внутри <script> недопустим — экранируем
+    return json.dumps(data, ensure_ascii=False, separators=(",",":")).replace("</","<\\/")
+
+def _metrics_html(meta: Dict[str, Any], metrics: Dict[str, Any]) -> str:
     rt=metrics.get("rt",{}); rates=metrics.get("rates",{})
     rows=[("n_trials",meta.get("n_trials")),("n_valid_rt",rt.get("n_valid")),("mean_rt_ms",_fmt(rt.get("mean_rt_ms"),2)),
           ("median_rt_ms",_fmt(rt.get("median_rt_ms"),2)),("rt_std_ms",_fmt(rt.get("rt_std_ms"),2)),("rt_cv",_fmt(rt.get("rt_cv"),3)),
@@ -113,25 +250,97 @@ def build_report_html(meta: Dict[str, Any], trials: List[TrialOutcome], metrics:
           ("omission_rate",_fmt(rates.get("omission_rate"),3)),("commission_error_rate",_fmt(rates.get("commission_error_rate"),3)),
           ("timeout_rate",_fmt(rates.get("timeout_rate"),3)),("anticipation_rate",_fmt(rates.get("anticipation_rate"),3)),
           ("d_prime",_fmt(rates.get("d_prime"),3))]
-    metrics_html="<table border='1' cellspacing='0' cellpadding='6'>" + "".join(
+    pct=[(f"rt_{k}_ms",_fmt(v,2)) for k,v in (rt.get("percentiles_ms") or {}).items()]  # Перцентили RT
+    rows[4:4]=pct
+    return "<table border='1' cellspacing='0' cellpadding='6'>" + "".join(
         f"<tr><td>{html.escape(k)}</td><td>{html.escape(str(v))}</td></tr>" for k,v in rows
     ) + "</table>"  # Таблица метрик
-    flags_html="<ul>"+"\n".join(
+
+def _flags_html(flags: Dict[str, Any]) -> str:
+    return "<ul>"+"\n".join(
         f"<li><b>{html.escape(name)}</b>: {html.escape(str(info.get('value')))}"
         + (f"<br><small>{html.escape('; '.join(info.get('reasons',[])))}</small>" if info.get("reasons") else "")
         + "</li>"
         for name,info in flags.items()
     )+"</ul>"  # Список флагов
-    return f"""<!doctype html>
+
+def _channels_html(channels: Dict[str, Any]) -> str:
+    # Агрегаты каналов других инструментов в окнах триалов: среднее по триалам и по исходам
+    classes=sorted({k for ch in channels.values() for k in ch.get("by_classification",{})})
+    head="".join(f"<th>{html.escape(h)}</th>" for h in ["channel","column","samples","trials","mean"]+classes)
+    rows=[]
+    for name,ch in channels.items():
+        by=ch.get("by_classification",{})
+        cells=[name,ch.get("column",""),ch.get("n_samples"),ch.get("trials_with_data"),_fmt(ch.get("mean"),3)]+[_fmt(by.get(k),3) for k in classes]
+        rows.append("<tr>"+"".join(f"<td>{html.escape(str(c))}</td>" for c in cells)+"</tr>")
+    return f"<table border='1' cellspacing='0' cellpadding='6'><tr>{head}</tr>"+"".join(rows)+"</table>"
+
+def _bootstrap_html(boot: Dict[str, Any]) -> str:
+    # Бутстреп-интервалы метрик и устойчивость решений флагов относительно порогов
+    def ci(pair: Any, nd: int) -> str:
+        return "—" if not pair or pair[0] is None else f"[{_fmt(pair[0],nd)}; {_fmt(pair[1],nd)}]"
+    head="".join(f"<th>{h}</th>" for h in ("statistic","estimate","se","percentile","BCa"))
+    rows=[]
+    for k,v in boot.get("intervals",{}).items():
+        nd=2 if k.endswith("_ms") or "_ms." in k or "per_trial" in k else 3
+        cells=[k,_fmt(v.get("estimate"),nd),_fmt(v.get("se"),nd),ci(v.get("percentile"),nd),ci(v.get("bca"),nd)]
+        rows.append("<tr>"+"".join(f"<td>{html.escape(str(c))}</td>" for c in cells)+"</tr>")
+    dec="".join(f"<li><b>{html.escape(d['flag'])}</b>: {html.escape(d['statistic'])} {html.escape(d['op'])} {_fmt(d['threshold'],3)} — "
+                f"{html.escape(d['verdict'])} (CI {html.escape(ci(d['ci'],3))})</li>" for d in boot.get("decisions",[]))
+    note=f"<div class='small'>{boot.get('n_resamples')} ресэмплов, уровень {boot.get('level')}, seed {boot.get('seed')}, {html.escape(str(boot.get('backend')))}</div>"
+    return f"{note}<table border='1' cellspacing='0' cellpadding='6'><tr>{head}</tr>"+"".join(rows)+"</table>"+(f"<ul>{dec}</ul>" if dec else "")
+
+# Запись HTML-отчёта по частям в открытый файл: размер SVG ограничен max_points, в режиме "canvas" данные встраиваются один раз
+def write_report_html(fh: TextIO, meta: Dict[str, Any], trials: Sequence[TrialOutcome], metrics: Dict[str, Any], flags: Dict[str, Any],
+                      cfg: Optional[ReportCfg]=None) -> None:
+    mode=cfg.mode if cfg is not None else "svg"
+    max_points=cfg.max_points if cfg is not None else MAX_POINTS
+    if mode not in ("svg","canvas"): raise ValueError(f"unknown report mode: {mode}")
+    task=html.escape(str(meta.get("task","")))  # Получение информации о задаче
+    # Один проход по триалам: точки рассеяния, валидные RT и их диапазон
+    pts: List[Tuple[float,float,str]]=[]; valid: List[bool]=[]; xs: List[float]=[]; ys: List[float]=[]
+    vmin=float("inf"); vmax=float("-inf")
+    for i,t in enumerate(trials, start=1):
+        if t.rt_ms is None: continue
+        r=float(t.rt_ms)
+        pts.append((float(i),r,t.classification))
+        ok=bool(t.is_valid_rt); valid.append(ok)
+        if ok:
+            xs.append(float(i)); ys.append(r)
+            if r<vmin: vmin=r
+            if r>vmax: vmax=r
+    w=fh.write
+    w(f"""<!doctype html>
 <html lang="ru"><head><meta charset="utf-8"/>
 <title>RT report — {task}</title>
-<style>body{{font-family:Arial,sans-serif;margin:20px}} svg{{border:1px solid #eee;background:#fff}} .small{{color:#444}}</style>
+<style>body{{font-family:Arial,sans-serif;margin:20px}} svg,canvas{{border:1px solid #eee;background:#fff}} .small{{color:#444}}</style>
 </head><body>
 <h1>RT report — {task}</h1>
-<div class="small">log: {html.escape(str(meta.get("log_path","")))}</div>
-<h2>Метрики</h2>{metrics_html}
-<h2>Флаги состояния</h2>{flags_html}
-<h2>RT по триалам</h2>{scatter}
-<h2>Гистограмма валидных RT</h2>{hist}
-<h2>Тренд RT</h2>{trend}
-</body></html>"""
+<div class="small">log: {html.escape(lp if isinstance(lp := meta.get("log_path",""), str) else ", ".join(map(str, lp)))}</div>
+""")
+    w(f"<h2>Метрики</h2>{_metrics_html(meta, metrics)}\n")
+    w(f"<h2>Флаги состояния</h2>{_flags_html(flags)}\n")
+    if metrics.get("bootstrap"):
+        w(f"<h2>Доверительные интервалы (бутстреп)</h2>{_bootstrap_html(metrics['bootstrap'])}\n")
+    if metrics.get("rolling"):
+        w(f"<h2>Скользящие метрики</h2>{_rolling_html(metrics['rolling'], max_points)}\n")
+    if meta.get("channels"):
+        w(f"<h2>Каналы инструментов</h2>{_channels_html(meta['channels'])}\n")
+    if mode=="canvas":
+        w('<h2>RT по триалам</h2><canvas id="rt-scatter" width="900" height="320"></canvas>\n')
+        w('<h2>Гистограмма валидных RT</h2><canvas id="rt-hist" width="900" height="260"></canvas>\n')
+        w('<h2>Тренд RT</h2><canvas id="rt-trend" width="900" height="260"></canvas>\n')
+        w('<script type="application/json" id="rt-data">'); w(_canvas_data(pts, valid, xs, ys, 12)); w("</script>\n")
+        w(f"<script>{_CANVAS_JS}</script>\n")
+    else:
+        w(f"<h2>RT по триалам</h2>{svg_scatter(trials, max_points=max_points, pts=pts)}\n")
+        w(f"<h2>Гистограмма валидных RT</h2>{svg_hist(ys, vrange=(vmin,vmax)) if ys else svg_hist([])}\n")
+        w(f"<h2>Тренд RT</h2>{svg_trend(trials, max_points=max_points, xs=xs, ys=ys)}\n")
+    w("</body></html>")
+
+# Построение HTML-отчета на основе данных (строкой; для записи в файл — write_report_html)
+def build_report_html(meta: Dict[str, Any], trials: Sequence[TrialOutcome], metrics: Dict[str, Any], flags: Dict[str, Any],
+                      cfg: Optional[ReportCfg]=None) -> str:
+    buf=io.StringIO()
+    write_report_html(buf, meta, trials, metrics, flags, cfg)
+    return buf.getvalue()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+import math
+
+from .config import ProjectConfig
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+ROLLING_MODES = ("trials", "time", "off")
+SERIES_FIELDS = ("trial_id", "t_s", "n_trials", "n_valid", "mean_rt_ms", "rt_cv", "lapse_rate", "accuracy", "anticipation_rate")
+
+class RollingWindow:
+    """Скользящее окно по триалам: последние ``size`` триалов или триалы с t0 в (t - size, t] секунд.
+
+    Суммы окна (триалы, верные, антиципации, валидные RT, их сумма, сумма
+    квадратов и lapses) обновляются за O(1) при входе триала в окно и при
+    выходе из него, поэтому все окна сессии считаются за линейное время.
+    RT центрируются первым валидным RT, чтобы сумма квадратов не теряла
+    точность. Точка ряда — каждое ``step``-е полное окно; ``summary()``
+    (первое/последнее окно, экстремумы) тоже ведётся инкрементально.
+    """
+
+    def __init__(self, mode: str="trials", size: float=20.0, lapse_ms: float=500.0, step: int=1, keep_series: bool=True):
+        if mode not in ("trials", "time"):
+            raise ValueError(f"unknown rolling mode: {mode!r} (expected trials or time)")
+        if size <= 0 or step < 1:
+            raise ValueError(f"rolling window size must be positive and step >= 1, got size={size}, step={step}")
+        self.mode = mode
+        self.size = float(size)
+        self.lapse_ms = float(lapse_ms)
+        self.step = int(step)
+        self.keep_series = keep_series
+        self._win: Deque[Tuple[float, int, int, int, float, bool]] = deque()  # (t0, верный, антиципация, валидный, rt-shift, lapse)
+        self._shift: Optional[float] = None
+        self.n = 0; self.correct = 0; self.antic = 0; self.nv = 0; self.s1 = 0.0; self.s2 = 0.0; self.lapses = 0
+        self._t_first: Optional[float] = None
+        self._full = 0  # Полных окон (для шага)
+        self._last: Optional[TrialOutcome] = None
+        self.series: Dict[str, List[Any]] = {f: [] for f in SERIES_FIELDS}
+        self._summary: Dict[str, Any] = {"windows": 0}
+
+    def push(self, t: TrialOutcome) -> Optional[Dict[str, Any]]:
+        # Триал в окно; возвращает точку ряда, если окно полное и попало на шаг
+        t0 = t.t0
+        if self.mode == "time" and (t0 is None or math.isnan(t0)):
+            return None
+        t0 = float(t0) if t0 is not None else math.nan
+        if self._t_first is None or (self.mode == "time" and t0 < self._t_first):
+            self._t_first = t0
+        rt = t.rt_ms
+        valid = bool(t.is_valid_rt and rt is not None)
+        if valid and self._shift is None:
+            self._shift = float(rt)
+        r = float(rt) - self._shift if valid else 0.0
+        lapse = valid and float(rt) > self.lapse_ms
+        item = (t0, int(bool(t.is_correct)), int(bool(t.is_anticipation)), int(valid), r, lapse)
+        self._win.append(item); self._apply(item, 1)
+        if self.mode == "trials":
+            while len(self._win) > self.size:
+                self._apply(self._win.popleft(), -1)
+            full = len(self._win) >= self.size
+        else:
+            lo = t0 - self.size
+            while self._win and self._win[0][0] <= lo:
+                self._apply(self._win.popleft(), -1)
+            full = t0 - self._t_first >= self.size
+        self._last = t
+        if not full:
+            return None
+        self._full += 1
+        if (self._full - 1) % self.step:
+            return None
+        return self._emit(t)
+
+    def finish(self) -> None:
+        # Сессия короче окна: одна точка по всем триалам (неполное окно)
+        if self._summary["windows"] == 0 and self._last is not None and self.n:
+            self._emit(self._last)
+
+    def _apply(self, item: Tuple[float, int, int, int, float, bool], sign: int) -> None:
+        _, c, a, v, r, lapse = item
+        self.n += sign; self.correct += sign * c; self.antic += sign * a
+        if v:
+            self.nv += sign; self.s1 += sign * r; self.s2 += sign * r * r
+            if lapse: self.lapses += sign
+
+    def point(self) -> Dict[str, Any]:
+        # Метрики текущего окна (как compute_metrics по триалам окна)
+        nv = self.nv
+        mean = (self._shift or 0.0) + self.s1 / nv if nv else None
+        std = None
+        if nv >= 2:
+            std = math.sqrt(max(0.0, (self.s2 - self.s1 * self.s1 / nv) / (nv - 1)))
+        return {"n_trials": self.n, "n_valid": nv, "mean_rt_ms": mean,
+                "rt_cv": None if (mean is None or std is None or mean == 0) else std / mean,
+                "lapse_rate": self.lapses / nv if nv else None,
+                "accuracy": self.correct / self.n if self.n else None,
+                "anticipation_rate": self.antic / self.n if self.n else None}
+
+    def _emit(self, t: TrialOutcome) -> Dict[str, Any]:
+        p = self.point()
+        p["trial_id"] = t.trial_id
+        t0 = t.t0; tf = self._t_first
+        p["t_s"] = None if (t0 is None or tf is None or math.isnan(t0) or math.isnan(tf)) else float(t0) - tf
+        if self.keep_series:
+            for f in SERIES_FIELDS:
+                self.series[f].append(p[f])
+        s = self._summary
+        s["windows"] += 1
+        if s["windows"] == 1:
+            s["first_mean_rt_ms"] = p["mean_rt_ms"]
+        s["last_mean_rt_ms"] = p["mean_rt_ms"]
+        first = s.get("first_mean_rt_ms")
+        s["mean_rt_delta_ms"] = (p["mean_rt_ms"] - first) if (first is not None and p["mean_rt_ms"] is not None) else None
+        for key, field, pick in (("max_mean_rt_ms", "mean_rt_ms", max), ("max_rt_cv", "rt_cv", max), ("max_lapse_rate", "lapse_rate", max),
+                                 ("min_accuracy", "accuracy", min), ("max_anticipation_rate", "anticipation_rate", max)):
+            v = p[field]
+            if v is not None:
+                s[key] = v if s.get(key) is None else pick(s[key], v)
+        return p
+
+    def summary(self) -> Dict[str, Any]:
+        keys = ("windows", "first_mean_rt_ms", "last_mean_rt_ms", "mean_rt_delta_ms", "max_mean_rt_ms", "max_rt_cv",
+                "max_lapse_rate", "min_accuracy", "max_anticipation_rate")
+        return {k: self._summary.get(k) for k in keys}
+
+def make_window(cfg: ProjectConfig, keep_series: bool=True) -> Optional[RollingWindow]:
+    an = cfg.analysis
+    if an.rolling_mode == "off":
+        return None
+    if an.rolling_mode not in ROLLING_MODES:
+        raise ValueError(f"unknown rolling mode: {an.rolling_mode!r} (expected {', '.join(ROLLING_MODES)})")
+    return RollingWindow(an.rolling_mode, an.rolling_window, cfg.flags_thresholds.lapse_ms, an.rolling_step, keep_series=keep_series)
+
+def rolling_metrics(trials: Iterable[TrialOutcome], cfg: ProjectConfig) -> Optional[Dict[str, Any]]:
+    """Скользящие метрики сессии для ``metrics["rolling"]``: ряд по окнам (колонками) и его сводка.
+
+    Окно — ``analysis.rolling_mode`` ("trials" — по числу триалов, "time" —
+    по t0 в секундах) шириной ``analysis.rolling_window``; None при "off".
+    """
+    win = make_window(cfg)
+    if win is None:
+        return None
+    for t in trials:
+        win.push(t)
+    win.finish()
+    return {"mode": win.mode, "window": win.size, "step": win.step, "series": win.series, "summary": win.summary()}
+
+def uses_window_thresholds(cfg: ProjectConfig) -> bool:
+    th = cfg.flags_thresholds
+    return any(v is not None for v in (th.fatigue_window_delta_ms, th.attention_window_cv_threshold, th.attention_window_lapse_threshold))
@@ -0,0 +1,396 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import asyncio, json, os, re, time, traceback
+
+from . import __version__
+from .analyzer import analyze_and_report, analyze_runs_and_report
+from .binlog import is_binlog
+from .cache import ResultCache
+from .config import ProjectConfig
+from .quantiles import quantiles
+
+READ_CHUNK = 1 << 20
+_RUN_ID = re.compile(r"^(?!\.{1,2}$)[\w.-]{1,128}$")  # "." и ".." — не имена, а переходы по каталогам
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+            411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity", 431: "Request Header Fields Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+# Параметры HTTP-сервиса анализа
+@dataclass(frozen=True)
+class ServiceCfg:
+    host: str = "127.0.0.1"
+    port: int = 8080
+    data_dir: str = "service_data"  # logs/<run_id>.log, reports/<run_id>/, cache/
+    workers: Optional[int] = None  # Процессы анализа; None — по числу ядер
+    max_pending: int = 64  # Анализов в очереди и в работе; сверх — 503 с Retry-After
+    max_body_bytes: int = 256 << 20
+    config_path: Optional[str] = None
+    cache: bool = True
+    cache_max_bytes: int = 512 << 20
+    header_timeout_s: float = 30.0
+    stats_window: int = 2048  # Последних замеров на маршрут для перцентилей задержки
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]]=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class LatencyStats:
+    """Число вызовов, ошибок и перцентили задержки по последним ``window`` замерам."""
+
+    def __init__(self, window: int=2048):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, dt: float, error: bool=False) -> None:
+        self.count += 1; self.total_s += dt; self.recent.append(dt)
+        if error: self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p90, p99 = quantiles(list(self.recent), (0.5, 0.9, 0.99))
+        ms = lambda v: round(v * 1000.0, 3) if v is not None else None
+        return {"count": self.count, "errors": self.errors, "mean_ms": ms(self.total_s / self.count if self.count else None),
+                "p50_ms": ms(p50), "p90_ms": ms(p90), "p99_ms": ms(p99)}
+
+def _analyze_job(log_path: str, task: Optional[str], config_path: Optional[str], out_root: str,
+                 cache_dir: Optional[str]) -> Dict[str, Any]:
+    # Анализ в рабочем процессе пула; ошибка анализа возвращается как результат, а не исключением
+    t_start = time.time(); t0 = time.perf_counter()
+    cache = ResultCache(cache_dir, auto_evict=False) if cache_dir else None
+    try:
+        if task:
+            res: Dict[str, Any] = {"status": "ok", "summary": analyze_and_report(log_path, task, config_path=config_path,
+                                                                                out_root=out_root, cache=cache)}
+        else:
+            res = {"status": "ok", "summary": {"runs": analyze_runs_and_report(log_path, config_path=config_path,
+                                                                              out_root=out_root, cache=cache)}}
+        if cache is not None:
+            res["cache"] = "hit" if cache.last_hit else "miss"
+    except Exception as e:
+        res = {"status": "error", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc(limit=5)}
+    res["started_unix"] = t_start
+    res["elapsed_s"] = time.perf_counter() - t0
+    return res
+
+def _route_name(method: str, target: str) -> str:
+    # Имя маршрута для статистики: run_id заменяется шаблоном
+    parts = [p for p in urlsplit(target).path.split("/") if p]
+    if len(parts) == 3 and parts[0] == "runs":
+        parts[1] = "{run_id}"
+    return f"{method} /" + "/".join(parts)
+
+class AnalysisService:
+    """Асинхронный HTTP-сервис поверх анализатора (stdlib asyncio, HTTP/1.1 keep-alive).
+
+    Маршруты::
+
+        POST /runs/<run_id>/events           пачка событий (JSON-массив или JSONL) дописывается в лог запуска
+        PUT  /runs/<run_id>/log              лог запуска целиком (JSONL или бинарный), заменяет прежний
+        POST /runs/<run_id>/analyze[?task=]  анализ в пуле процессов -> summary.json (без task — {"runs": [...]})
+        GET  /runs/<run_id>/summary          последний summary.json
+        GET  /runs/<run_id>/report[?run=]    report.html (для режима запусков — ?run=<run_id внутри лога>)
+        GET  /stats, GET /health
+
+    Анализ выполняется в общем ``ProcessPoolExecutor`` (не процесс на
+    запрос). Очередь ограничена ``max_pending``: сверх неё — 503 и
+    ``Retry-After``. Загрузка и анализ одного запуска не пересекаются
+    (блокировка на run_id); неизменённый лог берётся из ResultCache.
+    """
+
+    def __init__(self, cfg: ServiceCfg, executor: Optional[Executor]=None):
+        self.cfg = cfg
+        self.project_cfg = ProjectConfig.load(cfg.config_path)
+        self.logs_dir = os.path.join(cfg.data_dir, "logs")
+        self.reports_dir = os.path.join(cfg.data_dir, "reports")
+        self.cache_dir = os.path.join(cfg.data_dir, "cache") if cfg.cache else None
+        os.makedirs(self.logs_dir, exist_ok=True); os.makedirs(self.reports_dir, exist_ok=True)
+        self.executor = executor
+        self._own_executor = executor is None
+        self.workers = cfg.workers or os.cpu_count() or 1
+        self.pending = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.started = time.time()
+        self.routes: Dict[str, LatencyStats] = {}
+        self.jobs = LatencyStats(cfg.stats_window)  # Время анализа в рабочем процессе
+        self.queue_wait = LatencyStats(cfg.stats_window)  # Ожидание свободного процесса
+        self.rejected = 0
+        self.cache_hits = 0
+        self._done: Deque[float] = deque(maxlen=cfg.stats_window)  # Моменты завершения анализов
+
+    # --- жизненный цикл ---
+
+    async def start(self) -> None:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._server = await asyncio.start_server(self._handle_conn, self.cfg.host, self.cfg.port)
+
+    @property
+    def port(self) -> int:
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._own_executor and self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+    # --- HTTP ---
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.cfg.header_timeout_s)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 431, {"error": "request headers too large"}, keep_alive=False)
+                    return
+                t0 = time.perf_counter()
+                route = "?"
+                try:
+                    method, target, version, headers = self._parse_head(head)
+                    route = _route_name(method, target)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    status, body, extra = await self._dispatch(method, target, headers, reader)
+                except HttpError as e:
+                    status, body, extra, keep_alive = e.status, {"error": str(e)}, e.headers, False
+                except Exception as e:
+                    status, body, extra, keep_alive = 500, {"error": f"{type(e).__name__}: {e}"}, {}, False
+                await self._send(writer, status, body, extra, keep_alive)
+                self.routes.setdefault(route, LatencyStats(self.cfg.stats_window)).add(time.perf_counter() - t0, status >= 500)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    def _parse_head(head: bytes) -> Tuple[str, str, str, Dict[str, str]]:
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise HttpError(400, "malformed request line")
+        headers: Dict[str, str] = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            k, sep, v = line.partition(":")
+            if not sep:
+                raise HttpError(400, "malformed header")
+            headers[k.strip().lower()] = v.strip()
+        return parts[0].upper(), parts[1], parts[2], headers
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: Any, headers: Optional[Dict[str, str]]=None,
+                    keep_alive: bool=True) -> None:
+        if isinstance(body, (bytes, str)):
+            data = body.encode("utf-8") if isinstance(body, str) else body
+            ctype = "text/html; charset=utf-8"
+        else:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            ctype = "application/json; charset=utf-8"
+        hdr = {"Content-Type": ctype, "Content-Length": str(len(data)), "Connection": "keep-alive" if keep_alive else "close",
+               "Server": f"rt_mvp/{__version__}", **(headers or {})}
+        head = f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdr.items()) + "\r\n"
+        try:
+            writer.write(head.encode("latin-1") + data)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def _content_length(self, headers: Dict[str, str]) -> int:
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "chunked bodies are not supported, send Content-Length")
+        try:
+            n = int(headers["content-length"])
+        except (KeyError, ValueError):
+            raise HttpError(411, "Content-Length required")
+        if n < 0:
+            raise HttpError(400, "bad Content-Length")
+        if n > self.cfg.max_body_bytes:
+            raise HttpError(413, f"body larger than {self.cfg.max_body_bytes} bytes")
+        return n
+
+    async def _dispatch(self, method: str, target: str, headers: Dict[str, str],
+                        reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        if parts == ["health"] and method == "GET":
+            return 200, {"status": "ok", "version": __version__}, {}
+        if parts == ["stats"] and method == "GET":
+            return 200, self.stats(), {}
+        if len(parts) == 3 and parts[0] == "runs":
+            run_id, action = parts[1], parts[2]
+            if not _RUN_ID.match(run_id):
+                raise HttpError(400, "run_id must match [A-Za-z0-9_.-]{1,128} and not be . or ..")
+            handler = {("POST", "events"): self._post_events, ("PUT", "log"): self._put_log,
+                       ("POST", "analyze"): self._post_analyze, ("GET", "summary"): self._get_summary,
+                       ("GET", "report"): self._get_report}.get((method, action))
+            if handler is None:
+                raise HttpError(405 if action in ("events", "log", "analyze", "summary", "report") else 404,
+                                f"{method} /runs/<run_id>/{action} is not supported")
+            return await handler(run_id, query, headers, reader)
+        raise HttpError(404, f"no route for {method} {url.path}")
+
+    # --- маршруты ---
+
+    def _lock(self, run_id: str) -> asyncio.Lock:
+        lock = self._locks.get(run_id)
+        if lock is None:
+            lock = self._locks[run_id] = asyncio.Lock()
+        return lock
+
+    def _log_path(self, run_id: str) -> str:
+        return os.path.join(self.logs_dir, run_id + ".log")
+
+    async def _post_events(self, run_id: str, query: Dict[str, str], headers: Dict[str, str],
+                           reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        # Пачка событий: JSON-массив, один объект или JSONL; в лог пишется по строке на событие
+        raw = await reader.readexactly(self._content_length(headers))
+        try:
+            text = raw.decode("utf-8").strip()
+            if text.startswith("["):
+                events = json.loads(text)
+            else:
+                events = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except ValueError as e:
+            raise HttpError(400, f"events must be a JSON array or JSONL: {e}")
+        if not all(isinstance(e, dict) and "event_type" in e for e in events):
+            raise HttpError(400, "every event must be an object with event_type")
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events).encode("utf-8")
+        path = self._log_path(run_id)
+        async with self._lock(run_id):
+            if is_binlog(path):
+                raise HttpError(409, "run log is binary; upload it again with PUT /runs/<run_id>/log")
+            with open(path, "ab") as f:
+                f.write(data)
+            size = os.path.getsize(path)
+        return 202, {"run_id": run_id, "accepted": len(events), "log_bytes": size}, {}
+
+    async def _put_log(self, run_id: str, query: Dict[str, str], headers: Dict[str, str],
+                       reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        # Лог целиком: поток тела пишется во временный файл по частям и атомарно заменяет лог запуска
+        n = self._content_length(headers)
+        path = self._log_path(run_id)
+        tmp = f"{path}.upload-{id(reader)}"
+        async with self._lock(run_id):
+            try:
+                with open(tmp, "wb") as f:
+                    left = n
+                    while left:
+                        chunk = await reader.read(min(READ_CHUNK, left))
+                        if not chunk:
+                            raise HttpError(400, "body shorter than Content-Length")
+                        f.write(chunk); left -= len(chunk)
+                os.replace(tmp, path)
+            finally:
+                if os.path.exists(tmp): os.remove(tmp)
+        return 200, {"run_id": run_id, "log_bytes": n, "format": "binary" if is_binlog(path) else "jsonl"}, {}
+
+    async def _post_analyze(self, run_id: str, query: Dict[str, str], headers: Dict[str, str],
+                            reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        if headers.get("content-length", "0") != "0":
+            await reader.readexactly(self._content_length(headers))  # Тело не используется
+        task = query.get("task") or None
+        if task is not None and task not in self.project_cfg.task_bounds:
+            raise HttpError(400, f"unknown task: {task}")
+        path = self._log_path(run_id)
+        if not os.path.exists(path):
+            raise HttpError(404, f"no log for run {run_id}")
+        if self.pending >= self.cfg.max_pending:
+            self.rejected += 1
+            raise HttpError(503, f"analysis queue is full ({self.pending} pending)", {"Retry-After": "1"})
+        self.pending += 1
+        try:
+            async with self._lock(run_id):
+                loop = asyncio.get_running_loop()
+                t_submit = time.time()
+                res = await loop.run_in_executor(self.executor, _analyze_job, path, task, self.cfg.config_path,
+                                                 self.reports_dir, self.cache_dir)
+        finally:
+            self.pending -= 1
+        self.queue_wait.add(max(0.0, res["started_unix"] - t_submit))
+        self.jobs.add(res["elapsed_s"], res["status"] != "ok")
+        self._done.append(time.time())
+        if res.get("cache") == "hit":
+            self.cache_hits += 1
+        if self.cache_dir is not None and self.pending == 0:
+            # Вытеснение — только когда нет анализов в работе (как в пакетном режиме — после всех)
+            await loop.run_in_executor(None, ResultCache(self.cache_dir, max_bytes=self.cfg.cache_max_bytes).evict)
+        if res["status"] != "ok":
+            return 422, {"run_id": run_id, "error": res["error"]}, {}
+        return 200, res["summary"], {"X-Cache": res.get("cache", "off"), "X-Analysis-Ms": f"{res['elapsed_s'] * 1000.0:.1f}"}
+
+    def _report_path(self, run_id: str, query: Dict[str, str], name: str) -> str:
+        base = os.path.join(self.reports_dir, run_id)
+        sub = query.get("run")
+        if sub is not None:
+            if not _RUN_ID.match(sub):
+                raise HttpError(400, "bad run parameter")
+            base = os.path.join(base, sub)
+        path = os.path.join(base, name)
+        if os.path.commonpath([os.path.realpath(path), os.path.realpath(self.reports_dir)]) != os.path.realpath(self.reports_dir):
+            raise HttpError(400, "report path outside of reports directory")
+        if not os.path.exists(path):
+            raise HttpError(404, f"no {name} for run {run_id}" + (f"/{sub}" if sub else "") + "; POST /runs/<run_id>/analyze first")
+        return path
+
+    async def _get_summary(self, run_id: str, query: Dict[str, str], headers: Dict[str, str],
+                           reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        base = os.path.join(self.reports_dir, run_id)
+        if query.get("run") is None and not os.path.exists(os.path.join(base, "summary.json")) and os.path.isdir(base):
+            # Режим запусков: summary каждого запуска лога
+            runs = []
+            for d in sorted(os.listdir(base)):
+                p = os.path.join(base, d, "summary.json")
+                if os.path.exists(p):
+                    with open(p, "r", encoding="utf-8") as f:
+                        runs.append(json.load(f))
+            if runs:
+                return 200, {"runs": runs}, {}
+        with open(self._report_path(run_id, query, "summary.json"), "r", encoding="utf-8") as f:
+            return 200, json.load(f), {}
+
+    async def _get_report(self, run_id: str, query: Dict[str, str], headers: Dict[str, str],
+                          reader: asyncio.StreamReader) -> Tuple[int, Any, Dict[str, str]]:
+        with open(self._report_path(run_id, query, "report.html"), "rb") as f:
+            return 200, f.read(), {}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        uptime = now - self.started
+        recent = sum(1 for t in self._done if t >= now - 60.0)
+        return {"version": __version__, "uptime_s": round(uptime, 3), "pending": self.pending, "max_pending": self.cfg.max_pending,
+                "workers": self.workers, "rejected": self.rejected, "cache_hits": self.cache_hits,
+                "analyses": self.jobs.to_dict(), "queue_wait": self.queue_wait.to_dict(),
+                "throughput": {"analyses_per_s": round(self.jobs.count / uptime, 4) if uptime > 0 else None, "analyses_last_60s": recent},
+                "routes": {k: v.to_dict() for k, v in sorted(self.routes.items())}}
+
+async def serve(cfg: ServiceCfg) -> None:
+    svc = AnalysisService(cfg)
+    await svc.start()
+    try:
+        await svc.serve_forever()
+    finally:
+        await svc.close()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+import heapq, math, os
+
+LogPath = Union[str, Sequence[str]]  # Один лог или шарды одной сессии (по файлу на инструмент)
+LATE_POLICIES = ("emit", "drop", "raise")
+
+def log_paths(log_path: LogPath) -> List[str]:
+    return [log_path] if isinstance(log_path, str) else list(log_path)
+
+def log_name(log_path: LogPath) -> str:
+    # Имя сессии: имя файла без расширения; у шардов — общий префикс имён (s01_rt, s01_gaze -> s01)
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in log_paths(log_path)]
+    prefix = os.path.commonprefix(stems).rstrip("_-. ") if len(stems) > 1 else ""
+    return prefix or stems[0]
+
+def _t_of(ev: Dict[str, Any]) -> Optional[float]:
+    t = ev.get("t_mono")
+    if t is None:
+        return None
+    try:
+        return float(t)
+    except (TypeError, ValueError):
+        return None
+
+def _reorder(events: Iterable[Dict[str, Any]], window_s: float, on_late: str, stats: Dict[str, int],
+             name: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    # Упорядочивает один поток по t_mono буфером-кучей: событие выдаётся, когда в потоке
+    # встретилось время на window_s позже него (раньше него событий уже не будет)
+    buf: List[Tuple[float, int, Dict[str, Any]]] = []
+    high = last = -math.inf  # Максимальное прочитанное и последнее выданное время
+    seq = 0
+    for ev in events:
+        t = _t_of(ev)
+        if t is None:
+            t = max(high, last)  # Событие без времени остаётся на своём месте в потоке
+        elif t < last:
+            # Нарушение порядка больше окна: событие уже не встать на своё место
+            stats["shard_late"] += 1
+            if on_late == "raise":
+                raise ValueError(f"{name}: t_mono={t} out of order beyond reorder window ({window_s}s after {last})")
+            if on_late == "drop":
+                continue
+        elif t < high:
+            stats["shard_reordered"] += 1
+        if t > high:
+            high = t
+        heapq.heappush(buf, (t, seq, ev)); seq += 1
+        limit = high - window_s
+        while buf and buf[0][0] <= limit:
+            t_out, _, e = heapq.heappop(buf)
+            if t_out > last: last = t_out
+            yield t_out, e
+    while buf:
+        t_out, _, e = heapq.heappop(buf)
+        yield t_out, e
+
+def merge_streams(streams: Sequence[Iterable[Dict[str, Any]]], reorder_window_s: float=1.0, on_late: str="emit",
+                  names: Optional[Sequence[str]]=None, counters: Optional[Dict[str, int]]=None) -> Iterator[Dict[str, Any]]:
+    """Ленивое слияние потоков событий в порядке t_mono (k-way merge на куче).
+
+    Каждый поток может быть не упорядочен в пределах ``reorder_window_s``
+    секунд — такие события переставляются (``shard_reordered``). Событие,
+    опоздавшее больше чем на окно (``shard_late``), по ``on_late``: "emit" —
+    выдаётся как есть (анализатор всё равно сортирует события триала),
+    "drop" — отбрасывается, "raise" — ValueError. При равном t_mono порядок —
+    по номеру потока, затем по порядку в потоке. В памяти — только окно
+    каждого потока, а не весь лог.
+    """
+    if on_late not in LATE_POLICIES:
+        raise ValueError(f"unknown late policy: {on_late!r} (expected {', '.join(LATE_POLICIES)})")
+    stats = {"shard_reordered": 0, "shard_late": 0}
+    names = list(names) if names is not None else [f"stream {i}" for i in range(len(streams))]
+    try:
+        its = [_reorder(s, reorder_window_s, on_late, stats, n) for s, n in zip(streams, names)]
+        for _, ev in heapq.merge(*its, key=lambda x: x[0]):
+            yield ev
+    finally:
+        if counters is not None:
+            for k, v in stats.items():
+                counters[k] = counters.get(k, 0) + v
+
+def read_shards(paths: Sequence[str], event_types: Optional[Sequence[str]]=None, instrument: Optional[str]=None,
+                reorder_window_s: float=1.0, on_late: str="emit", counters: Optional[Dict[str, int]]=None,
+                **kw: Any) -> Iterator[Dict[str, Any]]:
+    # Шарды сессии (JSONL или бинарные, в любом сочетании) как один поток событий по t_mono;
+    # фильтры event_types / instrument и счётчики чтения — как у read_events
+    from .event_log import read_events
+    streams = [read_events(p, event_types=event_types, instrument=instrument, counters=counters, **kw) for p in paths]
+    return merge_streams(streams, reorder_window_s=reorder_window_s, on_late=on_late, names=list(paths), counters=counters)
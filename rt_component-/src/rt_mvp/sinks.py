@@ -1,7 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, List
-import json, os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio, atexit, inspect, json, os, tempfile, threading, time
+
+from .binlog import BinlogWriter
 
 class EventSink:
     def emit(self, event: Dict[str, Any]) -> None:
@@ -26,3 +30,652 @@ class CallbackSink(EventSink):
     cb: Callable[[Dict[str, Any]], None]
     def emit(self, event: Dict[str, Any]) -> None:
         self.cb(event)
+
+class BinlogSink(EventSink):
+    """Синк в бинарный лог (см. binlog): то же append-only поведение, что у JsonlSink, но компактнее и быстрее при чтении."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._w: Optional[BinlogWriter] = None
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        if self._w is None:
+            self._w = BinlogWriter.open(self.path)
+        self._w.write(event)
+        self._w.f.flush()
+
+    def close(self) -> None:
+        if self._w is not None:
+            self._w.close()
+            self._w = None
+
+class BufferedJsonlSink(EventSink):
+    """JSONL-синк с записью пачками из фонового потока.
+
+    ``emit`` только кладёт событие в deque (append атомарен под GIL, без
+    блокировок) и не трогает файловую систему; сериализация и запись идут в
+    фоновом потоке раз в ``flush_interval_s`` или при накоплении
+    ``flush_size`` событий. На событиях из ``flush_on`` (по умолчанию
+    ``session_end``), при ``close()`` и при выходе интерпретатора очередь
+    дописывается синхронно. Политика fsync: "never", "batch" (после каждой
+    пачки) или "flush" (только при синхронном сбросе/закрытии).
+    Событие после ``emit`` не должно изменяться вызывающим кодом.
+
+    Событие, которое не сериализуется в JSON, отбрасывается и считается в
+    ``events_dropped``. Ошибка записи не останавливает поток: строки пачки
+    остаются в ожидании и пишутся следующей попыткой, ``flush`` при этом
+    возвращает False. Если фоновый поток всё же завершился, ``emit`` и
+    ``close`` поднимают RuntimeError, а ``flush`` возвращает False.
+    """
+
+    def __init__(self, path: str, flush_interval_s: float=0.25, flush_size: int=256, fsync: str="flush",
+                 flush_on: Tuple[str, ...]=("session_end",)):
+        if fsync not in ("never", "batch", "flush"):
+            raise ValueError(f"unknown fsync policy: {fsync}")
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        self.flush_size = flush_size
+        self.fsync = fsync
+        self.flush_on = flush_on
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        self._q: Deque[Dict[str, Any]] = deque()
+        self._wake = threading.Event()
+        self._written = threading.Condition()
+        self._stop = False
+        self._sync_gen = 0  # Номер последнего запроса синхронного сброса
+        self._synced_gen = 0  # Номер последнего выполненного
+        self.n_enqueued = 0
+        self.n_written = 0
+        self.n_dropped = 0  # Не сериализуемые в JSON события
+        self.n_write_errors = 0
+        self.last_error: Optional[str] = None
+        self._pending: List[str] = []  # Сериализованные строки, не записанные из-за ошибки ввода-вывода
+        self._count_lock = threading.Lock()  # emit вызывают из нескольких потоков
+        self._dead: Optional[str] = None  # Причина аварийного завершения фонового потока
+        self.n_batches = 0
+        self.max_queue_depth = 0
+        self.write_latency_ms_last = 0.0
+        self.write_latency_ms_max = 0.0
+        self._write_latency_ms_sum = 0.0
+        self._thread = threading.Thread(target=self._run, name="BufferedJsonlSink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        if self._stop:
+            raise RuntimeError("sink is closed")
+        if self._dead is not None:
+            raise RuntimeError(f"sink writer thread died: {self._dead}")
+        q = self._q
+        with self._count_lock:
+            q.append(event)
+            self.n_enqueued += 1
+        depth = len(q)
+        if depth > self.max_queue_depth: self.max_queue_depth = depth
+        if event.get("event_type") in self.flush_on:
+            self.flush()
+        elif depth >= self.flush_size:
+            self._wake.set()
+
+    def flush(self, timeout: Optional[float]=None) -> bool:
+        # Дописывает всё, что поставлено в очередь до вызова; True, если всё записано (или отброшено) за timeout.
+        # Ошибка записи или остановка потока прерывают ожидание с False
+        target = self.n_enqueued
+        gen0 = self.n_write_errors
+        done = lambda: self.n_written + self.n_dropped >= target and not self._pending
+        with self._written:
+            self._sync_gen += 1
+            self._wake.set()
+            self._written.wait_for(lambda: done() or self.n_write_errors > gen0 or not self._thread.is_alive(), timeout)
+            return done() and self._dead is None
+
+    def close(self) -> None:
+        if self._stop:
+            return
+        self.flush()
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        self._f.close()
+        atexit.unregister(self.close)
+        lost = len(self._q) + len(self._pending)
+        if self._dead is not None or lost:
+            raise RuntimeError(f"BufferedJsonlSink lost {lost} events: {self._dead or self.last_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._q),
+            "max_queue_depth": self.max_queue_depth,
+            "events_enqueued": self.n_enqueued,
+            "events_written": self.n_written,
+            "events_dropped": self.n_dropped,
+            "events_pending": len(self._pending),
+            "write_errors": self.n_write_errors,
+            "last_error": self.last_error,
+            "batches": self.n_batches,
+            "write_latency_ms_last": self.write_latency_ms_last,
+            "write_latency_ms_mean": (self._write_latency_ms_sum / self.n_batches) if self.n_batches else None,
+            "write_latency_ms_max": self.write_latency_ms_max,
+        }
+
+    def _run(self) -> None:
+        try:
+            while True:
+                self._wake.wait(self.flush_interval_s)
+                self._wake.clear()
+                self._drain()
+                if self._stop and not self._q:
+                    return
+        except BaseException as e:  # Непредвиденная ошибка: помечаем синк мёртвым и будим ожидающих flush
+            self._dead = f"{type(e).__name__}: {e}"
+            with self._written:
+                self._written.notify_all()
+            raise
+
+    def _drain(self) -> None:
+        gen = self._sync_gen  # Читаем до выборки: запрос, пришедший позже, обработает следующая итерация
+        sync = gen > self._synced_gen
+        q = self._q
+        lines = self._pending; self._pending = []
+        n_bad = 0
+        while q:
+            ev = q.popleft()
+            try:
+                lines.append(json.dumps(ev, ensure_ascii=False) + "\n")
+            except (TypeError, ValueError) as e:  # Событие не сериализуется — отбрасываем только его
+                n_bad += 1; self.last_error = f"{type(e).__name__}: {e}"
+        written = 0; failed = False
+        if lines or sync:
+            t0 = time.perf_counter()
+            try:
+                if lines:
+                    self._f.write("".join(lines))
+                    self._f.flush()
+                    written = len(lines)
+                if (self.fsync == "batch" and lines) or (self.fsync == "flush" and sync):
+                    os.fsync(self._f.fileno())
+            except (OSError, ValueError) as e:
+                # Поток продолжает работу: незаписанные строки — в ожидание до следующей попытки
+                failed = True
+                if not written: self._pending = lines
+                self.last_error = f"{type(e).__name__}: {e}"
+            dt = (time.perf_counter() - t0) * 1000.0
+            self.n_batches += 1
+            self.write_latency_ms_last = dt
+            self._write_latency_ms_sum += dt
+            if dt > self.write_latency_ms_max: self.write_latency_ms_max = dt
+        with self._written:
+            if failed: self.n_write_errors += 1
+            else: self._synced_gen = gen
+            self.n_written += written
+            self.n_dropped += n_bad
+            self._written.notify_all()
+
+class BatchTransport:
+    """Доставка пачки событий для AsyncBatchSink; исключение из ``send`` — повтор пачки."""
+
+    async def send(self, batch: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+class FileTransport(BatchTransport):
+    # Пачка дописывается в JSONL-файл в потоке пула, не блокируя цикл событий
+    def __init__(self, path: str):
+        self.path = path
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
+
+    def _write(self, data: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    async def send(self, batch: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in batch)
+        await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+
+class QueueTransport(BatchTransport):
+    # Пачка кладётся в asyncio.Queue; у ограниченной очереди put ждёт потребителя
+    def __init__(self, queue: "asyncio.Queue[List[Dict[str, Any]]]"):
+        self.queue = queue
+
+    async def send(self, batch: List[Dict[str, Any]]) -> None:
+        await self.queue.put(list(batch))
+
+class HttpTransport(BatchTransport):
+    """POST пачки JSON-массивом (например, в ``/runs/<run_id>/events`` сервиса, см. service).
+
+    Соединение HTTP/1.1 держится между пачками; ответ не 2xx — исключение
+    (пачка будет повторена), обрыв — переподключение при следующей отправке.
+    """
+
+    def __init__(self, url: str, timeout_s: float=10.0, headers: Optional[Dict[str, str]]=None):
+        u = urlsplit(url)
+        if u.scheme != "http":
+            raise ValueError(f"only http:// URLs are supported: {url}")
+        self.host = u.hostname or "127.0.0.1"
+        self.port = u.port or 80
+        self.path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        self.timeout_s = timeout_s
+        self.headers = headers or {}
+        self._conn: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+
+    async def send(self, batch: List[Dict[str, Any]]) -> None:
+        body = json.dumps(batch, ensure_ascii=False).encode("utf-8")
+        try:
+            await asyncio.wait_for(self._post(body), self.timeout_s)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _post(self, body: bytes) -> None:
+        if self._conn is None:
+            self._conn = await asyncio.open_connection(self.host, self.port)
+        reader, writer = self._conn
+        hdr = {"Host": f"{self.host}:{self.port}", "Content-Type": "application/json", "Content-Length": str(len(body)), **self.headers}
+        writer.write((f"POST {self.path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdr.items()) + "\r\n").encode("latin-1") + body)
+        await writer.drain()
+        head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ", 2)[1])
+        headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(":") for h in head[1:] if h)}
+        data = await reader.readexactly(int(headers.get("content-length", "0")))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        if not 200 <= status < 300:
+            raise RuntimeError(f"HTTP {status}: {data[:200].decode('utf-8', 'replace')}")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            writer = self._conn[1]
+            self._conn = None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+class AsyncBatchSink(EventSink):
+    """Синк для asyncio: события группируются в пачки и доставляются транспортом (BatchTransport).
+
+    Пачка уходит, когда набралось ``max_batch`` событий или прошло
+    ``max_delay_s`` с первого события пачки. ``emit`` не блокирует и
+    потокобезопасен (можно вызывать из потока GUI или из FanoutSink): событие
+    кладётся в deque, цикл событий будится только на первом событии пачки и
+    при заполнении пачки. Ошибка транспорта — повтор с экспоненциальной
+    паузой (``retry_base_s`` .. ``retry_max_s``); после ``max_retries``
+    неудачных попыток пачка уходит в ``dead_letter`` (или считается
+    потерянной), ``max_retries=None`` — повторять бесконечно.
+
+    Память ограничена ``max_buffer`` событиями. При переполнении
+    (транспорт отстаёт или недоступен) ``overflow``: "spill" — события
+    дописываются во временный JSONL-файл (``spill_path``) и отправляются
+    после буфера, порядок сохраняется; "drop_oldest" — вытесняется самое
+    старое событие; "error" — RuntimeError из ``emit``.
+    """
+
+    def __init__(self, transport: BatchTransport, max_batch: int=500, max_delay_s: float=0.2, max_buffer: int=50_000,
+                 overflow: str="spill", spill_path: Optional[str]=None, max_retries: Optional[int]=None,
+                 retry_base_s: float=0.1, retry_max_s: float=5.0, dead_letter: Optional[EventSink]=None):
+        if overflow not in ("spill", "drop_oldest", "error"):
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.transport = transport
+        self.max_batch = max_batch
+        self.max_delay_s = max_delay_s
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.dead_letter = dead_letter
+        self._buf: Deque[Dict[str, Any]] = deque()
+        self._spill_lock = threading.Lock()
+        self._spill_w: Any = None; self._spill_r: Any = None
+        self._spill_n = 0  # Событий в файле, ещё не прочитанных обратно
+        self._count_lock = threading.Lock()  # n_enqueued и n_dropped меняются и из потоков-источников (emit)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._progress: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._closing = False
+        self._flush_req = False
+        self.n_enqueued = 0
+        self.n_sent = 0
+        self.n_batches = 0
+        self.n_retries = 0
+        self.n_spilled = 0
+        self.n_dropped = 0
+        self.max_queue_depth = 0
+        self.send_latency_ms_last = 0.0
+        self.send_latency_ms_max = 0.0
+        self._send_latency_ms_sum = 0.0
+
+    # --- жизненный цикл ---
+
+    async def start(self) -> "AsyncBatchSink":
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._wake = asyncio.Event(); self._progress = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+            if self._buf or self._spill_n: self._wake.set()
+        return self
+
+    async def __aenter__(self) -> "AsyncBatchSink":
+        return await self.start()
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def flush(self) -> None:
+        # Ждёт доставки (или отказа) всего, что поставлено в очередь до вызова
+        await self.start()
+        assert self._progress is not None
+        target = self.n_enqueued
+        while self.n_sent + self.n_dropped < target and self._task is not None and not self._task.done():
+            self._flush_req = True
+            self._notify()
+            self._progress.clear()
+            await self._progress.wait()
+        if self._task is not None and self._task.done() and not self._task.cancelled() and self._task.exception():
+            raise self._task.exception()  # type: ignore[misc]
+
+    async def close(self) -> None:
+        if self._closing:
+            return
+        await self.flush()
+        self._closing = True
+        self._notify()
+        if self._task is not None:
+            await self._task
+        await self.transport.close()
+        with self._spill_lock:
+            for f in (self._spill_w, self._spill_r):
+                if f is not None: f.close()
+            self._spill_w = self._spill_r = None
+            if self.spill_path and self._spill_n == 0 and os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
+
+    # --- приём событий ---
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        if self._closing:
+            raise RuntimeError("sink is closed")
+        buf = self._buf
+        with self._count_lock:
+            self.n_enqueued += 1
+        if self._spill_n or len(buf) >= self.max_buffer:
+            if self.overflow == "spill":
+                self._spill(event)
+                return
+            if self.overflow == "error":
+                with self._count_lock:
+                    self.n_enqueued -= 1
+                raise RuntimeError(f"sink buffer is full ({len(buf)} events)")
+            try:
+                buf.popleft()
+            except IndexError:  # Буфер успел освободиться
+                pass
+            else:
+                with self._count_lock:
+                    self.n_dropped += 1
+        buf.append(event)
+        depth = len(buf)
+        if depth > self.max_queue_depth: self.max_queue_depth = depth
+        if depth == 1 or depth == self.max_batch:
+            self._notify()
+
+    def _notify(self) -> None:
+        if self._wake is None or self._loop is None:
+            return
+        if threading.get_ident() == self._loop_thread:
+            self._wake.set()
+        else:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:  # Цикл событий уже закрыт
+                pass
+
+    def _spill(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._spill_lock:
+            if self._spill_w is None:
+                if self.spill_path is None:
+                    fd, self.spill_path = tempfile.mkstemp(prefix="rt_mvp_spill_", suffix=".jsonl")
+                    os.close(fd)
+                self._spill_w = open(self.spill_path, "a", encoding="utf-8")
+                self._spill_r = open(self.spill_path, "r", encoding="utf-8")
+            self._spill_w.write(line); self._spill_w.flush()
+            self._spill_n += 1
+        self.n_spilled += 1
+        if self._spill_n == 1:
+            self._notify()
+
+    def _unspill(self, n: int) -> List[Dict[str, Any]]:
+        # Следующие n событий из файла переполнения; прочитанный до конца файл обнуляется
+        with self._spill_lock:
+            out = []
+            while len(out) < n and self._spill_n:
+                out.append(json.loads(self._spill_r.readline()))
+                self._spill_n -= 1
+            if self._spill_n == 0 and self._spill_w is not None:
+                self._spill_w.truncate(0); self._spill_r.seek(0)
+        return out
+
+    def _take(self) -> List[Dict[str, Any]]:
+        buf = self._buf
+        batch: List[Dict[str, Any]] = []
+        while buf and len(batch) < self.max_batch:
+            batch.append(buf.popleft())
+        if not batch and self._spill_n:
+            batch = self._unspill(self.max_batch)
+        return batch
+
+    # --- отправка ---
+
+    async def _run(self) -> None:
+        assert self._wake is not None and self._progress is not None and self._loop is not None
+        loop = self._loop
+        while True:
+            if not self._buf and not self._spill_n:
+                if self._closing:
+                    return
+                self._wake.clear()
+                if self._buf or self._spill_n or self._closing:
+                    continue
+                await self._wake.wait()
+                continue
+            # Набор пачки: до max_batch событий или max_delay_s с начала ожидания
+            deadline = loop.time() + self.max_delay_s
+            while len(self._buf) < self.max_batch and not self._spill_n and not self._closing and not self._flush_req:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if not self._buf and not self._spill_n:
+                self._flush_req = False
+            batch = self._take()
+            if batch:
+                await self._deliver(batch)
+            self._progress.set()
+
+    async def _deliver(self, batch: List[Dict[str, Any]]) -> None:
+        attempt = 0
+        while True:
+            t0 = time.perf_counter()
+            try:
+                await self.transport.send(batch)
+            except Exception:
+                attempt += 1
+                if self.max_retries is not None and attempt > self.max_retries:
+                    with self._count_lock:
+                        self.n_dropped += len(batch)
+                    if self.dead_letter is not None:
+                        for ev in batch: self.dead_letter.emit(ev)
+                    return
+                self.n_retries += 1
+                await asyncio.sleep(min(self.retry_max_s, self.retry_base_s * (2 ** (attempt - 1))))
+                continue
+            dt = (time.perf_counter() - t0) * 1000.0
+            self.n_sent += len(batch)
+            self.n_batches += 1
+            self.send_latency_ms_last = dt
+            self._send_latency_ms_sum += dt
+            if dt > self.send_latency_ms_max: self.send_latency_ms_max = dt
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._buf),
+            "max_queue_depth": self.max_queue_depth,
+            "spill_depth": self._spill_n,
+            "events_enqueued": self.n_enqueued,
+            "events_sent": self.n_sent,
+            "events_spilled": self.n_spilled,
+            "events_dropped": self.n_dropped,
+            "batches": self.n_batches,
+            "retries": self.n_retries,
+            "send_latency_ms_last": self.send_latency_ms_last,
+            "send_latency_ms_mean": (self._send_latency_ms_sum / self.n_batches) if self.n_batches else None,
+            "send_latency_ms_max": self.send_latency_ms_max,
+        }
+
+class FanoutSink(EventSink):
+    """Одно событие — в несколько синков; медленный синк не задерживает остальные.
+
+    У каждого дочернего синка своя очередь (deque) и свой поток доставки:
+    ``emit`` только добавляет событие в очереди и будит простаивающие потоки.
+    Очередь синка ограничена ``max_queue`` событиями; при переполнении
+    ``overflow``: "block" (по умолчанию) — ``emit`` ждёт, пока отстающий синк
+    освободит место (события не теряются, ``blocked`` в ``stats``);
+    "drop_oldest" — вытесняется самое старое событие этого синка
+    (``dropped`` в ``stats``), остальные синки не затрагиваются; "error" —
+    RuntimeError из ``emit``. Исключение дочернего синка считается в
+    ``errors`` и не прерывает доставку. ``close()`` дописывает очереди и
+    закрывает дочерние синки, у которых есть ``close``.
+    """
+
+    def __init__(self, sinks: List[EventSink], max_queue: int=100_000, close_children: bool=True, overflow: str="block"):
+        if overflow not in ("block", "drop_oldest", "error"):
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        self.sinks = list(sinks)
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.close_children = close_children
+        self._stop = False
+        self._lanes = [_FanoutLane(s, i) for i, s in enumerate(self.sinks)]
+        atexit.register(self.close)
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        if self._stop:
+            raise RuntimeError("sink is closed")
+        for lane in self._lanes:
+            q = lane.q
+            if len(q) >= self.max_queue:
+                if self.overflow == "block":
+                    lane.wait_room(self.max_queue)
+                elif self.overflow == "error":
+                    raise RuntimeError(f"FanoutSink queue of {type(lane.sink).__name__} is full ({self.max_queue} events)")
+                else:
+                    try:
+                        q.popleft(); lane.dropped += 1
+                    except IndexError:
+                        pass
+            q.append(event)
+            lane.enqueued += 1
+            depth = len(q)
+            if depth > lane.max_depth: lane.max_depth = depth
+            if depth == 1:
+                lane.wake.set()
+
+    def flush(self, timeout: Optional[float]=None) -> bool:
+        # Ждёт, пока все очереди опустеют; True, если успели за timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ok = True
+        for lane in self._lanes:
+            left = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ok = lane.wait_idle(left) and ok
+        return ok
+
+    def close(self) -> None:
+        if self._stop:
+            return
+        self._stop = True
+        for lane in self._lanes:
+            lane.stop()
+        if self.close_children:
+            for s in self.sinks:
+                c = getattr(s, "close", None)
+                if callable(c) and not inspect.iscoroutinefunction(c): c()  # AsyncBatchSink закрывается через await
+        atexit.unregister(self.close)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{"sink": type(l.sink).__name__, "queue_depth": len(l.q), "max_queue_depth": l.max_depth, "events_enqueued": l.enqueued,
+                 "events_delivered": l.delivered, "dropped": l.dropped, "blocked": l.blocked, "errors": l.errors, "last_error": l.last_error}
+                for l in self._lanes]
+
+class _FanoutLane:
+    # Очередь и поток доставки одного дочернего синка FanoutSink
+    def __init__(self, sink: EventSink, i: int):
+        self.sink = sink
+        self.q: Deque[Dict[str, Any]] = deque()
+        self.wake = threading.Event()
+        self.idle = threading.Condition()
+        self.enqueued = self.delivered = self.dropped = self.errors = self.max_depth = 0
+        self.blocked = 0  # Сколько раз emit ждал места в очереди (overflow="block")
+        self.waiting = False
+        self.last_error: Optional[str] = None
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name=f"FanoutSink-{i}-{type(sink).__name__}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        q = self.q
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            while True:
+                try:
+                    ev = q.popleft()
+                except IndexError:
+                    break
+                try:
+                    self.sink.emit(ev)
+                    self.delivered += 1
+                except Exception as e:
+                    self.errors += 1; self.last_error = f"{type(e).__name__}: {e}"
+                if self.waiting:  # emit ждёт места в очереди
+                    with self.idle:
+                        self.idle.notify_all()
+            with self.idle:
+                self.idle.notify_all()
+            if self._stop and not q:
+                return
+
+    def wait_idle(self, timeout: Optional[float]) -> bool:
+        with self.idle:
+            return self.idle.wait_for(lambda: self.delivered + self.errors + self.dropped >= self.enqueued or not self._thread.is_alive(), timeout)
+
+    def wait_room(self, limit: int) -> None:
+        # Обратное давление: ждёт, пока в очереди станет меньше limit событий
+        self.blocked += 1
+        with self.idle:
+            self.waiting = True
+            self.wake.set()
+            self.idle.wait_for(lambda: len(self.q) < limit or not self._thread.is_alive())
+            self.waiting = False
+        if not self._thread.is_alive():
+            raise RuntimeError(f"FanoutSink delivery thread of {type(self.sink).__name__} is not running")
+
+    def stop(self) -> None:
+        self._stop = True
+        self.wake.set()
+        self._thread.join()
@@ -1,47 +1,85 @@
 from __future__ import annotations
-from typing import Any, Dict, List, TYPE_CHECKING
+from typing import Any, Dict, Optional, Sequence, TYPE_CHECKING
 from .config import ProjectConfig
+from .rolling import rolling_metrics, uses_window_thresholds
 
 if TYPE_CHECKING:
     from .analyzer import TrialOutcome
 from . import stats
 
-# Функция для вычисления замедления реакции после ошибки
-def compute_post_error_slowing(trials: List[TrialOutcome]) -> Dict[str, Any]:
-    after_error: List[float] = []  # Времена реакции после ошибок
-    after_correct: List[float] = []  # Времена реакции после правильных ответов
-    for i in range(1, len(trials)):
-        cur = trials[i]
-        prev = trials[i - 1]
-        # Пропускаем некорректные времена реакции
-        if not (cur.is_valid_rt and cur.rt_ms is not None):
-            continue
-        # Определяет была ли предыдущая попытка ошибочной
-        prev_is_error = (
-            (not prev.is_correct)
-            and (prev.classification in ("wrong", "commission", "omission", "timeout", "anticipation"))
-        )
+# Классификации предыдущего триала, после которых текущий считается "после ошибки"
+_ERROR_CLASSES = ("wrong", "commission", "omission", "timeout", "anticipation")
+
+# Инкрементальный расчёт замедления реакции после ошибки (по одному триалу за вызов)
+class PostErrorSlowingAccumulator:
+    def __init__(self) -> None:
+        self._prev = None  # (is_correct, is_error) предыдущего триала
+        self.after_error_n = 0
+        self.after_error_sum = 0.0
+        self.after_correct_n = 0
+        self.after_correct_sum = 0.0
+
+    def add(self, cur: TrialOutcome) -> None:
+        prev = self._prev
+        self._prev = (bool(cur.is_correct), (not cur.is_correct) and (cur.classification in _ERROR_CLASSES))
+        # Пропускаем первый триал и некорректные времена реакции
+        if prev is None or not (cur.is_valid_rt and cur.rt_ms is not None):
+            return
+        prev_is_correct, prev_is_error = prev
         if prev_is_error:
-            after_error.append(float(cur.rt_ms))  # время реакции после ошибки
-        elif prev.is_correct:
-            after_correct.append(float(cur.rt_ms))  # время реакции после правильного ответа
+            self.after_error_n += 1; self.after_error_sum += float(cur.rt_ms)  # время реакции после ошибки
+        elif prev_is_correct:
+            self.after_correct_n += 1; self.after_correct_sum += float(cur.rt_ms)  # время реакции после правильного ответа
 
-    # средние времена реакции и их разницу
-    m_err = stats.mean(after_error)
-    m_cor = stats.mean(after_correct)
-    delta = (m_err - m_cor) if (m_err is not None and m_cor is not None) else None
+    def result(self) -> Dict[str, Any]:
+        m_err = (self.after_error_sum / self.after_error_n) if self.after_error_n else None
+        m_cor = (self.after_correct_sum / self.after_correct_n) if self.after_correct_n else None
+        delta = (m_err - m_cor) if (m_err is not None and m_cor is not None) else None
+        return {
+            "after_error_n": self.after_error_n,
+            "after_correct_n": self.after_correct_n,
+            "after_error_mean_rt_ms": m_err,
+            "after_correct_mean_rt_ms": m_cor,
+            "delta_ms": delta,
+        }
 
-    # словарь с результатами
-    return {
-        "after_error_n": len(after_error),
-        "after_correct_n": len(after_correct),
-        "after_error_mean_rt_ms": m_err,
-        "after_correct_mean_rt_ms": m_cor,
-        "delta_ms": delta,
-    }
+# Функция для вычисления замедления реакции после ошибки
+def compute_post_error_slowing(trials: Sequence[TrialOutcome]) -> Dict[str, Any]:
+    acc = PostErrorSlowingAccumulator()
+    for t in trials:
+        acc.add(t)
+    return acc.result()
+
+# Средние RT первой и последней трети валидных RT (анализ усталости)
+def fatigue_thirds(valid_rts: Sequence[float], slope: Any) -> Dict[str, Any]:
+    fatigue = {"slope": slope, "first_third_mean": None, "last_third_mean": None, "delta_ms": None}
+    if len(valid_rts) >= 6:  # Проверяем, достаточно ли данных
+        k = len(valid_rts)
+        a = max(1, k // 3)
+        mf = stats.mean(list(valid_rts[:a]))  # Среднее время реакции в первой трети
+        ml = stats.mean(list(valid_rts[-a:]))  # Среднее время реакции в последней трети
+        fatigue["first_third_mean"] = mf
+        fatigue["last_third_mean"] = ml
+        if mf is not None and ml is not None:
+            fatigue["delta_ms"] = ml - mf  # Разница между началом и концом
+    return fatigue
 
 # Функция вычисления множества "флагов" (состояний) на основе данных о триалах
-def compute_state_flags(trials: List[TrialOutcome], metrics: Dict[str, Any], task: str, cfg: ProjectConfig) -> Dict[str, Any]:
+def compute_state_flags(trials: Sequence[TrialOutcome], metrics: Dict[str, Any], task: str, cfg: ProjectConfig) -> Dict[str, Any]:
+    pes = compute_post_error_slowing(trials)  # Вычислить замедление после ошибки
+    valid_rts = [float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None]
+    fatigue = fatigue_thirds(valid_rts, metrics.get("rt", {}).get("rt_slope_ms_per_trial"))
+    rolling = None
+    if uses_window_thresholds(cfg):
+        # Сводка скользящих окон: из metrics["rolling"], если конвейер её уже посчитал
+        r = metrics.get("rolling") or rolling_metrics(trials, cfg)
+        rolling = r["summary"] if r else None
+    return decide_state_flags(metrics, pes, fatigue, cfg, rolling)
+
+# Решение по флагам из готовых метрик, PES и статистик усталости (общая часть пакетного и онлайн-расчёта);
+# rolling — сводка скользящих окон (rolling.RollingWindow.summary) для оконных порогов
+def decide_state_flags(metrics: Dict[str, Any], pes: Dict[str, Any], fatigue: Dict[str, Any], cfg: ProjectConfig,
+                       rolling: Optional[Dict[str, Any]]=None) -> Dict[str, Any]:
     th = cfg.flags_thresholds  # Пороговые значения для установки флагов
     rt = metrics.get("rt", {})  # Метрики времени реакции
     rates = metrics.get("rates", {})  # Метрики ошибок и других показателей
@@ -55,23 +93,7 @@ def compute_state_flags(trials: List[TrialOutcome], metrics: Dict[str, Any], tas
     accuracy = rates.get("accuracy")  # Точность
     total = counts.get("total_trials", 0) or 0  # Общее количество испытаний
     error_rate = (1.0 - float(accuracy)) if (accuracy is not None and total) else None  # Частота ошибок
-
-    # Вычислить замедление после ошибки
-    pes = compute_post_error_slowing(trials)
-    slope = rt.get("rt_slope_ms_per_trial")  # изменение времени реакции (показатель усталости)
-
-    # Разделение триалов на трети для анализа усталости
-    valid_rts = [float(t.rt_ms) for t in trials if t.is_valid_rt and t.rt_ms is not None]
-    fatigue = {"slope": slope, "first_third_mean": None, "last_third_mean": None, "delta_ms": None}
-    if len(valid_rts) >= 6:  # Проверяем, достаточно ли данных
-        k = len(valid_rts)
-        a = max(1, k // 3)
-        mf = stats.mean(valid_rts[:a])  # Среднее время реакции в первой трети
-        ml = stats.mean(valid_rts[-a:])  # Среднее время реакции в последней трети
-        fatigue["first_third_mean"] = mf
-        fatigue["last_third_mean"] = ml
-        if mf is not None and ml is not None:
-            fatigue["delta_ms"] = ml - mf  # Разница между началом и концом
+    slope = fatigue.get("slope")  # изменение времени реакции (показатель усталости)
 
     # Анализ рассеянности внимания
     attention = False
@@ -85,6 +107,14 @@ def compute_state_flags(trials: List[TrialOutcome], metrics: Dict[str, Any], tas
     if lapse_rate is not None and lapse_rate >= th.attention_lapse_threshold:
         attention = True
         attention_reasons.append(f"lapse_rate={lapse_rate:.3f}≥{th.attention_lapse_threshold} (lapse>{th.lapse_ms}ms)")
+    win = rolling or {}
+    win_cv = win.get("max_rt_cv"); win_lapse = win.get("max_lapse_rate")
+    if th.attention_window_cv_threshold is not None and win_cv is not None and win_cv >= th.attention_window_cv_threshold:
+        attention = True
+        attention_reasons.append(f"max window rt_cv={win_cv:.3f}≥{th.attention_window_cv_threshold}")
+    if th.attention_window_lapse_threshold is not None and win_lapse is not None and win_lapse >= th.attention_window_lapse_threshold:
+        attention = True
+        attention_reasons.append(f"max window lapse_rate={win_lapse:.3f}≥{th.attention_window_lapse_threshold}")
 
     # Анализ агрессивного стиля реакции
     aggressive = False
@@ -126,6 +156,10 @@ def compute_state_flags(trials: List[TrialOutcome], metrics: Dict[str, Any], tas
     if fatigue.get("delta_ms") is not None and fatigue["delta_ms"] >= th.fatigue_delta_ms:
         fatigue_flag = True
         fatigue_reasons.append(f"last-first={fatigue['delta_ms']:.1f}ms")
+    win_delta = win.get("mean_rt_delta_ms")
+    if th.fatigue_window_delta_ms is not None and win_delta is not None and win_delta >= th.fatigue_window_delta_ms:
+        fatigue_flag = True
+        fatigue_reasons.append(f"last window-first window={win_delta:.1f}ms")
 
     # Анализ консервативной стратегии
     conservative = False
@@ -0,0 +1,141 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional
+import json, math, random
+
+from .event_schema import base_event
+
+TASKS = ("simple", "choice", "go_nogo", "stroop", "pvt", "cpt")
+NOISE_INSTRUMENTS = ("gaze", "eeg", "mouse")  # Инструменты-«соседи» по общему логу оркестра
+T_UNIX0 = 1_700_000_000.0  # Фиксированное t_unix начала сессии: лог не зависит от времени запуска
+
+# Параметры синтетической сессии
+@dataclass(frozen=True)
+class SyntheticSpec:
+    task: str = "simple"
+    n_events: int = 10_000  # Примерное число событий (с шумом); лог заканчивается на границе триала
+    go_ratio: float = 0.7  # Доля Go-триалов (go_nogo, cpt)
+    noise_ratio: float = 0.3  # Доля событий других инструментов
+    seed: int = 0
+    session_id: str = "synthetic"
+    run_id: str = "run1"
+    timeout_ms: int = 2000
+    mean_rt_ms: float = 420.0  # Медиана RT в начале сессии
+    fatigue_ms_per_trial: float = 0.05  # Дрейф RT к концу сессии
+    p_omission: float = 0.04
+    p_anticipation: float = 0.03
+    p_wrong: float = 0.05
+    p_extra_press: float = 0.08  # Повторное или позднее нажатие после ответа
+
+    def name(self) -> str:
+        return f"{self.task}_g{self.go_ratio:g}_z{self.noise_ratio:g}_n{self.n_events}_s{self.seed}"
+
+def _trial_design(spec: SyntheticSpec, rnd: random.Random) -> Dict[str, Any]:
+    # Стимул триала: тип, ожидаемый ответ, is_go
+    task = spec.task
+    if task == "choice":
+        exp = "left" if rnd.getrandbits(1) else "right"
+        return {"stimulus_type": exp, "expected_response": exp, "is_go": None}
+    if task in ("go_nogo", "cpt"):
+        go = rnd.random() < spec.go_ratio
+        if task == "cpt":
+            return {"stimulus_type": "X" if go else rnd.choice("ABCDEFGH"), "expected_response": "space" if go else None, "is_go": go}
+        return {"stimulus_type": "go" if go else "nogo", "expected_response": "space" if go else None, "is_go": go}
+    if task == "stroop":
+        congruent = rnd.random() < 0.5
+        exp = "left" if rnd.getrandbits(1) else "right"
+        return {"stimulus_type": "congruent" if congruent else "incongruent", "expected_response": exp, "is_go": None}
+    return {"stimulus_type": task, "expected_response": "space", "is_go": None}
+
+def iter_synthetic_events(spec: SyntheticSpec) -> Iterator[Dict[str, Any]]:
+    """Детерминированный поток событий сессии (base_event) для заданной спецификации.
+
+    Одинаковый ``spec`` даёт одинаковые события, включая t_unix. RT —
+    логнормальное с дрейфом (усталость); есть пропуски, преждевременные,
+    неверные и повторные нажатия, а события других инструментов
+    (``NOISE_INSTRUMENTS``) перемешаны с событиями RT.
+    """
+    rnd = random.Random(spec.seed)
+    t = 0.0
+    n = 0
+    # Ожидаемое число шумовых событий на одно RT-событие
+    noise_per_event = spec.noise_ratio / (1.0 - spec.noise_ratio) if spec.noise_ratio < 1.0 else 0.0
+
+    def ev(event_type: str, t_s: float, instrument: str="rt", **payload: Any) -> Dict[str, Any]:
+        if instrument == "rt":
+            payload.setdefault("block_id", 1); payload["task_variant"] = spec.task
+        return base_event(event_type=event_type, session_id=spec.session_id, run_id=spec.run_id, t_mono_s=t_s,
+                          instrument=instrument, t_unix=T_UNIX0 + t_s, **payload)
+
+    def noise(t_s: float) -> Iterator[Dict[str, Any]]:
+        k = int(noise_per_event) + (1 if rnd.random() < noise_per_event % 1.0 else 0)
+        for _ in range(k):
+            inst = rnd.choice(NOISE_INSTRUMENTS)
+            if inst == "gaze":
+                yield ev("gaze_sample", t_s, inst, x=round(rnd.random(), 4), y=round(rnd.random(), 4), on_screen=rnd.random() < 0.95)
+            elif inst == "eeg":
+                yield ev("eeg_sample", t_s, inst, channel=rnd.randrange(8), uv=round(rnd.gauss(0.0, 20.0), 3))
+            else:
+                yield ev("mouse_move", t_s, inst, x=rnd.randrange(1920), y=rnd.randrange(1080))
+
+    def emit(e: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        nonlocal n
+        n += 1
+        yield e
+        for x in noise(e["t_mono"]):
+            n += 1
+            yield x
+
+    yield from emit(ev("session_start", t))
+    tid = 0
+    while n < spec.n_events - 1:
+        tid += 1
+        d = _trial_design(spec, rnd)
+        yield from emit(ev("trial_start", t, trial_id=tid))
+        t += rnd.uniform(2.0, 10.0) if spec.task == "pvt" else rnd.uniform(0.5, 1.5)
+        if rnd.random() < spec.p_anticipation / 2:
+            yield from emit(ev("keypress", t - rnd.uniform(0.02, 0.15), trial_id=tid, button_id="space"))  # Фальстарт
+        t0 = t
+        yield from emit(ev("stimulus_on", t0, trial_id=tid, stimulus_id=d["stimulus_type"], timeout_ms=spec.timeout_ms, **d))
+        must_press = d["is_go"] is not False
+        r = rnd.random()
+        press_t: Optional[float] = None
+        if must_press and r >= spec.p_omission:
+            if r < spec.p_omission + spec.p_anticipation:
+                rt = rnd.uniform(20.0, 95.0)
+            else:
+                mu = math.log(spec.mean_rt_ms + spec.fatigue_ms_per_trial * tid) + (0.08 if d["stimulus_type"] == "incongruent" else 0.0)
+                rt = rnd.lognormvariate(mu, 0.35)
+            press_t = t0 + rt / 1000.0
+            btn = d["expected_response"] or "space"
+            if rnd.random() < spec.p_wrong:
+                btn = rnd.choice(("left", "right", "space"))
+        elif not must_press and rnd.random() < 0.15:
+            press_t = t0 + rnd.lognormvariate(math.log(spec.mean_rt_ms * 0.8), 0.3) / 1000.0  # Ошибка commission
+            btn = "space"
+        t_off = t0 + spec.timeout_ms / 1000.0
+        if press_t is not None and press_t < t_off:
+            yield from emit(ev("keypress", press_t, trial_id=tid, button_id=btn))
+            if rnd.random() < spec.p_extra_press:
+                yield from emit(ev("keypress", press_t + rnd.uniform(0.1, 0.6), trial_id=tid, button_id=btn))
+        yield from emit(ev("stimulus_off", t_off, trial_id=tid))
+        t = t_off + 0.15
+        yield from emit(ev("trial_end", t, trial_id=tid))
+        if press_t is not None and press_t >= t_off:
+            yield from emit(ev("keypress", t + 0.05, trial_id=tid, button_id=btn))  # Поздний ответ после trial_end
+        t += 0.15
+    yield from emit(ev("session_end", t))
+
+def write_synthetic_log(path: str, spec: SyntheticSpec) -> int:
+    # Пишет JSONL-лог по спецификации; возвращает число событий
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        buf = []
+        for e in iter_synthetic_events(spec):
+            buf.append(json.dumps(e, ensure_ascii=False))
+            n += 1
+            if len(buf) >= 4096:
+                f.write("\n".join(buf) + "\n"); buf = []
+        if buf:
+            f.write("\n".join(buf) + "\n")
+    return n
@@ -0,0 +1,146 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+from .config import AnalysisCfg, FlagsThresholds, ProjectConfig, TaskBounds
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+GO_MODES = ("all", "is_go", "target")
+MATCH_MODES = ("any", "expected", "button")
+
+# Табличное описание правил задачи: по нему компилируется построчный классификатор
+# (compile_classifier) и строятся маски numpy (vectorized.classify_table)
+@dataclass(frozen=True)
+class TaskRules:
+    go: str = "all"  # "all" — все триалы требуют ответа; "is_go" — Go только при is_go=True; "target" — is_go, а без него stimulus_type == target
+    match: str = "any"  # "any" — любая кнопка; "expected" — кнопка == expected_response; "button" — кнопка == button
+    button: Optional[str] = None
+    target: Optional[str] = None  # Целевой стимул для go="target" (CPT)
+    lapse_ms: Optional[float] = None  # Верный ответ с RT > lapse_ms — класс "lapse" (PVT)
+    conditions: Tuple[str, ...] = ()  # Условия по stimulus_type для метрик по условиям; эффект — последнее минус первое (Stroop)
+
+    def __post_init__(self) -> None:
+        if self.go not in GO_MODES:
+            raise ValueError(f"unknown go mode: {self.go!r} (expected {', '.join(GO_MODES)})")
+        if self.match not in MATCH_MODES:
+            raise ValueError(f"unknown match mode: {self.match!r} (expected {', '.join(MATCH_MODES)})")
+        if self.match == "button" and self.button is None:
+            raise ValueError("match='button' requires button")
+        if self.go == "target" and self.target is None:
+            raise ValueError("go='target' requires target")
+
+    @property
+    def has_nogo(self) -> bool:
+        # Есть триалы, где нажимать не нужно: метрики Go/NoGo (hit rate, commission, d')
+        return self.go != "all"
+
+    def is_go(self, t: TrialOutcome) -> Optional[bool]:
+        # Go/NoGo триала для метрик — по тем же режимам, что compile_classifier; при go="all" — разметка is_go как есть
+        go = t.is_go
+        if self.go == "all":
+            return go
+        if go is None and self.go == "target":
+            go = t.stimulus_type == self.target
+        return go is True
+
+TaskFactory = Callable[[Optional[ProjectConfig]], TaskRules]
+Classifier = Callable[["TrialOutcome"], None]
+
+_REGISTRY: Dict[str, TaskFactory] = {}
+
+def register_task(name: str, factory: Optional[TaskFactory]=None) -> Callable[..., TaskFactory]:
+    """Регистрирует правила задачи: ``factory(cfg) -> TaskRules`` (cfg может быть None).
+
+    Можно вызывать напрямую или как декоратор. Повторная регистрация
+    заменяет правила задачи.
+    """
+    def deco(f: TaskFactory) -> TaskFactory:
+        _REGISTRY[name] = f
+        return f
+    return deco(factory) if factory is not None else deco
+
+def task_names() -> Tuple[str, ...]:
+    return tuple(_REGISTRY)
+
+def task_rules(task: str, cfg: Optional[ProjectConfig]=None) -> TaskRules:
+    # Задача не из реестра: любой ответ верен, NoGo-триалов нет
+    factory = _REGISTRY.get(task)
+    return factory(cfg) if factory is not None else TaskRules()
+
+def _lapse_ms(cfg: Optional[ProjectConfig]) -> float:
+    return float((cfg.flags_thresholds if cfg is not None else FlagsThresholds()).lapse_ms)
+
+def _analysis(cfg: Optional[ProjectConfig]) -> AnalysisCfg:
+    return cfg.analysis if cfg is not None else AnalysisCfg()
+
+register_task("simple", lambda cfg: TaskRules(match="expected"))
+register_task("choice", lambda cfg: TaskRules(match="expected"))
+register_task("go_nogo", lambda cfg: TaskRules(go="is_go", match="button", button=_analysis(cfg).response_button))
+register_task("stroop", lambda cfg: TaskRules(match="expected", conditions=("congruent", "incongruent")))
+register_task("pvt", lambda cfg: TaskRules(lapse_ms=_lapse_ms(cfg)))
+register_task("cpt", lambda cfg: TaskRules(go="target", target=_analysis(cfg).cpt_target, match="button", button=_analysis(cfg).response_button))
+
+def compile_classifier(rules: TaskRules, bounds: TaskBounds) -> Classifier:
+    """Классификатор триала по правилам и границам задачи, собранный один раз.
+
+    Режимы правил разворачиваются в локальные переменные замыкания, так что
+    на триал остаются только сравнения RT, кнопки и is_go. Проставляет
+    classification и флаги is_* у ``TrialOutcome`` (ожидаются сброшенными).
+    """
+    min_rt = float(bounds.min_rt_ms); max_bound = float(bounds.max_rt_ms)
+    go_all = rules.go == "all"; by_target = rules.go == "target"; target = rules.target
+    any_button = rules.match == "any"; button = rules.button if rules.match == "button" else None  # None — сравнение с expected_response
+    lapse = rules.lapse_ms
+
+    def classify(out: TrialOutcome) -> None:
+        rt = out.rt_ms
+        if not go_all:
+            go = out.is_go
+            if go is None and by_target:
+                go = out.stimulus_type == target
+            if go is not True:  # NoGo: нажимать не нужно
+                if rt is None:
+                    out.classification = "correct_inhibition"; out.is_correct = True
+                else:
+                    out.classification = "commission"; out.is_commission = True
+                    if rt < min_rt: out.is_anticipation = True
+                return
+        if rt is None:
+            out.classification = "omission"; out.is_omission = True; out.is_timeout = True
+            return
+        if rt < min_rt:
+            out.classification = "anticipation"; out.is_anticipation = True
+        elif any_button or (str(out.first_press_button) == button if button is not None else
+                            (out.expected_response is not None and str(out.first_press_button) == str(out.expected_response))):
+            out.classification = "correct"; out.is_correct = True
+        else:
+            out.classification = "wrong"; out.is_wrong = True
+        if rt > min(max_bound, out.timeout_ms):
+            out.classification = "timeout"; out.is_timeout = True; out.is_correct = False
+        elif out.is_correct:
+            out.is_valid_rt = True  # Верный ответ в границах [min_rt, max_rt]
+            if lapse is not None and rt > lapse:
+                out.classification = "lapse"
+    return classify
+
+@dataclass(frozen=True)
+class CompiledTask:
+    name: str
+    rules: TaskRules
+    bounds: TaskBounds
+    classify: Classifier
+
+    def __reduce__(self) -> Tuple[Callable[..., "CompiledTask"], Tuple[str, TaskRules, TaskBounds]]:
+        # Замыкание classify не сериализуется pickle: при загрузке (контрольные точки follow) оно собирается заново
+        return _recompile, (self.name, self.rules, self.bounds)
+
+def _recompile(name: str, rules: TaskRules, bounds: TaskBounds) -> CompiledTask:
+    return CompiledTask(name, rules, bounds, compile_classifier(rules, bounds))
+
+def compile_task(task: str, cfg: ProjectConfig) -> CompiledTask:
+    # Правила и границы задачи из реестра и конфига; границы неизвестной задачи — как у "simple"
+    bounds = cfg.task_bounds.get(task, cfg.task_bounds["simple"])
+    rules = task_rules(task, cfg)
+    return _recompile(task, rules, bounds)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union, TYPE_CHECKING
+import math
+
+if TYPE_CHECKING:
+    from .analyzer import TrialOutcome
+
+# Булевы признаки TrialOutcome, упакованные в одну битовую маску
+FLAG_FIELDS = ("is_correct", "is_valid_rt", "is_anticipation", "is_timeout", "is_wrong", "is_commission", "is_omission")
+FLAG_BITS = {name: 1 << i for i, name in enumerate(FLAG_FIELDS)}
+GO_KNOWN = 1 << 7  # is_go задан (True/False), иначе None
+GO_TRUE = 1 << 8
+
+# Колонки: float (NaN = None), целые и интернированные строки (код 0 = None)
+FLOAT_COLS = ("rt_ms", "first_press_t", "t0")
+INT_COLS = {"trial_id": "q", "block_id": "q", "timeout_ms": "i", "press_count": "I", "premature_press_count": "I", "late_press_count": "I"}
+STR_COLS = ("stimulus_type", "expected_response", "first_press_button", "classification")
+
+_NAN = float("nan")
+
+class TrialTable:
+    """Колоночное хранилище триалов на typed arrays.
+
+    Поддерживает ``len``, индексацию и итерацию; строки отдаются как
+    :class:`TrialRow` с теми же атрибутами, что у ``TrialOutcome``, поэтому
+    таблицу можно передавать в ``compute_metrics``, ``compute_state_flags`` и
+    ``build_report_html`` вместо списка. Дополнительные float-колонки
+    (``set_column``, например агрегаты каналов из ``intervals``) доступны
+    через ``column`` и как атрибуты строк.
+    """
+
+    def __init__(self) -> None:
+        self.cols: Dict[str, array] = {}
+        for c in FLOAT_COLS: self.cols[c] = array("d")
+        for c, code in INT_COLS.items(): self.cols[c] = array(code)
+        for c in STR_COLS: self.cols[c] = array("I")
+        self.cols["flags"] = array("H")
+        self.extra: List[str] = []  # Дополнительные float-колонки
+        self.strings: List[Any] = [None]  # Таблица интернированных значений
+        self._codes: Dict[Any, int] = {}
+
+    @classmethod
+    def from_trials(cls, trials: Iterable[TrialOutcome]) -> "TrialTable":
+        t = cls()
+        t.extend(trials)
+        return t
+
+    def _intern(self, v: Any) -> int:
+        if v is None:
+            return 0
+        code = self._codes.get(v)
+        if code is None:
+            code = self._codes[v] = len(self.strings)
+            self.strings.append(v)
+        return code
+
+    def append(self, out: TrialOutcome) -> None:
+        cols = self.cols
+        for c in FLOAT_COLS:
+            v = getattr(out, c)
+            cols[c].append(_NAN if v is None else float(v))
+        for c in INT_COLS:
+            cols[c].append(int(getattr(out, c)))
+        for c in STR_COLS:
+            cols[c].append(self._intern(getattr(out, c)))
+        bits = 0
+        for name, bit in FLAG_BITS.items():
+            if getattr(out, name): bits |= bit
+        if out.is_go is not None:
+            bits |= GO_KNOWN
+            if out.is_go: bits |= GO_TRUE
+        cols["flags"].append(bits)
+        for c in self.extra:
+            cols[c].append(_NAN)
+
+    def extend(self, trials: Iterable[TrialOutcome]) -> None:
+        for out in trials:
+            self.append(out)
+
+    def __len__(self) -> int:
+        return len(self.cols["flags"])
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return [TrialRow(self, j) for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0: i += n
+        if not 0 <= i < n:
+            raise IndexError("trial index out of range")
+        return TrialRow(self, i)
+
+    def __iter__(self) -> Iterator["TrialRow"]:
+        for i in range(len(self)):
+            yield TrialRow(self, i)
+
+    def column(self, name: str) -> Sequence[Any]:
+        # Значения колонки: array для чисел, список для строк и флагов
+        if name in FLOAT_COLS or name in INT_COLS or name == "flags" or name in self.extra:
+            return self.cols[name]
+        if name in STR_COLS:
+            s = self.strings
+            return [s[c] for c in self.cols[name]]
+        if name in FLAG_BITS:
+            bit = FLAG_BITS[name]
+            return [bool(b & bit) for b in self.cols["flags"]]
+        raise KeyError(name)
+
+    def set_column(self, name: str, values: Iterable[float]) -> None:
+        # Добавляет или заменяет дополнительную float-колонку (NaN = нет данных)
+        if name in self.cols and name not in self.extra:
+            raise ValueError(f"column {name!r} is a built-in trial column")
+        col = array("d", values)
+        if len(col) != len(self):
+            raise ValueError(f"column {name!r}: {len(col)} values for {len(self)} trials")
+        self.cols[name] = col
+        if name not in self.extra:
+            self.extra.append(name)
+
+    def sort_by_trial_id(self) -> None:
+        # Упорядочивает строки по trial_id (стабильно)
+        ids = self.cols["trial_id"]
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        if all(order[i] == i for i in range(len(order))):
+            return
+        for c, col in self.cols.items():
+            self.cols[c] = array(col.typecode, (col[j] for j in order))
+
+    def to_trials(self) -> List[TrialOutcome]:
+        return [r.to_outcome() for r in self]
+
+    def nbytes(self) -> int:
+        # Объём данных колонок (без таблицы строк)
+        return sum(col.itemsize * len(col) for col in self.cols.values())
+
+class TrialRow:
+    """Представление одной строки TrialTable с атрибутами TrialOutcome (только чтение)."""
+    __slots__ = ("_t", "_i")
+
+    def __init__(self, table: TrialTable, i: int):
+        self._t = table
+        self._i = i
+
+    @property
+    def is_go(self) -> Optional[bool]:
+        b = self._t.cols["flags"][self._i]
+        return bool(b & GO_TRUE) if b & GO_KNOWN else None
+
+    def __getattr__(self, name: str) -> Optional[float]:
+        # Дополнительные колонки таблицы (set_column)
+        if name.startswith("_") or name not in self._t.extra:
+            raise AttributeError(name)
+        v = self._t.cols[name][self._i]
+        return None if math.isnan(v) else v
+
+    def to_outcome(self) -> TrialOutcome:
+        from .analyzer import TrialOutcome
+        from dataclasses import fields
+        return TrialOutcome(**{f.name: getattr(self, f.name) for f in fields(TrialOutcome)})
+
+    def __repr__(self) -> str:
+        return f"TrialRow(trial_id={self.trial_id}, classification={self.classification!r}, rt_ms={self.rt_ms})"
+
+def _float_prop(col: str) -> property:
+    def get(self: TrialRow) -> Optional[float]:
+        v = self._t.cols[col][self._i]
+        return None if math.isnan(v) else v
+    return property(get)
+
+def _int_prop(col: str) -> property:
+    return property(lambda self: self._t.cols[col][self._i])
+
+def _str_prop(col: str) -> property:
+    return property(lambda self: self._t.strings[self._t.cols[col][self._i]])
+
+def _flag_prop(bit: int) -> property:
+    return property(lambda self: bool(self._t.cols["flags"][self._i] & bit))
+
+for _c in FLOAT_COLS: setattr(TrialRow, _c, _float_prop(_c))
+for _c in INT_COLS: setattr(TrialRow, _c, _int_prop(_c))
+for _c in STR_COLS: setattr(TrialRow, _c, _str_prop(_c))
+for _c, _bit in FLAG_BITS.items(): setattr(TrialRow, _c, _flag_prop(_bit))
@@ -0,0 +1,271 @@
+from __future__ import annotations
+from array import array
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+import math
+
+from .config import ProjectConfig, TaskBounds
+from . import stats
+from .quantiles import percentile_key
+from .tasks import TaskRules, compile_classifier, task_rules
+from .trial_table import FLAG_BITS, GO_KNOWN, GO_TRUE, TrialTable
+
+# NumPy — опционально: без него все функции модуля работают через stdlib-код (stats, MetricsAccumulator)
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None
+
+BACKENDS = ("numpy", "python")
+
+def available_backends() -> Sequence[str]:
+    return BACKENDS if np is not None else ("python",)
+
+def get_backend(name: Optional[str]=None) -> str:
+    # "auto"/None — numpy, если установлен; запрошенный, но не установленный numpy молча заменяется на "python"
+    if name in (None, "auto"):
+        return available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend: {name!r} (expected auto, numpy or python)")
+    return name if name in available_backends() else "python"
+
+def use_numpy(cfg: ProjectConfig) -> bool:
+    return get_backend(cfg.analysis.backend) == "numpy"
+
+def _arr(xs: Any) -> Any:
+    # Последовательность или array.array -> float64 без копии, где возможно
+    if isinstance(xs, array) and xs.typecode == "d":
+        return np.frombuffer(xs, dtype=np.float64) if len(xs) else np.empty(0)
+    return np.asarray(xs, dtype=np.float64)
+
+# --- Статистики (те же сигнатуры и None-семантика, что в stats) ---
+
+def mean(xs: Sequence[float], backend: Optional[str]=None) -> Optional[float]:
+    if get_backend(backend) == "python": return stats.mean(list(xs))
+    a = _arr(xs)
+    return float(a.sum() / a.size) if a.size else None
+
+def std_sample(xs: Sequence[float], backend: Optional[str]=None) -> Optional[float]:
+    if get_backend(backend) == "python": return stats.std_sample(list(xs))
+    a = _arr(xs)
+    if a.size < 2: return None
+    d = a - a.sum() / a.size
+    return float(math.sqrt(float(np.dot(d, d)) / (a.size - 1)))
+
+def coefficient_of_variation(xs: Sequence[float], backend: Optional[str]=None) -> Optional[float]:
+    if get_backend(backend) == "python": return stats.coefficient_of_variation(list(xs))
+    m = mean(xs, "numpy"); sd = std_sample(xs, "numpy")
+    if m is None or sd is None or m == 0: return None
+    return sd / m
+
+def _centered(x: Sequence[float], y: Sequence[float]) -> Optional[Tuple[Any, Any]]:
+    a = _arr(x); b = _arr(y)
+    if a.size != b.size or a.size < 2: return None
+    return a - a.sum() / a.size, b - b.sum() / b.size
+
+def pearson_r(x: Sequence[float], y: Sequence[float], backend: Optional[str]=None) -> Optional[float]:
+    if get_backend(backend) == "python": return stats.pearson_r(list(x), list(y))
+    c = _centered(x, y)
+    if c is None: return None
+    dx, dy = c
+    den = math.sqrt(float(np.dot(dx, dx)) * float(np.dot(dy, dy)))
+    return None if den == 0 else float(np.dot(dx, dy)) / den
+
+def linear_regression_slope(x: Sequence[float], y: Sequence[float], backend: Optional[str]=None) -> Optional[float]:
+    if get_backend(backend) == "python": return stats.linear_regression_slope(list(x), list(y))
+    c = _centered(x, y)
+    if c is None: return None
+    dx, dy = c
+    den = float(np.dot(dx, dx))
+    return None if den == 0 else float(np.dot(dx, dy)) / den
+
+# Коэффициенты Acklam (как stats._inv_norm_cdf_acklam)
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+
+def inv_norm_cdf(p: Union[float, Sequence[float]], eps: float=1e-12, backend: Optional[str]=None) -> Any:
+    """Обратная функция нормального распределения; для последовательности — поэлементно (ndarray или список)."""
+    scalar = isinstance(p, (int, float))
+    if get_backend(backend) == "python":
+        return stats.inv_norm_cdf(float(p), eps) if scalar else [stats.inv_norm_cdf(float(x), eps) for x in p]
+    x = np.asarray(p, dtype=np.float64)
+    x = np.where(x <= 0.0, eps, np.where(x >= 1.0, 1.0 - eps, x))
+    plow = 0.02425
+    a, b, c, d = _A, _B, _C, _D
+    out = np.empty_like(x)
+    lo = x < plow; hi = x > 1.0 - plow; mid = ~(lo | hi)
+    q = np.sqrt(-2.0 * np.log(np.where(lo, x, 1.0)))
+    t = (((((c[0]*q+c[1])*q+c[2])*q+c[3])*q+c[4])*q+c[5]) / ((((d[0]*q+d[1])*q+d[2])*q+d[3])*q+1.0)
+    out[lo] = t[lo]
+    q = np.sqrt(-2.0 * np.log(1.0 - np.where(hi, x, 0.0)))
+    t = (((((c[0]*q+c[1])*q+c[2])*q+c[3])*q+c[4])*q+c[5]) / ((((d[0]*q+d[1])*q+d[2])*q+d[3])*q+1.0)
+    out[hi] = -t[hi]
+    q = x - 0.5; r = q * q
+    t = (((((a[0]*r+a[1])*r+a[2])*r+a[3])*r+a[4])*r+a[5]) * q / (((((b[0]*r+b[1])*r+b[2])*r+b[3])*r+b[4])*r+1.0)
+    out[mid] = t[mid]
+    return float(out) if scalar else out
+
+# --- Классификация и метрики по TrialTable ---
+
+def _col(table: TrialTable, name: str) -> Any:
+    col = table.cols[name]
+    return np.frombuffer(col, dtype=col.typecode) if len(col) else np.empty(0, dtype=col.typecode)
+
+def _canonical_codes(table: TrialTable) -> Any:
+    # Код строки -> код её str(): кнопка и expected_response сравниваются как строки (как в tasks.compile_classifier)
+    seen: Dict[str, int] = {}
+    canon = [seen.setdefault(str(v), i) if v is not None else 0 for i, v in enumerate(table.strings)]
+    return np.asarray(canon, dtype=np.int64), seen
+
+def _go_masks(table: TrialTable, rules: TaskRules, canon: Any=None, by_str: Optional[Dict[str, int]]=None) -> Tuple[Any, Any]:
+    # Маски Go и NoGo — как TaskRules.is_go: при go="all" только размеченные is_go триалы
+    flags = _col(table, "flags")
+    known = (flags & GO_KNOWN) != 0; go_true = (flags & GO_TRUE) != 0
+    if rules.go == "all":
+        return known & go_true, known & ~go_true
+    if rules.go == "target":
+        if canon is None: canon, by_str = _canonical_codes(table)
+        go = np.where(known, go_true, canon[_col(table, "stimulus_type")] == by_str.get(rules.target, -1))
+    else:
+        go = known & go_true
+    return go, ~go
+
+def classify_table(table: TrialTable, task: str, bounds: TaskBounds, backend: Optional[str]=None,
+                   rules: Optional[TaskRules]=None) -> TrialTable:
+    """Заново проставляет classification и флаги is_* всех строк таблицы по rt_ms, кнопке и is_go.
+
+    Правила задачи — ``rules`` или из реестра ``tasks`` по имени; с numpy
+    каждый режим TaskRules — маска по колонкам, без него — скомпилированный
+    ``tasks.compile_classifier`` построчно.
+    """
+    if rules is None:
+        rules = task_rules(task)
+    if get_backend(backend) == "python" or len(table) == 0:
+        return _classify_table_py(table, rules, bounds)
+    n = len(table)
+    rt = _col(table, "rt_ms"); flags = _col(table, "flags")
+    has = ~np.isnan(rt)
+    rt0 = np.where(has, rt, 0.0)
+    min_rt = float(bounds.min_rt_ms)
+    max_rt = np.minimum(float(bounds.max_rt_ms), _col(table, "timeout_ms").astype(np.float64))
+    antic = has & (rt0 < min_rt)
+    late = has & (rt0 > max_rt)
+    canon, by_str = _canonical_codes(table)
+    btn = canon[_col(table, "first_press_button")]
+    if rules.match == "button":
+        match = btn == by_str.get(rules.button, -1)
+    elif rules.match == "expected":
+        exp = _col(table, "expected_response")
+        match = (exp != 0) & (btn == canon[exp])
+    else:
+        match = np.ones(n, dtype=bool)
+    go = _go_masks(table, rules, canon, by_str)[0] if rules.has_nogo else np.ones(n, dtype=bool)
+    nogo = ~go
+    # Go-ветка (и задачи без NoGo): omission / anticipation / correct|wrong, затем timeout поверх
+    omission = go & ~has
+    correct = go & has & ~antic & match & ~late
+    wrong = go & has & ~antic & ~match
+    timeout = omission | (go & late)
+    # NoGo: correct_inhibition без нажатия, иначе commission
+    inhibit = nogo & ~has
+    commission = nogo & has
+    correct = correct | inhibit
+    anticipation = (go & antic) | (commission & antic)
+    valid = correct & has & (rt0 >= min_rt) & (rt0 <= max_rt) & ~anticipation
+
+    names = ("omission", "anticipation", "correct", "wrong", "timeout", "correct_inhibition", "commission")
+    code = {n: table._intern(n) for n in names}
+    cls = np.full(len(table), table._intern("unknown"), dtype=np.uint32)
+    cls[go & has & ~antic & match] = code["correct"]
+    cls[wrong] = code["wrong"]
+    cls[go & antic] = code["anticipation"]
+    cls[go & late] = code["timeout"]
+    cls[omission] = code["omission"]
+    cls[inhibit] = code["correct_inhibition"]
+    cls[commission] = code["commission"]
+    if rules.lapse_ms is not None:
+        cls[valid & (rt0 > float(rules.lapse_ms))] = table._intern("lapse")
+
+    bits = flags & np.uint16(GO_KNOWN | GO_TRUE)
+    for name, mask in (("is_correct", correct), ("is_valid_rt", valid), ("is_anticipation", anticipation), ("is_timeout", timeout),
+                       ("is_wrong", wrong), ("is_commission", commission), ("is_omission", omission)):
+        bits |= mask.astype(np.uint16) * np.uint16(FLAG_BITS[name])
+    table.cols["classification"] = array("I", cls.tobytes())
+    table.cols["flags"] = array("H", bits.astype(np.uint16).tobytes())
+    return table
+
+def _classify_table_py(table: TrialTable, rules: TaskRules, bounds: TaskBounds) -> TrialTable:
+    classify = compile_classifier(rules, bounds)
+    cls = table.cols["classification"]; flags = table.cols["flags"]
+    for i, row in enumerate(table):
+        out = row.to_outcome()
+        out.classification = "unknown"
+        for name in FLAG_BITS: setattr(out, name, False)
+        classify(out)
+        cls[i] = table._intern(out.classification)
+        bits = flags[i] & (GO_KNOWN | GO_TRUE)
+        for name, bit in FLAG_BITS.items():
+            if getattr(out, name): bits |= bit
+        flags[i] = bits
+    return table
+
+def table_metrics(table: TrialTable, task: str, cfg: ProjectConfig, backend: Optional[str]=None) -> Dict[str, Any]:
+    """Тот же словарь, что ``compute_metrics``, посчитанный по колонкам TrialTable.
+
+    Суммы numpy считаются попарно, поэтому средние и SD могут отличаться от
+    stdlib-варианта в последних знаках. В режиме ``quantile_mode="tdigest"``
+    квантили по-прежнему считает t-digest.
+    """
+    from .accumulators import MetricsAccumulator, make_rt_store
+    acc = MetricsAccumulator(task, cfg)
+    if get_backend(backend) == "python" or len(table) == 0:
+        return acc.extend(table).result()
+    rt = _col(table, "rt_ms"); flags = _col(table, "flags")
+    has = ~np.isnan(rt)
+
+    def bit(name: str) -> Any:
+        return (flags & FLAG_BITS[name]) != 0
+
+    correct = bit("is_correct"); timeout = bit("is_timeout")
+    go, nogo = _go_masks(table, acc.rules)
+    c_code = table._codes.get("correct")
+    hits = int(np.count_nonzero(go & (_col(table, "classification") == c_code))) if c_code is not None else 0
+    acc.total = len(table); acc.correct = int(np.count_nonzero(correct))
+    for attr, name in (("wrong", "is_wrong"), ("commission", "is_commission"), ("omission", "is_omission"),
+                       ("anticipation", "is_anticipation"), ("timeout", "is_timeout")):
+        setattr(acc, attr, int(np.count_nonzero(bit(name))))
+    acc.go = int(np.count_nonzero(go)); acc.nogo = int(np.count_nonzero(nogo)); acc.hits = hits
+
+    vmask = bit("is_valid_rt") & has
+    v = rt[vmask]
+    acc.lapses = int(np.count_nonzero(v > float(acc.lapse_ms)))
+    if acc.by_condition:
+        canon, by_str = _canonical_codes(table)
+        stim = canon[_col(table, "stimulus_type")]
+        for c in acc.by_condition:
+            m = stim == by_str.get(c, -1)
+            acc.by_condition[c] = [int(np.count_nonzero(m)), int(np.count_nonzero(m & correct)),
+                                   int(np.count_nonzero(m & vmask)), float(rt[m & vmask].sum())]
+    res = acc.result()  # Счётчики и доли; RT-часть ниже заменяется векторной
+    n_valid = int(v.size)
+    mean_rt = mean(v, "numpy"); rt_std = std_sample(v, "numpy")
+    if cfg.analysis.quantile_mode == "tdigest":
+        store = make_rt_store(cfg)
+        for x in v.tolist(): store.add(x)
+        median_rt = store.median(); pct = store.quantiles([p / 100.0 for p in acc.percentiles]); method = store.method
+    else:
+        median_rt = float(np.median(v)) if n_valid else None
+        pct = [float(x) for x in np.quantile(v, [p / 100.0 for p in acc.percentiles])] if n_valid else [None] * len(acc.percentiles)
+        method = "exact"
+    # Номер триала для наклона — позиция строки (1..n), как в MetricsAccumulator
+    slope = linear_regression_slope(np.flatnonzero(vmask) + 1.0, v, "numpy")
+    sa = has & ~timeout
+    r = rt[sa]
+    pearson = pearson_r(r, correct[sa].astype(np.float64), "numpy")
+    res["rt"].update({"n_valid": n_valid, "mean_rt_ms": mean_rt, "median_rt_ms": median_rt, "rt_std_ms": rt_std,
+                      "rt_cv": None if (mean_rt is None or rt_std is None or mean_rt == 0) else rt_std / mean_rt,
+                      "rt_slope_ms_per_trial": slope, "lapse_rate": (acc.lapses / n_valid) if n_valid else None,
+                      "percentiles_ms": {percentile_key(p): q for p, q in zip(acc.percentiles, pct)}, "quantile_method": method})
+    res["speed_accuracy"]["pearson_r_rt_correctness"] = pearson
+    return res